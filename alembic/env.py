@@ -7,9 +7,12 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 from app.models import Base
+from app.config import settings
 
 config = context.config
 fileConfig(config.config_file_name)
+# 迁移与应用使用同一数据库配置
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,39 @@
+"""add history chunks
+
+Revision ID: 4b1f0c9e2a71
+Revises: d9c32684e657
+Create Date: 2026-10-18 19:02:11.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f0c9e2a71'
+down_revision: Union[str, None] = 'd9c32684e657'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('history_chunks',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('series', sa.String(length=64), nullable=False),
+    sa.Column('partition', sa.Integer(), nullable=False),
+    sa.Column('start_ts', sa.BigInteger(), nullable=False),
+    sa.Column('end_ts', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('ts_blob', sa.LargeBinary(), nullable=False),
+    sa.Column('value_blob', sa.LargeBinary(), nullable=False),
+    sa.Column('sealed', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_history_chunks_series_partition', 'history_chunks', ['series', 'partition', 'start_ts'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_history_chunks_series_partition', table_name='history_chunks')
+    op.drop_table('history_chunks')
@@ -0,0 +1,40 @@
+"""add indexes for hot query predicates
+
+Revision ID: 5c2e9a4b7d13
+Revises: 8e3d5a7c1f42
+Create Date: 2026-10-18 21:12:07.418530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9a4b7d13'
+down_revision: Union[str, None] = '8e3d5a7c1f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_nodes_system_host', 'nodes', ['system_id', 'host_no']),
+    ('ix_hosts_system_host', 'hosts', ['system_id', 'host_no']),
+    ('ix_node_history_node_date', 'node_history', ['node_id', 'date']),
+    ('ix_substations_system_area_drv', 'substations', ['system_id', 'area_id', 'drv_type']),
+    ('ix_areas_system_id', 'areas', ['system_id']),
+    ('ix_reports_user_created', 'reports', ['user_id', 'created_date']),
+    ('ix_host_operations_logs_host_created', 'host_operations_logs', ['host_no', 'created_at']),
+    ('ix_node_operations_logs_node_created', 'node_operations_logs', ['node_id', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
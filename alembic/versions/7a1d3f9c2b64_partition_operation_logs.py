@@ -0,0 +1,148 @@
+"""partition operation logs by month
+
+Revision ID: 7a1d3f9c2b64
+Revises: 5c2e9a4b7d13
+Create Date: 2026-10-19 09:26:41.530218
+
+"""
+import re
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1d3f9c2b64'
+down_revision: Union[str, None] = '5c2e9a4b7d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 本迁移时的日志表结构，不引用应用代码，以免应用修改后迁移行为随之改变
+# (基础表, 设备列, 基础表上的模型索引)
+LOGS = [
+    ('host_operations_logs', 'host_no', 'ix_host_operations_logs_host_created'),
+    ('node_operations_logs', 'node_id', 'ix_node_operations_logs_node_created'),
+]
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _table(name: str, key: str, metadata: sa.MetaData, *indexes) -> sa.Table:
+    return sa.Table(
+        name, metadata,
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column(key, sa.Integer, nullable=False),
+        sa.Column('operation', sa.String(50), nullable=False),
+        sa.Column('user', sa.String(255), nullable=True),
+        sa.Column('status_code', sa.String(10), nullable=True),
+        sa.Column('status_message', sa.Text, nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP, server_default=sa.func.now()),
+        *indexes,
+    )
+
+
+def _month_table(name: str, key: str, month: datetime, metadata: sa.MetaData) -> sa.Table:
+    # 与应用按月创建的表相同：<基础表>_YYYYMM，索引名带上月表名
+    partition = f"{name}_{month:%Y%m}"
+    return _table(partition, key, metadata,
+                  sa.Index(f"ix_{partition}_created", 'created_at'),
+                  sa.Index(f"ix_{partition}_{key}_created", key, 'created_at'))
+
+
+def _partitions(bind, name: str):
+    pattern = re.compile(rf"^{re.escape(name)}_\d{{6}}$")
+    return sorted(table for table in sa.inspect(bind).get_table_names() if pattern.match(table))
+
+
+def _upgrade_sqlite(bind, name: str, key: str) -> None:
+    # 已有日志按月搬到月表；没有时间的旧日志无法归入分区，保留在基础表中
+    # 在 Python 中按月分组：旧日志的时间格式（数据库默认值）与绑定参数不同，不能直接按字符串比较分月
+    metadata = sa.MetaData()
+    base = _table(name, key, metadata)
+    columns = [column for column in base.columns if column.name != 'id']
+    groups = {}
+    for row in bind.execute(sa.select(*columns).where(base.c.created_at.is_not(None))).mappings():
+        groups.setdefault(_month_start(row['created_at']), []).append(dict(row))
+    for month, rows in sorted(groups.items()):
+        table = _month_table(name, key, month, metadata)
+        bind.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            bind.execute(CreateIndex(index, if_not_exists=True))
+        bind.execute(sa.insert(table), rows)
+    bind.execute(base.delete().where(base.c.created_at.is_not(None)))
+
+
+def _upgrade_postgresql(bind, name: str, key: str, index: str) -> None:
+    # 基础表改为按 created_at 的范围分区表，分区键必须包含在主键中
+    legacy = f"{name}_legacy"
+    op.execute(f"ALTER TABLE {name} RENAME TO {legacy}")
+    op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {name}_pkey TO {legacy}_pkey")
+    op.execute(f"DROP INDEX IF EXISTS {index}")
+    op.execute(f"ALTER SEQUENCE {name}_id_seq OWNED BY NONE")
+    op.execute(f"CREATE TABLE {name} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute(f"ALTER TABLE {name} ALTER COLUMN created_at SET NOT NULL")
+    op.execute(f"ALTER TABLE {name} ADD PRIMARY KEY (id, created_at)")
+    months = bind.execute(sa.text(f"SELECT DISTINCT date_trunc('month', created_at) FROM {legacy} "
+                                  f"WHERE created_at IS NOT NULL")).scalars()
+    for month in sorted(_month_start(value) for value in months):
+        op.execute(f"CREATE TABLE IF NOT EXISTS {name}_{month:%Y%m} PARTITION OF {name} "
+                   f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')")
+    op.execute(f"INSERT INTO {name} SELECT * FROM {legacy} WHERE created_at IS NOT NULL")
+    # 没有时间的旧日志不能写入分区表，与 SQLite 一样保留下来：放在 <基础表>_undated 中，降级时合并回去
+    op.execute(f"DELETE FROM {legacy} WHERE created_at IS NOT NULL")
+    if bind.execute(sa.text(f"SELECT count(*) FROM {legacy}")).scalar():
+        op.execute(f"ALTER TABLE {legacy} RENAME TO {name}_undated")
+        op.execute(f"ALTER TABLE {name}_undated RENAME CONSTRAINT {legacy}_pkey TO {name}_undated_pkey")
+    else:
+        op.execute(f"DROP TABLE {legacy}")
+    op.execute(f"ALTER SEQUENCE {name}_id_seq OWNED BY {name}.id")
+    # 分区表上的索引会自动建到每个分区
+    op.create_index(f"ix_{name}_created", name, ['created_at'])
+    op.create_index(index, name, [key, 'created_at'])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for name, key, index in LOGS:
+        if bind.dialect.name == 'postgresql':
+            _upgrade_postgresql(bind, name, key, index)
+        else:
+            _upgrade_sqlite(bind, name, key)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for name, key, index in LOGS:
+        if bind.dialect.name != 'postgresql':
+            # 月表中的日志合并回基础表
+            columns = ", ".join(f'"{column}"' for column in (key, 'operation', 'user', 'status_code',
+                                                             'status_message', 'created_at'))
+            for partition in _partitions(bind, name):
+                op.execute(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {partition}")
+                op.drop_table(partition)
+            continue
+
+        partitioned = f"{name}_partitioned"
+        op.execute(f"ALTER TABLE {name} RENAME TO {partitioned}")
+        op.execute(f"ALTER TABLE {partitioned} RENAME CONSTRAINT {name}_pkey TO {partitioned}_pkey")
+        op.execute(f"ALTER SEQUENCE {name}_id_seq OWNED BY NONE")
+        op.execute(f"CREATE TABLE {name} (LIKE {partitioned} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {name} ALTER COLUMN created_at DROP NOT NULL")
+        op.execute(f"ALTER TABLE {name} ADD PRIMARY KEY (id)")
+        op.execute(f"INSERT INTO {name} SELECT * FROM {partitioned}")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
+        if sa.inspect(bind).has_table(f"{name}_undated"):
+            op.execute(f"INSERT INTO {name} SELECT * FROM {name}_undated")
+            op.execute(f"DROP TABLE {name}_undated")
+        op.execute(f"ALTER SEQUENCE {name}_id_seq OWNED BY {name}.id")
+        op.create_index(index, name, [key, 'created_at'])
@@ -0,0 +1,37 @@
+"""add history rollups
+
+Revision ID: 8e3d5a7c1f42
+Revises: 4b1f0c9e2a71
+Create Date: 2026-10-18 19:41:53.902146
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e3d5a7c1f42'
+down_revision: Union[str, None] = '4b1f0c9e2a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('history_rollups',
+    sa.Column('series', sa.String(length=64), nullable=False),
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('min_value', sa.Float(), nullable=False),
+    sa.Column('max_value', sa.Float(), nullable=False),
+    sa.Column('sum_value', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('last_value', sa.Float(), nullable=False),
+    sa.Column('last_ts', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('series', 'resolution', 'bucket')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('history_rollups')
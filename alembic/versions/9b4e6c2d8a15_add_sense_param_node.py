@@ -0,0 +1,30 @@
+"""add sensing node to task sense params
+
+Revision ID: 9b4e6c2d8a15
+Revises: 7a1d3f9c2b64
+Create Date: 2026-10-19 14:02:37.180214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e6c2d8a15'
+down_revision: Union[str, None] = '7a1d3f9c2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('task_sense_params') as batch_op:
+        batch_op.add_column(sa.Column('node_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_task_sense_params_node_id', ['node_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('task_sense_params') as batch_op:
+        batch_op.drop_index('ix_task_sense_params_node_id')
+        batch_op.drop_column('node_id')
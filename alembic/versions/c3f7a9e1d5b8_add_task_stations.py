@@ -0,0 +1,34 @@
+"""add task stations
+
+Revision ID: c3f7a9e1d5b8
+Revises: 9b4e6c2d8a15
+Create Date: 2026-10-19 16:47:05.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f7a9e1d5b8'
+down_revision: Union[str, None] = '9b4e6c2d8a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('task_stations',
+    sa.Column('task_station_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('task_id', sa.String(length=50), nullable=True),
+    sa.Column('station_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.task_id'], ),
+    sa.PrimaryKeyConstraint('task_station_id')
+    )
+    op.create_index('ix_task_stations_task_id', 'task_stations', ['task_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_task_stations_task_id', table_name='task_stations')
+    op.drop_table('task_stations')
@@ -1,23 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
+import csv
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.schemas import HostCreate, HostUpdate, HostDelete, HostQuery
-from app.schemas import NodeCreate, NodeUpdate, NodeDelete, NodeQuery
+from app.schemas import HostCreate, HostUpdate, HostDelete, HostQuery, HostImportRequest, HostLogQuery
+from app.schemas import NodeCreate, NodeUpdate, NodeDelete, NodeQuery, NodeLogQuery
 from app.schemas import SubstationCreate, SubstationUpdate, SubstationDelete, SubstationQuery
 from app.schemas import (EquipmentStatusRequest, EquipmentStatusResponse, 
                          SubstationDelete, SubstationQuery, 
                          StationHistoryRequest, StationHistoryResponse,
                          NodeActionResponse, NodeActionRequest, 
                          NodeStatusResponse, NodeStatusRequest,
-                         NodeHistoryResponse, NodeHistoryRequest)
+                         NodeHistoryResponse, NodeHistoryRequest, NodeHistoryExportRequest)
 from app.services import devices_service
-from app.db import get_db
+from app.db import get_db, get_async_db
 
 
 router = APIRouter()
 
 #4.1.1 添加主机
 @router.post("/host/add")
-async def add_host(data: HostCreate, db: Session = Depends(get_db)):
+def add_host(data: HostCreate, db: Session = Depends(get_db)):
     result = devices_service.add_host_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -30,7 +33,7 @@ async def add_host(data: HostCreate, db: Session = Depends(get_db)):
 
 #4.1.2 修改主机
 @router.post("/host/modify")
-async def modify_host(data: HostUpdate, db: Session = Depends(get_db)):
+def modify_host(data: HostUpdate, db: Session = Depends(get_db)):
     result = devices_service.modify_host_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -43,7 +46,7 @@ async def modify_host(data: HostUpdate, db: Session = Depends(get_db)):
 
 #4.1.3 删除主机
 @router.post("/host/delete")
-async def delete_host(data: HostDelete, db: Session = Depends(get_db)):
+def delete_host(data: HostDelete, db: Session = Depends(get_db)):
     result = devices_service.delete_host_service(db, db, data)
     if result["code"] != "0":
         raise HTTPException(
@@ -58,8 +61,8 @@ async def delete_host(data: HostDelete, db: Session = Depends(get_db)):
 
 #4.1.4 查询主机
 @router.post("/host/query")
-async def query_host(data: HostQuery, db: Session = Depends(get_db)):
-    result = devices_service.query_host_service(db, data)
+async def query_host(data: HostQuery, db: AsyncSession = Depends(get_async_db)):
+    result = await devices_service.query_host_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
             "what": result.get("what", "QRY_HOST"),
@@ -69,9 +72,50 @@ async def query_host(data: HostQuery, db: Session = Depends(get_db)):
         })
     return result
 
+#4.1.5 批量导入主机
+def _import_result(result):
+    if result["code"] != "0":
+        # 附带逐行错误，便于客户端定位
+        raise HTTPException(status_code=400, detail={
+            "what": result.get("what", "IMP_HOST"),
+            "code": result.get("code", "3"),
+            "errNo": result.get("errNo", "UnknownError"),
+            "errMsg": result.get("errMsg", "Unknown error"),
+            "errors": result.get("errors", [])
+        })
+    return result
+
+@router.post("/host/import")
+def import_hosts(data: HostImportRequest, db: Session = Depends(get_db)):
+    return _import_result(devices_service.import_hosts_service(db, data))
+
+@router.post("/host/import_csv")
+def import_hosts_csv(systemID: str, mode: str = "ADD", atomic: bool = False,
+                     csvFile: UploadFile = File(...), db: Session = Depends(get_db)):
+    try:
+        rows = devices_service.parse_host_csv(csvFile.file.read())
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail={
+            "what": "IMP_HOST", "code": "3", "errNo": "400", "errMsg": f"无法解析 CSV 文件: {e}"})
+    data = HostImportRequest(systemID=systemID, mode=mode, atomic=atomic, host=rows)
+    return _import_result(devices_service.import_hosts_service(db, data))
+
+#4.1.6 查询主机操作日志
+@router.post("/host/log/query")
+def query_host_logs(data: HostLogQuery, db: Session = Depends(get_db)):
+    result = devices_service.query_host_logs_service(db, data)
+    if result["code"] != "0":
+        raise HTTPException(status_code=400, detail={
+                "what": result.get("what"),
+                "code": result.get("code", "3"),
+                "errNo": result.get("errNo", "UnknownError"),
+                "errMsg": result.get("errMsg", "Unknown error")
+            })
+    return result
+
 #4.2.1 添加节点
 @router.post("/node/add")
-async def add_node(data: NodeCreate, db: Session = Depends(get_db)):
+def add_node(data: NodeCreate, db: Session = Depends(get_db)):
     try:
         result = devices_service.add_node_service(db, data)
         if result["code"] != "0":
@@ -86,7 +130,7 @@ async def add_node(data: NodeCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 #4.2.2 修改节点
 @router.post("/node/modify")
-async def modify_node(data: NodeUpdate, db: Session = Depends(get_db)):
+def modify_node(data: NodeUpdate, db: Session = Depends(get_db)):
     result = devices_service.modify_node_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -99,7 +143,7 @@ async def modify_node(data: NodeUpdate, db: Session = Depends(get_db)):
 
 #4.2.3 删除节点
 @router.post("/node/delete")
-async def delete_node(data: NodeDelete, db: Session = Depends(get_db)):
+def delete_node(data: NodeDelete, db: Session = Depends(get_db)):
     result = devices_service.delete_node_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -112,7 +156,7 @@ async def delete_node(data: NodeDelete, db: Session = Depends(get_db)):
 
 #4.2.4 查询节点
 @router.post("/node/query")
-async def query_node(data: NodeQuery, db: Session = Depends(get_db)):
+def query_node(data: NodeQuery, db: Session = Depends(get_db)):
     result = devices_service.query_node_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -123,9 +167,22 @@ async def query_node(data: NodeQuery, db: Session = Depends(get_db)):
             })
     return result
 
+#4.2.5 查询节点操作日志
+@router.post("/node/log/query")
+def query_node_logs(data: NodeLogQuery, db: Session = Depends(get_db)):
+    result = devices_service.query_node_logs_service(db, data)
+    if result["code"] != "0":
+        raise HTTPException(status_code=400, detail={
+                "what": result.get("what"),
+                "code": result.get("code", "3"),
+                "errNo": result.get("errNo", "UnknownError"),
+                "errMsg": result.get("errMsg", "Unknown error")
+            })
+    return result
+
 #4.3.1 添加分站
 @router.post("/substation/add")
-async def add_substation(data: SubstationCreate, db: Session = Depends(get_db)):
+def add_substation(data: SubstationCreate, db: Session = Depends(get_db)):
     result = devices_service.add_substation_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -138,7 +195,7 @@ async def add_substation(data: SubstationCreate, db: Session = Depends(get_db)):
 
 #4.3.2 修改分站
 @router.post("/substation/modify")
-async def modify_substation(data: SubstationUpdate, db: Session = Depends(get_db)):
+def modify_substation(data: SubstationUpdate, db: Session = Depends(get_db)):
     result = devices_service.modify_substation_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -151,7 +208,7 @@ async def modify_substation(data: SubstationUpdate, db: Session = Depends(get_db
 
 #4.3.3 删除分站
 @router.post("/substation/delete")
-async def delete_substation(data: SubstationDelete, db: Session = Depends(get_db)):
+def delete_substation(data: SubstationDelete, db: Session = Depends(get_db)):
     result = devices_service.delete_substation_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -164,7 +221,7 @@ async def delete_substation(data: SubstationDelete, db: Session = Depends(get_db
 
 #4.3.2 查询分站
 @router.post("/substation/query")
-async def query_substation(data: SubstationQuery, db: Session = Depends(get_db)):
+def query_substation(data: SubstationQuery, db: Session = Depends(get_db)):
     result = devices_service.query_substation_service(db, data)
     if result["code"] != "0":
         raise HTTPException(status_code=400, detail={
@@ -208,4 +265,22 @@ def query_node_status(request: NodeStatusRequest, db: Session = Depends(get_db))
 #6.3.4 查询节点历史数据
 @router.post("/query_node_history", response_model=NodeHistoryResponse)
 def query_node_history(request: NodeHistoryRequest, db: Session = Depends(get_db)):
-    return devices_service.query_node_history(db, request)
\ No newline at end of file
+    return devices_service.query_node_history(db, request)
+
+#6.3.5 导出节点历史数据（NDJSON/CSV 流式输出）
+@router.post("/export_node_history")
+def export_node_history(request: NodeHistoryExportRequest):
+    media_type = devices_service.EXPORT_MEDIA_TYPES.get(request.format.upper())
+    if media_type is None:
+        raise HTTPException(status_code=400, detail={
+            "what": "EXP_NODE_HISTORY",
+            "code": "3",
+            "errNo": "400",
+            "errMsg": f"不支持的导出格式: {request.format}"
+        })
+    filename = f"node_{request.nodeID}_{request.beginDay}_{request.endDay}.{request.format.lower()}"
+    return StreamingResponse(
+        devices_service.export_node_history(request),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
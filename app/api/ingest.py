@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Union
+
+from fastapi import APIRouter, Body, HTTPException
+
+from app.services import ingest_service
+from app.services.telemetry_service import telemetry
+
+router = APIRouter()
+
+#7.1.1 ChirpStack HTTP 集成上行数据接入
+@router.post("/chirpstack/uplink")
+def chirpstack_uplink(event: str = "up", payload: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(...)):
+    # ChirpStack 对所有事件使用同一 URL，通过 ?event= 区分，这里只处理 up 事件
+    if event != "up":
+        return {"what": "UPLINK", "code": "0", "number": 0, "accepted": 0}
+
+    events = payload if isinstance(payload, list) else [payload]
+    result = ingest_service.handle_uplink_events(events)
+    if events and result["accepted"] == 0:
+        raise HTTPException(status_code=400, detail={
+            "what": "UPLINK",
+            "code": "3",
+            "errNo": "404",
+            "errMsg": "上行数据无法解析或设备未注册"
+        })
+    return result
+
+#7.1.2 查询接入写入统计
+@router.get("/chirpstack/stats")
+def chirpstack_stats():
+    return {"what": "QRY_UPLINK", "code": "0", **ingest_service.history_writer.stats(), **telemetry.stats()}
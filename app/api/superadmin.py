@@ -1,7 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Optional
 
 from app.schemas import SystemCreate, SystemUpdate, SystemListResponse, SuperAdminLoginRequest, UploadBackgroundImageResponse, CheckSystemAvailabilityRequest
 
@@ -25,7 +27,7 @@ from app.db import get_db
 router = APIRouter()
 #1.1.1 获取短信验证码
 @router.get("/superadmin/get_sms_verification")
-async def get_sms_verification(superID: str, superPasswd: str, needAnswer: str = 'no', db: Session = Depends(get_db)):
+def get_sms_verification(superID: str, superPasswd: str, needAnswer: str = 'no', db: Session = Depends(get_db)):
     # 验证超级管理员ID和密码
     admin = verify_superadmin_credentials(db, superID, superPasswd)
     if not admin:
@@ -45,7 +47,7 @@ async def get_sms_verification(superID: str, superPasswd: str, needAnswer: str =
 
 #1.1.2 超级管理员登录
 @router.post("/superadmin/login")
-async def superadmin_login(request: SuperAdminLoginRequest, db: Session = Depends(get_db)):
+def superadmin_login(request: SuperAdminLoginRequest, db: Session = Depends(get_db)):
     superID = request.superID
     superPasswd = request.superPasswd
     verifyCode = request.verifyCode
@@ -120,7 +122,8 @@ async def upload_background_image(systemID: str, pngFile: UploadFile = File(...)
     file_content = await pngFile.read()
     print(f"Received systemID: {systemID}, pngFile name: {pngFile.filename}")
 
-    file_token, error_msg = handle_background_image_upload(db, systemID, file_content, pngFile.filename)
+    # 保存文件和写库是阻塞操作，放到线程池执行
+    file_token, error_msg = await run_in_threadpool(handle_background_image_upload, db, systemID, file_content, pngFile.filename)
     
     # 打印调试信息
     print(f"file_token: {file_token}, error_msg: {error_msg}")
@@ -153,7 +156,7 @@ def manage_system(systemID: str, manage: str, db: Session = Depends(get_db)):
 
 #1.2.6 管理系统列表
 @router.get("/superadmin/list_systems", response_model=SystemListResponse)
-def list_managed_systems(superID: str, first: int = 0, number: int = 10, db: Session = Depends(get_db)):
+def list_managed_systems(superID: str, first: int = 0, number: int = 10, after: Optional[str] = None, db: Session = Depends(get_db)):
     print(f"superID: {superID}")  # 添加调试信息
     if not validate_superadmin(db, superID):
         print("Invalid superID")  # 打印无效superID的日志
@@ -167,7 +170,7 @@ def list_managed_systems(superID: str, first: int = 0, number: int = 10, db: Ses
         }
 
     try:
-        systems = list_managed_systems_service(db, first, number)
+        page = list_managed_systems_service(db, first, number, after)
         system_list = [
             {
                 "systemID": system.system_id,
@@ -175,14 +178,16 @@ def list_managed_systems(superID: str, first: int = 0, number: int = 10, db: Ses
                 "adminID": system.admin_id,
                 "setupDate": system.created_at.strftime("%Y-%m-%d %H:%M:%S")
             }
-            for system in systems
+            for system in page.rows
         ]
 
         return {"what": "GET_SUPERLIST", "code": "0", 
                 "errNo": "0",  # 添加 errNo，设置为默认值
                 "errMsg": "",  # 添加 errMsg，设置为空字符串
                 "number": len(system_list), 
-                "system": system_list}
+                "total": page.total,
+                "system": system_list,
+                "next": page.next}
 
     except Exception as e:
         print(f"Exception: {e}")  # 打印异常信息
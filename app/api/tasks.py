@@ -3,10 +3,12 @@ from sqlalchemy.orm import Session
 from app.services.tasks_services import (add_task, modify_task, remove_task, 
                                          query_task,set_task_run_mode, 
                                          query_task_run_mode,
-                                         query_task_history, query_all_task_run_modes)
+                                         query_task_history, query_all_task_run_modes,
+                                         preview_tasks)
 from app.schemas import (TaskCreate, TaskUpdate, TaskDelete, TaskQuery, 
                          TaskResponse, TaskRunModeRequest, TaskRunModeResponse,
-                         TaskHistoryRequest, TaskHistoryResponse,SystemTaskRunModeResponse, SystemTaskRunModeRequest)
+                         TaskHistoryRequest, TaskHistoryResponse,SystemTaskRunModeResponse, SystemTaskRunModeRequest,
+                         TaskPreviewRequest, TaskPreviewResponse)
 from app.db import get_db
 from .. import schemas, services
 
@@ -20,7 +22,7 @@ def add_task_endpoint(task: TaskCreate, db: Session = Depends(get_db)):
         return TaskResponse(
             what="ADD_TASK",
             code="0",
-            taskID=new_task.task_id,  # 任务顺序号
+            taskID=str(new_task.task_id),  # 任务顺序号
             taskName=new_task.task_name  # 任务名称
         )
     except Exception as e:
@@ -39,7 +41,7 @@ def update_task_endpoint(task: TaskUpdate, db: Session = Depends(get_db)):
             return TaskResponse(
                 what="MDF_TASK",
                 code="0",
-                taskID=updated_task.task_id,  # 使用下划线命名
+                taskID=str(updated_task.task_id),  # 使用下划线命名
                 taskName=updated_task.task_name
             )
         else:
@@ -60,7 +62,7 @@ def delete_task_endpoint(task: TaskDelete, db: Session = Depends(get_db)):
             return TaskResponse(
                 what="DEL_TASK",
                 code="0",
-                taskID=deleted_task.task_id,
+                taskID=str(deleted_task.task_id),
                 taskName=deleted_task.task_name
             )
         else:
@@ -100,6 +102,11 @@ def query_task_endpoint(task: TaskQuery, db: Session = Depends(get_db)):
             errMsg=f"任务查询失败: {str(e)}"
         )
 
+#5.1.5 预览任务触发时间
+@router.post("/task/preview", response_model=TaskPreviewResponse)
+def preview_task_endpoint(request: TaskPreviewRequest, db: Session = Depends(get_db)):
+    return preview_tasks(db, request)
+
 #6.1.1 设置任务运行模式
 @router.post("/set_mode", response_model=TaskRunModeResponse)
 def set_task_run_mode(request: TaskRunModeRequest, db: Session = Depends(get_db)):
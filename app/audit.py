@@ -0,0 +1,142 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.oplog import PartitionedLog, host_logs, node_logs
+
+# 主机/节点操作日志异步批量写入：请求中只把日志放入内存队列，由后台线程按条数或时间阈值批量插入，
+# 业务数据提交后不再为日志单独提交一次事务；服务退出时写入队列中剩余的日志。日志写入按月分区的表（见 app/oplog.py）
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+class AuditLogWriter:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 maxsize: int = settings.AUDIT_QUEUE_SIZE,
+                 batch_size: int = settings.AUDIT_BATCH_SIZE,
+                 flush_interval: float = settings.AUDIT_FLUSH_INTERVAL,
+                 overflow: str = settings.AUDIT_OVERFLOW,
+                 block_timeout: float = settings.AUDIT_BLOCK_TIMEOUT):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的日志队列溢出策略: {overflow}")
+        self.session_factory = session_factory
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._buffer: List[tuple] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.errors = 0
+
+    def host(self, host_no: int, operation: str, status_code: str = "0", user: Optional[str] = None) -> bool:
+        return self.record(host_logs, {"host_no": host_no, "operation": operation,
+                                               "status_code": status_code, "user": user})
+
+    def node(self, node_id: int, operation: str, status_code: str = "0", user: Optional[str] = None) -> bool:
+        return self.record(node_logs, {"node_id": node_id, "operation": operation,
+                                               "status_code": status_code, "user": user})
+
+    def record(self, log: PartitionedLog, values: Dict[str, Any]) -> bool:
+        # 日志时间取入队时刻，而不是写入时刻
+        values.setdefault("created_at", datetime.now())
+        inline = False
+        with self._cond:
+            if len(self._buffer) >= self.maxsize:
+                if self.overflow == "drop":
+                    self.dropped += 1
+                    return False
+                self.blocked += 1
+                self._cond.notify_all()
+                if self._running:
+                    self._cond.wait_for(lambda: len(self._buffer) < self.maxsize, self.block_timeout)
+                # 后台线程未运行或等待超时：由调用方直接写入，限制队列长度
+                inline = len(self._buffer) >= self.maxsize
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append((log, values))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        if inline:
+            self.flush()
+        return True
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _take(self) -> List[tuple]:
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+            self._oldest = None
+            self._cond.notify_all()
+        return batch
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            rows: Dict[PartitionedLog, List[Dict[str, Any]]] = {}
+            for log, values in batch:
+                rows.setdefault(log, []).append(values)
+
+            db = self.session_factory()
+            try:
+                for log, values in rows.items():
+                    log.insert(db, values)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self.errors += 1
+                print(f"写入操作日志失败，丢弃 {len(batch)} 条: {e}")
+                return 0
+            finally:
+                db.close()
+            self.written += len(batch)
+            return len(batch)
+
+    def _run(self) -> None:
+        while self._running:
+            with self._cond:
+                if len(self._buffer) < self.batch_size:
+                    timeout = self.flush_interval
+                    if self._oldest is not None:
+                        timeout = max(0.0, self._oldest + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+            self.flush()
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "pending": self.pending(), "dropped": self.dropped,
+                "blocked": self.blocked, "errors": self.errors}
+
+
+audit_log = AuditLogWriter()
@@ -1,4 +1,6 @@
+import os
 import secrets
+import tempfile
 
 #用于加密和解密数据的密钥。它用于生成和验证 JWT（JSON Web Tokens）、加密会话数据等。
 SECRET_KEY = secrets.token_hex(32)  # 生成一个 64 字符的十六进制字符串
@@ -7,4 +9,93 @@ SECRET_KEY = secrets.token_hex(32)  # 生成一个 64 字符的十六进制字
 ALGORITHM = "HS256"  # 选择对称加密算法
 
 #设置访问令牌（Access Token）的过期时间，以分钟为单位。
-ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 访问令牌过期时间为 60 分钟
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 访问令牌过期时间为 60 分钟
+
+#ChirpStack 上行数据接入：批量写入 node_history 的条数阈值与最长等待时间（秒）
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))
+#写入失败后同一批数据最多重试的次数与重试间隔（秒），超过后丢弃
+INGEST_RETRY_LIMIT = int(os.getenv("INGEST_RETRY_LIMIT", "5"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "1.0"))
+
+#本地 MQTT 替身队列长度，超过后 publish 会阻塞等待消费
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100000"))
+
+#历史数据列式存储：每块最多样本数、时间分区跨度（小时）
+TSDB_CHUNK_SIZE = int(os.getenv("TSDB_CHUNK_SIZE", "4096"))
+TSDB_PARTITION_HOURS = int(os.getenv("TSDB_PARTITION_HOURS", "24"))
+
+#历史查询使用预聚合时，结果至少包含的桶数（用于选择聚合粒度）
+ROLLUP_MIN_POINTS = int(os.getenv("ROLLUP_MIN_POINTS", "24"))
+
+#历史数据导出时每批读取并编码的行数
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+#WebSocket 推送：每个连接待发送消息的上限，超过后丢弃最旧的消息
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+
+#实时数据推送窗口（秒），窗口内同一设备的多条上行只推送最新一条
+WS_COALESCE_WINDOW = float(os.getenv("WS_COALESCE_WINDOW", "0.25"))
+
+#多 worker 推送转发后端：不配置时仅本进程推送，可选 memory / local（同机 Unix 套接字）/ redis
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "")
+PUBSUB_CHANNEL = os.getenv("PUBSUB_CHANNEL", "iotserver:ws")
+PUBSUB_SOCKET_DIR = os.getenv("PUBSUB_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "iotserver-ws"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+#异步数据库连接池：常驻连接数、允许临时超出的连接数、获取连接的等待时间（秒）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+#数据库连接：支持 sqlite:/// 与 postgresql://，异步会话自动换用 aiosqlite / asyncpg 驱动
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///smart_park_management.db")
+
+#连接回收时间（秒）、取用前检测连接是否可用、单条语句超时（毫秒，PostgreSQL 为 statement_timeout，SQLite 为锁等待时间）
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+#SQLite 参数：启用 WAL 允许读写并发，mmap 映射大小（字节），页缓存大小（KB）
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") not in ("0", "false", "False")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+#操作日志异步写入：队列上限、每批条数、最长等待时间（秒）
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+#队列满时的处理：block 等待后台写入（超过 AUDIT_BLOCK_TIMEOUT 秒则由请求线程直接写入），drop 丢弃并计数
+AUDIT_OVERFLOW = os.getenv("AUDIT_OVERFLOW", "block")
+AUDIT_BLOCK_TIMEOUT = float(os.getenv("AUDIT_BLOCK_TIMEOUT", "1.0"))
+
+#操作日志按月分区保留天数（0 表示不删除）与过期分区检查间隔（秒）
+OPLOG_RETENTION_DAYS = int(os.getenv("OPLOG_RETENTION_DAYS", "180"))
+OPLOG_RETENTION_INTERVAL = float(os.getenv("OPLOG_RETENTION_INTERVAL", "3600"))
+
+#短信验证码存储：memory（单进程）或 redis（多 worker 共享，使用 REDIS_URL）、有效期（秒）、每个账号最多保留的验证码数
+VERIFY_STORE_BACKEND = os.getenv("VERIFY_STORE_BACKEND", "memory")
+VERIFY_CODE_TTL = int(os.getenv("VERIFY_CODE_TTL", "300"))
+VERIFY_MAX_CODES_PER_ID = int(os.getenv("VERIFY_MAX_CODES_PER_ID", "1"))  # 默认新验证码使旧验证码失效
+
+#定时/循环任务调度线程只在一个进程中运行：auto（同机的 worker 通过文件锁 SCHEDULER_LOCK_PATH 选出一个，
+#持锁进程退出后其他 worker 在 SCHEDULER_ELECTION_INTERVAL 秒内接管）、on（总是运行）、off（不运行）；多台机器部署时只在一台上运行
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "auto")
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", os.path.join(tempfile.gettempdir(), "iotserver-scheduler.lock"))
+SCHEDULER_ELECTION_INTERVAL = float(os.getenv("SCHEDULER_ELECTION_INTERVAL", "5"))
+
+#传感任务阈值规则：回差（高低阈值间距的比例，越过阈值后需回到阈值内该距离才解除）、去抖（连续多少个样本满足才切换状态）
+SENSOR_RULE_HYSTERESIS = float(os.getenv("SENSOR_RULE_HYSTERESIS", "0.05"))
+SENSOR_RULE_DEBOUNCE = int(os.getenv("SENSOR_RULE_DEBOUNCE", "2"))
+#一批样本数不少于该值时使用 NumPy 批量判断
+SENSOR_RULE_BATCH_MIN = int(os.getenv("SENSOR_RULE_BATCH_MIN", "256"))
+
+#任务动作下发：未设置 concurrent 时同时动作的分站数、相邻两批之间的间隔（秒）、单个分站动作超时（秒）、下发线程数、同时执行的任务数
+ACTUATION_DEFAULT_CONCURRENT = int(os.getenv("ACTUATION_DEFAULT_CONCURRENT", "10"))
+ACTUATION_WAVE_INTERVAL = float(os.getenv("ACTUATION_WAVE_INTERVAL", "0.5"))
+ACTUATION_SEND_TIMEOUT = float(os.getenv("ACTUATION_SEND_TIMEOUT", "10"))
+ACTUATION_WORKERS = int(os.getenv("ACTUATION_WORKERS", "32"))
+ACTUATION_MAX_RUNS = int(os.getenv("ACTUATION_MAX_RUNS", "8"))
+
+#任务触发预览：每个任务最多返回的触发次数
+TASK_PREVIEW_MAX_NUMBER = int(os.getenv("TASK_PREVIEW_MAX_NUMBER", "1000"))
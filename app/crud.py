@@ -1,17 +1,26 @@
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 
 from app.models import Report as ReportModel
+from app.models import generate_area_id
 from app.models import (SuperAdmin, System, Host, Node, HostOperationsLog, NodeOperationsLog, 
-                    Area, System, User, BackgroundImage, Substation, Task,
+                    Area, System, User, BackgroundImage, Substation, Task, TaskStartTime, TaskSenseParam, TaskStation,
                     HistoryData, NodeHistory)
 
 from app.schemas import (SystemCreate, SystemUpdate, Station,
-                     HostCreate, HostUpdate, HostDelete, HostQuery, NodeCreate, NodeUpdate, 
+                     HostCreate, HostUpdate, HostDelete, HostQuery, HostImportRow, HostLogQuery, NodeLogQuery, NodeCreate, NodeUpdate, 
                      NodeDelete, NodeQuery, SubstationCreate, 
                      SubstationUpdate, SubstationDelete, SubstationQuery)
 from passlib.context import CryptContext
+from app.tsdb import ts_store, node_series, station_series, to_ms
+from app import rollups
+from app.audit import audit_log
+from app.oplog import host_logs, node_logs
+from app.schedule import parse_clock, parse_date
+from app.pagination import InvalidCursor, Page, build_page, keyset_query, paginate
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -53,11 +62,10 @@ def update_system(db: Session, system_data: SystemUpdate):
     return system
 
 
-def list_systems(db: Session, first: int = 0, number: int = 10):
-    query = db.query(System).offset(first)
-    if number > 0:
-        query = query.limit(number)
-    return query.all()
+SYSTEM_KEY = [System.system_id]
+
+def list_systems(db: Session, first: int = 0, number: int = 10, after: Optional[str] = None) -> Page:
+    return paginate(db.query(System), SYSTEM_KEY, first, number, after)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -115,14 +123,8 @@ def add_host(db: Session, data: HostCreate) -> Dict:
     db.commit()
     db.refresh(host)
     
-    # 记录操作日志
-    log = HostOperationsLog(
-        host_no=data.hostNo,
-        operation="ADD",
-        status_code="0"
-    )
-    db.add(log)
-    db.commit()
+    # 记录操作日志（异步批量写入）
+    audit_log.host(data.hostNo, "ADD")
     
     return {"what": "ADD_HOST", "code": "0", "hostNo": host.host_no, "devEUI": host.dev_eui}
 
@@ -144,14 +146,8 @@ def modify_host(db: Session, data: HostUpdate) -> Dict:
     
     db.commit()
     
-    # 记录操作日志
-    log = HostOperationsLog(
-        host_no=data.hostNo,
-        operation="MODIFY",
-        status_code="0"
-    )
-    db.add(log)
-    db.commit()
+    # 记录操作日志（异步批量写入）
+    audit_log.host(data.hostNo, "MODIFY")
     
     return {"what": "MDF_HOST", "code": "0", "hostNo": host.host_no, "devEUI": host.dev_eui}
 
@@ -163,20 +159,106 @@ def delete_host(db: Session, data: HostDelete) -> Dict:
     db.delete(host)
     db.commit()
     
-    # 记录操作日志
-    log = HostOperationsLog(
-        host_no=data.hostNo,
-        operation="DELETE",
-        status_code="0"
-    )
-    db.add(log)
-    db.commit()
+    # 记录操作日志（异步批量写入）
+    audit_log.host(data.hostNo, "DELETE")
     
     return {"what": "DEL_HOST", "code": "0", "hostNo": host.host_no, "devEUI": host.dev_eui}
 
-def query_host(db: Session, data: HostQuery) -> Dict:
-    # 查询主机信息，使用分页
-    hosts = db.query(Host).filter(Host.system_id == data.systemID).offset(data.first).limit(data.number).all()
+# IN 查询每批的参数个数，低于 SQLite 的绑定参数上限
+IN_CHUNK_SIZE = 500
+
+def chunked(items: List[Any], size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# 导入行字段 -> 主机列
+HOST_IMPORT_FIELDS = {
+    "devEUI": "dev_eui",
+    "hostType": "host_type",
+    "hostName": "host_name",
+    "maxConnection": "max_connection",
+    "location": "location",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "userName": "user_name",
+    "phoneNum": "phone_num",
+    "memo": "memo",
+}
+
+def import_hosts(db: Session, system_id: str, rows: List[tuple], mode: str = "ADD", atomic: bool = False) -> Dict:
+    # rows 为已通过格式校验的 (行号, HostImportRow)；先分批预取已存在的主机，再在一个事务内批量写入主机与操作日志
+    host_nos = [row.hostNo for _, row in rows]
+    existing = {}
+    for chunk in chunked(host_nos):
+        for host_no, host_id, owner in db.execute(
+                select(Host.host_no, Host.id, Host.system_id).where(Host.host_no.in_(chunk))):
+            existing[host_no] = (host_id, owner)
+    eui_owner = {}
+    for chunk in chunked([row.devEUI for _, row in rows if row.devEUI]):
+        eui_owner.update(db.execute(select(Host.dev_eui, Host.host_no).where(Host.dev_eui.in_(chunk))).all())
+
+    inserts, updates, errors = [], [], []
+    for index, row in rows:
+        current = existing.get(row.hostNo)
+        owner = eui_owner.get(row.devEUI)
+        if current is not None and mode != "UPSERT":
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "主机编号已存在"})
+            continue
+        if current is not None and current[1] != system_id:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "主机编号属于其他系统"})
+            continue
+        if current is None and not row.devEUI:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "缺少 devEUI"})
+            continue
+        if owner is not None and owner != row.hostNo:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "devEUI 已被其他主机使用"})
+            continue
+        if current is None:
+            inserts.append({"system_id": system_id, "host_no": row.hostNo,
+                            **{column: getattr(row, field) for field, column in HOST_IMPORT_FIELDS.items()}})
+        else:
+            # 只更新本行填写的字段，未填写的保留原值；虚拟主机保留原有 devEUI，不因重新导入而改变设备标识
+            fields = row.model_fields_set - ({"devEUI"} if row.hostType == "VIRTUAL" else set())
+            updates.append({"id": current[0], "host_no": row.hostNo,
+                            **{column: getattr(row, field) for field, column in HOST_IMPORT_FIELDS.items()
+                               if field in fields}})
+
+    if errors and atomic:
+        return {"what": "IMP_HOST", "code": "3", "errNo": "400", "errMsg": "存在无效数据，未导入任何主机",
+                "number": 0, "added": 0, "updated": 0, "errors": errors}
+
+    logs = [{"host_no": v["host_no"], "operation": "ADD", "status_code": "0"} for v in inserts]
+    logs += [{"host_no": v["host_no"], "operation": "MODIFY", "status_code": "0"} for v in updates]
+    try:
+        if inserts:
+            db.execute(insert(Host), inserts)
+        if updates:
+            # 按主键批量更新
+            db.execute(update(Host), updates)
+        if logs:
+            host_logs.insert(db, logs)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {"what": "IMP_HOST", "code": "3", "errNo": "1001", "errMsg": str(e),
+                "number": 0, "added": 0, "updated": 0, "errors": errors}
+
+    return {"what": "IMP_HOST", "code": "0", "number": len(logs), "added": len(inserts),
+            "updated": len(updates), "errors": errors}
+
+HOST_KEY = [Host.host_no]
+
+async def query_host(db: AsyncSession, data: HostQuery) -> Dict:
+    # 查询主机信息，使用分页（异步会话，不阻塞事件循环）；携带 after 游标时按 hostNo 续读
+    base = select(Host).filter(Host.system_id == data.systemID)
+    try:
+        stmt = keyset_query(base, HOST_KEY, data.first, data.number, data.after)
+    except InvalidCursor as e:
+        return {"what": "QRY_HOST", "code": "3", "errNo": "400", "errMsg": str(e)}
+    result = await db.execute(stmt)
+    # 结果附带总数列
+    page = build_page(result.all(), HOST_KEY, data.number)
+    hosts = page.rows
 
     if not hosts:
         return {
@@ -208,7 +290,9 @@ def query_host(db: Session, data: HostQuery) -> Dict:
         "what": "QRY_HOST",
         "code": "0",
         "number": len(host_list),  # 返回主机的数量
-        "host": host_list
+        "total": page.total,  # 符合条件的主机总数
+        "host": host_list,
+        "next": page.next  # 下一页游标，最后一页为空
     }
 
 
@@ -232,16 +316,9 @@ def add_node(db: Session, data: NodeCreate) -> Dict:
         db.add_all(nodes)
         db.commit()
         
-        # 记录日志
+        # 记录日志（异步批量写入）
         for node in nodes:
-            log = NodeOperationsLog(
-                node_id=node.id,
-                operation="ADD",
-                status_code="0"
-            )
-            db.add(log)
-        
-        db.commit()
+            audit_log.node(node.id, "ADD")
 
         # 返回成功信息，包括 nodeNo 和 devEUI
         return {
@@ -260,48 +337,50 @@ def add_node(db: Session, data: NodeCreate) -> Dict:
             "errMsg": "Failed to add nodes"
         }
         
+# 请求字段 -> 节点列名，只允许修改这些字段
+NODE_MODIFY_FIELDS = {
+    "devName": "dev_name",
+    "devType": "dev_type",
+    "devPort": "dev_port",
+    "location": "location",
+    "memo": "memo",
+}
+
 def modify_node(db: Session, data: NodeUpdate) -> Dict:
+    # 未使用 controller 时按单个节点修改
+    items = data.controller or [{"nodeNo": data.nodeNo, "devName": data.nodeName,
+                                 "location": data.location, "memo": data.memo}]
+    # 按 nodeNo 建立索引，同一节点出现多次时以最后一项为准
+    requested = {}
+    errors = []
+    for item in items:
+        node_no = item.get("nodeNo")
+        if not isinstance(node_no, int):
+            errors.append({"nodeNo": node_no, "errMsg": "缺少 nodeNo"})
+            continue
+        requested[node_no] = {column: item[field] for field, column in NODE_MODIFY_FIELDS.items()
+                              if item.get(field) is not None}
+
     try:
-        # 查找对应的节点，通过 nodeNo 来匹配
-        nodes = db.query(Node).filter(Node.id.in_([d["nodeNo"] for d in data.controller])).all()
-        
-        if not nodes:
-            return {"what": "MDF_NODE", "code": "3", "errNo": "404", "errMsg": "Nodes not found"}
-        
-        # 更新节点信息
-        for node in nodes:
-            update_data = next((item for item in data.controller if item["nodeNo"] == node.id), {})
-            node.dev_name = update_data.get("devName", node.dev_name)
-            node.dev_type = update_data.get("devType", node.dev_type)
-            node.dev_port = update_data.get("devPort", node.dev_port)
-            node.uplink_addr = update_data.get("uplinkAddr", node.uplink_addr)
-            node.uplink_param = update_data.get("uplinkParam", node.uplink_param)
-            node.downlink_addr = update_data.get("downlinkAddr", node.downlink_addr)
-            node.downlink_param = update_data.get("downlinkParam", node.downlink_param)
-            node.memo = update_data.get("memo", node.memo)
-        
-        # 提交更新
-        db.commit()
-        
-        # 记录修改日志
-        for node in nodes:
-            log = NodeOperationsLog(
-                node_id=node.id,
-                operation="MODIFY",
-                status_code="0"
-            )
-            db.add(log)
-        
+        dev_euis = {}
+        for chunk in chunked(list(requested)):
+            dev_euis.update(db.execute(
+                select(Node.id, Node.dev_eui).where(Node.id.in_(chunk), Node.system_id == data.systemID,
+                                                    Node.host_no == data.hostNo)).all())
+        updates = []
+        for node_no, values in requested.items():
+            if node_no not in dev_euis:
+                errors.append({"nodeNo": node_no, "errMsg": "Node not found"})
+            elif values:
+                updates.append({"id": node_no, **values})
+        if not dev_euis:
+            return {"what": "MDF_NODE", "code": "3", "errNo": "404", "errMsg": "Nodes not found", "errors": errors}
+
+        # 按主键批量更新，修改日志在同一事务中写入
+        if updates:
+            db.execute(update(Node), updates)
+        node_logs.insert(db, [{"node_id": node_no, "operation": "MODIFY", "status_code": "0"} for node_no in dev_euis])
         db.commit()
-        
-        # 返回修改成功的信息，包括 nodeNo 和 devEUI
-        return {
-            "what": "MDF_NODE",
-            "code": "0",
-            "number": len(nodes),
-            "node": [{"nodeNo": node.id, "devEUI": node.dev_eui} for node in nodes]
-        }
-    
     except Exception as e:
         db.rollback()  # 出现错误时回滚事务
         return {
@@ -310,6 +389,15 @@ def modify_node(db: Session, data: NodeUpdate) -> Dict:
             "errNo": "500",
             "errMsg": "Failed to modify nodes"
         }
+
+    # 返回修改成功的节点（nodeNo 和 devEUI）及逐个节点的错误
+    return {
+        "what": "MDF_NODE",
+        "code": "0",
+        "number": len(dev_euis),
+        "node": [{"nodeNo": node_no, "devEUI": dev_eui} for node_no, dev_eui in sorted(dev_euis.items())],
+        "errors": errors
+    }
         
 def delete_node(db: Session, data: NodeDelete) -> Dict:
     try:
@@ -327,16 +415,9 @@ def delete_node(db: Session, data: NodeDelete) -> Dict:
         # 提交事务
         db.commit()
         
-        # 记录删除操作日志
+        # 记录删除操作日志（异步批量写入）
         for node in nodes:
-            log = NodeOperationsLog(
-                node_id=node.id,
-                operation="DELETE",
-                status_code="0"
-            )
-            db.add(log)
-        
-        db.commit()
+            audit_log.node(node.id, "DELETE")
         
         # 返回删除成功的信息，包括 nodeNo 和 devEUI
         return {
@@ -355,15 +436,39 @@ def delete_node(db: Session, data: NodeDelete) -> Dict:
             "errMsg": "Failed to delete nodes"
         }
         
+def _log_list(rows: List[Dict], key: str, field: str) -> List[Dict]:
+    return [{
+        field: row[key],
+        "operation": row["operation"],
+        "user": row["user"],
+        "statusCode": row["status_code"],
+        "statusMessage": row["status_message"],
+        "time": row["created_at"].strftime("%Y-%m-%d %H:%M:%S") if row["created_at"] else None
+    } for row in rows]
+
+def query_host_logs(db: Session, data: HostLogQuery) -> Dict:
+    # 只读取与时间范围重叠的月分区
+    rows = host_logs.query(db, parse_day(data.beginDay), parse_day(data.endDay, end_of_day=True),
+                           data.hostNo, data.number)
+    return {"what": "QRY_HOST_LOG", "code": "0", "number": len(rows), "log": _log_list(rows, "host_no", "hostNo")}
+
+def query_node_logs(db: Session, data: NodeLogQuery) -> Dict:
+    rows = node_logs.query(db, parse_day(data.beginDay), parse_day(data.endDay, end_of_day=True),
+                           data.nodeNo, data.number)
+    return {"what": "QRY_NODE_LOG", "code": "0", "number": len(rows), "log": _log_list(rows, "node_id", "nodeNo")}
+
+NODE_KEY = [Node.id]
+
 def query_node(db: Session, data: NodeQuery) -> Dict:
     # 查询条件：根据 systemID 和 hostNo 筛选节点
     query = db.query(Node).filter(Node.system_id == data.systemID, Node.host_no == data.hostNo)
 
-    # 如果 `number` 为 0，返回所有节点，否则分页返回
-    if data.number > 0:
-        query = query.offset(data.first).limit(data.number)
-    
-    nodes = query.all()
+    # 如果 `number` 为 0，返回所有节点，否则分页返回（携带 after 游标时按节点 ID 续读）
+    try:
+        page = paginate(query, NODE_KEY, data.first, data.number, data.after)
+    except InvalidCursor as e:
+        return {"what": "QRY_NODE", "code": "3", "errNo": "400", "errMsg": str(e)}
+    nodes = page.rows
 
     # 如果没有查询到节点，返回错误信息
     if not nodes:
@@ -379,6 +484,7 @@ def query_node(db: Session, data: NodeQuery) -> Dict:
         "what": "QRY_NODE",
         "code": "0",
         "number": len(nodes),
+        "total": page.total,
         "controller": [
             {
                 "devEUI": node.dev_eui,
@@ -391,9 +497,22 @@ def query_node(db: Session, data: NodeQuery) -> Dict:
                 "downlinkParam": node.downlink_param,
                 "memo": node.memo
             } for node in nodes
-        ]
+        ],
+        "next": page.next
     }
 
+# 请求字段 -> 分站列名
+SUBSTATION_FIELDS = {
+    "stationName": "station_name",
+    "portNo": "port_no",
+    "areaID": "area_id",
+    "drvType": "drv_type",
+    "drvTime": "drv_time",
+    "mbAddr": "mb_addr",
+    "mbParam": "mb_param",
+    "memo": "memo",
+}
+
 def add_substation(db: Session, data: SubstationCreate) -> Dict:
     #检查分站数量是否为正数
     if data.number <= 0:
@@ -405,27 +524,19 @@ def add_substation(db: Session, data: SubstationCreate) -> Dict:
         }
 
     stations = []
-    for i in range(data.number):
+    for controller_data in data.controller[:data.number]:
         # 从 controller 中获取对应的分站数据
-        controller_data = data.controller[i]
-        
-        substation = Substation(
-            system_id=data.systemID,
-            host_no=data.hostNo,
-            node_no=data.nodeNo,
-            substation_name=controller_data["stationName"],
-            port_no=controller_data["portNo"],
-            area_id=controller_data["areaID"],
-            drv_type=controller_data["drvType"],
-            drv_time=controller_data["drvTime"],
-            mb_addr=controller_data["mbAddr"],
-            mb_param=controller_data["mbParam"],
-            memo=controller_data.get("memo", "")
-        )
+        values = {column: controller_data.get(field) for field, column in SUBSTATION_FIELDS.items()}
+        values["memo"] = controller_data.get("memo", "")
+        substation = Substation(system_id=data.systemID, host_no=data.hostNo, node_no=data.nodeNo, **values)
         db.add(substation)
         stations.append(substation)
 
-    db.commit()
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {"what": "ADD_STATION", "code": "3", "errNo": "500", "errMsg": str(e)}
     
     # 将所有添加的分站刷新并返回
     return {
@@ -439,7 +550,22 @@ def add_substation(db: Session, data: SubstationCreate) -> Dict:
             } for station in stations
         ]
     }
-    
+
+def _station_ids(items: List[Any]) -> List[int]:
+    ids = []
+    for item in items:
+        station_id = item.get("stationID") if isinstance(item, dict) else item.stationID
+        ids.append(int(station_id))
+    return ids
+
+def _existing_stations(db: Session, system_id: str, station_ids: List[int]) -> Dict[int, int]:
+    # 分批 IN 查询本系统中存在的分站，返回 stationID -> portNo
+    ports = {}
+    for chunk in chunked(station_ids):
+        ports.update(db.execute(select(Substation.id, Substation.port_no)
+                                .where(Substation.id.in_(chunk), Substation.system_id == system_id)).all())
+    return ports
+
 def modify_substation(db: Session, data: SubstationUpdate) -> Dict:
     if data.number <= 0:
         return {
@@ -448,58 +574,69 @@ def modify_substation(db: Session, data: SubstationUpdate) -> Dict:
             "errNo": "400",
             "errMsg": "Number of substations to modify must be greater than 0"
         }
-    
-    updated_stations = []
-    for i in range(data.number):
-        # 获取 controller 中的分站数据
-        controller_data = data.controller[i]
-
-        substation = db.query(Substation).filter(Substation.id == controller_data["stationID"]).one_or_none()
-        if not substation:
-            return {"what": "MDF_STATION", "code": "3", "errNo": "404", "errMsg": f"Substation {controller_data['stationID']} not found"}
-
-        # 更新分站信息
-        substation.substation_name = controller_data["stationName"]
-        substation.port_no = controller_data["portNo"]
-        substation.area_id = controller_data["areaID"]
-        substation.drv_type = controller_data["drvType"]
-        substation.drv_time = controller_data["drvTime"]
-        substation.mb_addr = controller_data["mbAddr"]
-        substation.mb_param = controller_data["mbParam"]
-        substation.memo = controller_data.get("memo", "")
-        
-        updated_stations.append(substation)
 
-    db.commit()
-    
+    items = data.controller[:data.number]
+    try:
+        station_ids = _station_ids(items)
+    except (KeyError, TypeError, ValueError):
+        return {"what": "MDF_STATION", "code": "3", "errNo": "400", "errMsg": "Invalid stationID"}
+
+    ports = _existing_stations(db, data.systemID, station_ids)
+    missing = [station_id for station_id in station_ids if station_id not in ports]
+    if missing:
+        return {"what": "MDF_STATION", "code": "3", "errNo": "404",
+                "errMsg": f"Substation {', '.join(map(str, missing))} not found"}
+
+    # 同一分站出现多次时合并，后出现的字段覆盖先出现的
+    updates: Dict[int, Dict[str, Any]] = {}
+    for station_id, controller_data in zip(station_ids, items):
+        values = updates.setdefault(station_id, {"id": station_id})
+        values.update({column: controller_data[field] for field, column in SUBSTATION_FIELDS.items()
+                       if field in controller_data})
+    try:
+        # 按主键批量更新（按主键的批量 UPDATE 不支持 RETURNING，结果由预取的行与新值合成）
+        db.execute(update(Substation), list(updates.values()))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {"what": "MDF_STATION", "code": "3", "errNo": "500", "errMsg": str(e)}
+
     return {
         "what": "MDF_STATION",
         "code": "0",
-        "number": len(updated_stations),
+        "number": len(updates),
         "node": [
             {
-                "stationID": station.id,    # 假设 stationID 对应分站的主键
-                "portNo": station.port_no
-            } for station in updated_stations
+                "stationID": station_id,
+                "portNo": values.get("port_no", ports[station_id])
+            } for station_id, values in updates.items()
         ]
     }
     
 def delete_substation(db: Session, data: SubstationDelete) -> Dict:
-    # 批量查询所有要删除的分站
-    substations = db.query(Substation).filter(Substation.substation_no.in_([controller.stationID for controller in data.controller])).all()
+    try:
+        station_ids = list(dict.fromkeys(_station_ids(data.controller[:data.number])))
+    except (TypeError, ValueError):
+        return {"what": "DEL_STATION", "code": "3", "errNo": "400", "errMsg": "Invalid stationID"}
 
-    if not substations:
-        return {"what": "DEL_STATION", "code": "3", "errNo": "404", "errMsg": "Substations not found"}
-    
-    # 删除分站
     deleted_stations = []
     try:
-        for substation in substations:
-            db.delete(substation)
-            deleted_stations.append({
-                "stationID": substation.substation_no,
-                "portNo": substation.port_no,
-            })
+        if db.get_bind().dialect.delete_returning:
+            # 直接批量删除，并由 RETURNING 返回被删除的分站
+            for chunk in chunked(station_ids):
+                rows = db.execute(delete(Substation)
+                                  .where(Substation.id.in_(chunk), Substation.system_id == data.systemID)
+                                  .returning(Substation.id, Substation.port_no)).all()
+                deleted_stations.extend(rows)
+        else:
+            # 不支持 RETURNING 时先批量预取，再批量删除
+            ports = _existing_stations(db, data.systemID, station_ids)
+            for chunk in chunked(list(ports)):
+                db.execute(delete(Substation).where(Substation.id.in_(chunk)))
+            deleted_stations = list(ports.items())
+        if not deleted_stations:
+            db.rollback()
+            return {"what": "DEL_STATION", "code": "3", "errNo": "404", "errMsg": "Substations not found"}
         db.commit()
     except Exception as e:
         db.rollback()  # 回滚事务
@@ -509,9 +646,11 @@ def delete_substation(db: Session, data: SubstationDelete) -> Dict:
         "what": "DEL_STATION",
         "code": "0",
         "number": len(deleted_stations),
-        "node": deleted_stations
+        "node": [{"stationID": station_id, "portNo": port_no} for station_id, port_no in sorted(deleted_stations)]
     }
 
+SUBSTATION_KEY = [Substation.id]
+
 def query_substation(db: Session, data: SubstationQuery) -> Dict:
     # 构建查询条件
     query = db.query(Substation).filter(Substation.system_id == data.systemID)
@@ -524,8 +663,12 @@ def query_substation(db: Session, data: SubstationQuery) -> Dict:
     if data.areaID is not None:
         query = query.filter(Substation.area_id == data.areaID)
 
-    # 分页
-    substations = query.offset(data.first).limit(data.number).all()
+    # 分页（携带 after 游标时按分站 ID 续读）
+    try:
+        page = paginate(query, SUBSTATION_KEY, data.first, data.number, data.after)
+    except InvalidCursor as e:
+        return {"what": "QRY_STATION", "code": "3", "errNo": "400", "errMsg": str(e)}
+    substations = page.rows
 
     # 如果没有查询到分站，返回错误信息
     if not substations:
@@ -536,19 +679,21 @@ def query_substation(db: Session, data: SubstationQuery) -> Dict:
         "what": "QRY_STATION",
         "code": "0",
         "number": len(substations),
+        "total": page.total,
         "node": [
             {
-                "stationID": substation.substation_no,
+                "stationID": substation.id,
                 "portNo": substation.port_no,
             } for substation in substations
-        ]
+        ],
+        "next": page.next
     }
 
-def get_areas(db: Session, system_id: str, first: int, number: int) -> List[Area]:
+AREA_KEY = [Area.area_id]
+
+def get_areas(db: Session, system_id: str, first: int, number: int, after: Optional[str] = None) -> Page:
     query = db.query(Area).filter(Area.system_id == system_id)
-    if number > 0:
-        query = query.offset(first).limit(number)
-    return query.all()
+    return paginate(query, AREA_KEY, first, number, after)
 
 def add_area(db: Session, area: Area):
     db.add(area)
@@ -558,30 +703,103 @@ def get_area_by_id(db: Session, area_id: str) -> Area:
 
 def delete_area(db: Session, area: Area):
     db.delete(area)
+
+# 批量操作：每个操作一条（按 IN_CHUNK_SIZE 分批的）语句，由调用方提交事务
+def add_areas(db: Session, rows: List[Dict[str, Any]]) -> List[str]:
+    # 主键在插入前生成，便于 executemany 后返回新空间的 ID
+    for row in rows:
+        row.setdefault("area_id", generate_area_id())
+    if rows:
+        db.execute(insert(Area), rows)
+    return [row["area_id"] for row in rows]
+
+def get_existing_area_ids(db: Session, system_id: str, area_ids: List[str]) -> set:
+    existing = set()
+    for chunk in chunked(area_ids):
+        existing.update(db.execute(select(Area.area_id)
+                                   .where(Area.area_id.in_(chunk), Area.system_id == system_id)).scalars())
+    return existing
+
+def update_areas(db: Session, rows: List[Dict[str, Any]]) -> None:
+    # rows 中须包含主键 area_id，按主键批量更新
+    if rows:
+        db.execute(update(Area), rows)
+
+def delete_areas(db: Session, system_id: str, area_ids: List[str]) -> int:
+    deleted = 0
+    for chunk in chunked(area_ids):
+        deleted += db.execute(delete(Area).where(Area.area_id.in_(chunk), Area.system_id == system_id)).rowcount
+    return deleted
     
 
+TASK_FIELDS = {
+    "systemID": "system_id",
+    "taskName": "task_name",
+    "taskType": "task_type",
+    "action": "action",
+    "actTime": "act_time",
+    "actOnTime": "act_on_time",
+    "number1": "number1",
+    "setupDay": "setup_day",
+    "repeatMode": "repeat_mode",
+    "intervalDay": "interval_day",
+    "actDay": "act_day",
+    "cycleNum": "cycle_num",
+    "concurrent": "concurrent",
+    "areaID": "area_id",
+    "memo": "memo",
+}
+
+def _begin_rows(task_id, setup_day: Optional[str], begins: List[Any]) -> List[Dict[str, Any]]:
+    # 开始时间以 设置日 + 时刻 保存到 task_start_times，调度只使用其中的时刻
+    day = parse_date(setup_day) or datetime.now().date()
+    rows = []
+    for begin in begins:
+        value = begin.get("beginTime", begin.get("begin")) if isinstance(begin, dict) else begin
+        offset = parse_clock(value)
+        if offset is not None:
+            rows.append({"task_id": str(task_id),
+                         "begin_time": datetime(day.year, day.month, day.day) + timedelta(seconds=offset)})
+    return rows
+
+def _replace_begin_times(db: Session, task_id, setup_day: Optional[str], begins: List[Any]) -> None:
+    db.execute(delete(TaskStartTime).where(TaskStartTime.task_id == str(task_id)))
+    rows = _begin_rows(task_id, setup_day, begins)
+    if rows:
+        db.execute(insert(TaskStartTime), rows)
+
+SENSE_FIELDS = {
+    "nodeNo": "node_id",
+    "highValue": "high_value",
+    "highAct": "high_act",
+    "lowValue": "low_value",
+    "lowAct": "low_act",
+}
+
+def _sense_rows(task_id, senses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # 传感参数：{"nodeNo", "highValue", "highAct", "lowValue", "lowAct"}，nodeNo 为提供数据的节点
+    return [{"task_id": str(task_id), **{column: sense.get(key) for key, column in SENSE_FIELDS.items()}}
+            for sense in senses]
+
+def _replace_stations(db: Session, task_id, station_ids: List[Any]) -> None:
+    db.execute(delete(TaskStation).where(TaskStation.task_id == str(task_id)))
+    rows = [{"task_id": str(task_id), "station_id": int(station_id)}
+            for station_id in dict.fromkeys(str(value).strip() for value in station_ids if value is not None) if station_id]
+    if rows:
+        db.execute(insert(TaskStation), rows)
+
 def create_task(db: Session, task_data: dict) -> Task:
     # 创建一个符合 Task 模型字段名称的字典
-    task_data_normalized = {
-        "task_id": task_data.get("taskID"),
-        "system_id": task_data.get("systemID"),
-        "task_name": task_data.get("taskName"),
-        "task_type": task_data.get("taskType"),
-        "action": task_data.get("action"),
-        "act_time": task_data.get("actTime"),
-        "act_on_time": task_data.get("actOnTime"),
-        "number1": task_data.get("number1"),
-        "setup_day": task_data.get("setupDay"),
-        "repeat_mode": task_data.get("repeatMode"),
-        "interval_day": task_data.get("intervalDay"),
-        "act_day": task_data.get("actDay"),
-        "cycle_num": task_data.get("cycleNum"),
-        "concurrent": task_data.get("concurrent"),
-        "area_id": task_data.get("areaID"),
-        "memo": task_data.get("memo"),
-    }
+    task_data_normalized = {column: task_data.get(key) for key, column in TASK_FIELDS.items()}
+    task_data_normalized["task_id"] = task_data.get("taskID")
     db_task = Task(**task_data_normalized)
     db.add(db_task)
+    db.flush()
+    _replace_begin_times(db, db_task.task_id, db_task.setup_day, task_data.get("begin") or [])
+    senses = _sense_rows(db_task.task_id, task_data.get("sense") or [])
+    if senses:
+        db.execute(insert(TaskSenseParam), senses)
+    _replace_stations(db, db_task.task_id, [station.get("stationID") for station in task_data.get("station") or []])
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -589,8 +807,19 @@ def create_task(db: Session, task_data: dict) -> Task:
 def update_task(db: Session, task_id: str, task_data: dict) -> Task:
     db_task = db.query(Task).filter(Task.task_id == task_id).first()  # 使用下划线命名
     if db_task:
-        for key, value in task_data.items():
-            setattr(db_task, key, value)
+        # 只修改请求中给出的字段
+        for key, column in TASK_FIELDS.items():
+            if task_data.get(key) is not None:
+                setattr(db_task, column, task_data[key])
+        if task_data.get("beginTime") is not None:
+            _replace_begin_times(db, db_task.task_id, db_task.setup_day, task_data["beginTime"].split(","))
+        # 修改请求中的阈值作用于该任务的所有传感参数
+        sense_values = {column: task_data[key] for key, column in SENSE_FIELDS.items() if task_data.get(key) is not None}
+        if sense_values:
+            db.execute(update(TaskSenseParam).where(TaskSenseParam.task_id == str(db_task.task_id)).values(**sense_values))
+        # stationID 为逗号分隔的分站列表，给出时整体替换
+        if task_data.get("stationID") is not None:
+            _replace_stations(db, db_task.task_id, task_data["stationID"].split(","))
         db.commit()
         db.refresh(db_task)
         return db_task
@@ -599,6 +828,9 @@ def update_task(db: Session, task_id: str, task_data: dict) -> Task:
 def delete_task(db: Session, task_id: str) -> Task:
     db_task = db.query(Task).filter(Task.task_id == task_id).first()
     if db_task:
+        db.execute(delete(TaskStartTime).where(TaskStartTime.task_id == str(db_task.task_id)))
+        db.execute(delete(TaskSenseParam).where(TaskSenseParam.task_id == str(db_task.task_id)))
+        db.execute(delete(TaskStation).where(TaskStation.task_id == str(db_task.task_id)))
         db.delete(db_task)
         db.commit()
         return db_task
@@ -683,13 +915,11 @@ def create_user(db: Session, user_id: str, phone_num: str, hashed_password: str)
 def get_user_by_id(db: Session, user_id: str):
     return db.query(User).filter(User.user_id == user_id).first()
 
-def get_all_task_run_modes(db: Session, system_id: str, first: int, number: int) -> List[Task]:
+TASK_KEY = [Task.task_id]
+
+def get_all_task_run_modes(db: Session, system_id: str, first: int, number: int, after: Optional[str] = None) -> Page:
     query = db.query(Task).filter(Task.system_id == system_id)
-    
-    if number > 0:
-        query = query.offset(first).limit(number)
-        
-    return query.all()
+    return paginate(query, TASK_KEY, first, number, after)
 
 
 def get_station_devices(db: Session, systemID: str, areaID: str, devType: str, stationID: str):
@@ -728,7 +958,16 @@ def get_year_range(start_date):
     end_of_year = datetime(start_date.year, 12, 31)
     return start_of_year, end_of_year
 
-def get_station_history_data(db: Session, devices: List[Substation], qureyMode: str, beginDay: str, endDay: str):
+def parse_day(day, end_of_day: bool = False) -> datetime:
+    # 支持 "YYYY-MM-DD" 与完整时间；只给日期的结束时间按当天结束计算
+    if isinstance(day, datetime):
+        return day
+    if len(day) <= 10:
+        parsed = datetime.strptime(day, "%Y-%m-%d")
+        return parsed + timedelta(days=1, milliseconds=-1) if end_of_day else parsed
+    return datetime.fromisoformat(day)
+
+def get_query_range(qureyMode: str, beginDay: str, endDay: str):
     # 根据查询模式处理时间范围
     if qureyMode == "WEEK":
         begin_date, end_date = get_week_range(beginDay)
@@ -739,25 +978,45 @@ def get_station_history_data(db: Session, devices: List[Substation], qureyMode:
     elif qureyMode == "YEAR":
         begin_date, end_date = get_year_range(beginDay)
     elif qureyMode == "DAYS":
-        begin_date, end_date = beginDay, endDay
+        begin_date, end_date = parse_day(beginDay), parse_day(endDay)
     else:
-        return []
-
-    # 获取历史数据
-    device_ids = [device.id for device in devices]
-    return db.query(HistoryData).filter(
-        HistoryData.device_id.in_(device_ids),
-        HistoryData.date >= begin_date,
-        HistoryData.date <= end_date
-    ).all()
+        return None
+    # 结束日期包含当天全部数据
+    return begin_date, end_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1, milliseconds=-1)
+
+def get_station_history_data(db: Session, devices: List[Substation], qureyMode: str, beginDay: str, endDay: str):
+    date_range = get_query_range(qureyMode, beginDay, endDay)
+    if date_range is None:
+        return {}
+    begin_date, end_date = date_range
+
+    keys = [station_series(device.id) for device in devices]
+    # 优先读取满足查询模式的最粗粒度预聚合，YEAR 查询每个设备只需约 365 行
+    resolution = rollups.plan_resolution(begin_date, end_date)
+    if resolution is not None:
+        aggregated = rollups.query_rollups(db, keys, resolution, to_ms(begin_date), to_ms(end_date))
+        return {device.id: (aggregated[key]["timestamps"], aggregated[key]["avg"]) for device, key in zip(devices, keys)}
+
+    # 范围较短时从列式存储按分区读取各分站的连续数据块
+    series = ts_store.range_scan(db, keys, to_ms(begin_date), to_ms(end_date))
+    return {device.id: series[station_series(device.id)] for device in devices}
 
 
 def get_node_by_id(db: Session, nodeID: str):
     return db.query(Node).filter(Node.node_id == nodeID).first()
 
 def get_node_history_data(db: Session, nodeID: str, beginDay: str, endDay: str):
-    return db.query(NodeHistory).filter(
+    # 返回 (毫秒时间戳数组, 数值数组)
+    begin_date, end_date = parse_day(beginDay), parse_day(endDay, end_of_day=True)
+    key = node_series(nodeID)
+    return ts_store.range_scan(db, [key], to_ms(begin_date), to_ms(end_date))[key]
+
+def iter_node_history(db: Session, nodeID: str, beginDay: str, endDay: str, chunk_size: int = 5000):
+    # 服务端游标分批读取原始历史数据，每次产出一批 (date, param_value)
+    stmt = select(NodeHistory.date, NodeHistory.param_value).where(
         NodeHistory.node_id == nodeID,
-        NodeHistory.date >= beginDay,
-        NodeHistory.date <= endDay
-    ).all()
+        NodeHistory.date >= parse_day(beginDay),
+        NodeHistory.date <= parse_day(endDay, end_of_day=True)
+    ).order_by(NodeHistory.date).execution_options(yield_per=chunk_size)
+    for partition in db.execute(stmt).partitions():
+        yield partition
@@ -1,18 +1,107 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator
 from fastapi import Depends
 
-# 数据库 URL（根据实际数据库配置进行调整）
-DATABASE_URL = "sqlite:///smart_park_management.db"
+from app.config import settings
+
+# 数据库 URL，由配置（环境变量 DATABASE_URL）决定
+DATABASE_URL = settings.DATABASE_URL
+
+
+def to_async_url(url: str) -> str:
+    # 同一数据库的异步驱动：SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith(("postgresql:", "postgresql+psycopg2:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+def is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def _engine_options(url: str, is_async: bool) -> Dict[str, Any]:
+    backend = make_url(url).get_backend_name()
+    options: Dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+
+    if backend == "sqlite":
+        # SQLite 没有语句超时，用锁等待时间代替；会话可能在线程池中使用
+        options["connect_args"] = {"timeout": timeout_ms / 1000, "check_same_thread": False}
+        if is_memory_sqlite(url):
+            return options
+    elif backend == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout_ms}"}
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(engine: Engine, url: str) -> None:
+    # WAL 模式下读不阻塞写、写不阻塞读；synchronous=NORMAL 在 WAL 下仍保证数据库不损坏
+    memory = is_memory_sqlite(url)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        cursor = dbapi_connection.cursor()
+        if settings.SQLITE_WAL and not memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_STATEMENT_TIMEOUT_MS}")
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    # 按配置创建同步引擎，overrides 可覆盖默认参数（例如测试中指定 poolclass）
+    options = _engine_options(url, is_async=False)
+    if "poolclass" in overrides:
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    options.update(overrides)
+    db_engine = create_engine(url, **options)
+    if db_engine.dialect.name == "sqlite":
+        _set_sqlite_pragmas(db_engine, url)
+    return db_engine
+
+
+def create_async_db_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    options = _engine_options(url, is_async=True)
+    if "poolclass" in overrides:
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    options.update(overrides)
+    db_engine = create_async_engine(to_async_url(url), **options)
+    if db_engine.dialect.name == "sqlite":
+        _set_sqlite_pragmas(db_engine.sync_engine, url)
+    return db_engine
+
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine(DATABASE_URL)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎与会话工厂，供 async def 接口使用，避免阻塞事件循环
+async_engine = create_async_db_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # 创建基本类，用于定义数据模型
 Base = declarative_base()
 
@@ -28,3 +117,8 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+# 依赖项，用于获取异步数据库会话
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,99 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# 历史曲线降采样：返回给前端的点数不超过 maxPoints
+# LTTB（Largest-Triangle-Three-Buckets）保留曲线形状；AVG 按桶求均值；MINMAX 每桶保留最小值和最大值
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+METHODS = ("LTTB", "AVG", "MINMAX")
+# 各方法能保证点数上限的最小 maxPoints：LTTB 固定保留首尾点，MINMAX 每桶两个点
+MIN_POINTS = {"LTTB": 3, "AVG": 1, "MINMAX": 2}
+
+
+def check_max_points(max_points: Optional[int], method: Optional[str] = "LTTB") -> str:
+    # 返回规范化后的方法名；maxPoints 低于方法的最小值时无法满足点数上限，直接拒绝
+    method = (method or "LTTB").upper()
+    if method not in MIN_POINTS:
+        raise ValueError(f"不支持的降采样方法: {method}")
+    if max_points is not None and max_points < MIN_POINTS[method]:
+        raise ValueError(f"{method} 降采样的 maxPoints 不能小于 {MIN_POINTS[method]}")
+    return method
+
+
+def _bucket_edges(length: int, buckets: int) -> np.ndarray:
+    return np.linspace(0, length, buckets + 1).astype(np.int64)
+
+
+def bucket_average(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    check_max_points(max_points, "AVG")
+    if len(timestamps) <= max_points:
+        return timestamps, values
+    starts = _bucket_edges(len(timestamps), max_points)[:-1]
+    counts = np.diff(np.r_[starts, len(timestamps)])
+    mean_ts = np.add.reduceat(timestamps.astype(np.float64), starts) / counts
+    mean_values = np.add.reduceat(values.astype(np.float64), starts) / counts
+    return mean_ts.astype(np.int64), mean_values.astype(values.dtype)
+
+
+def bucket_minmax(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    # 每桶输出两个点（按时间先后排列的最小值与最大值），适合保留尖峰
+    check_max_points(max_points, "MINMAX")
+    if len(timestamps) <= max_points:
+        return timestamps, values
+    buckets = max_points // 2
+    edges = _bucket_edges(len(timestamps), buckets)
+    starts = edges[:-1]
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+
+    # 组内排序后取首尾得到最小/最大值的下标
+    order = np.lexsort((values, bucket_ids))
+    lo = order[starts]
+    hi = order[np.r_[starts[1:], len(timestamps)] - 1]
+    picked = np.sort(np.unique(np.concatenate([lo, hi])))
+    return timestamps[picked], values[picked]
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    check_max_points(max_points, "LTTB")
+    length = len(timestamps)
+    if length <= max_points:
+        return timestamps, values
+
+    x = timestamps.astype(np.float64)
+    y = values.astype(np.float64)
+    # 首尾点固定，中间 max_points - 2 个桶各选一个点
+    edges = _bucket_edges(length - 2, max_points - 2) + 1
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+
+    # 预先计算每个桶的均值，作为下一桶的三角形顶点
+    sums_x = np.add.reduceat(x[1:length - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:length - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.r_[sums_x / counts, x[-1]]
+    avg_y = np.r_[sums_y / counts, y[-1]]
+
+    prev = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[prev], y[prev]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        # 三角形面积的两倍，只需比较大小
+        areas = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return timestamps[selected], values[selected]
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, max_points: Optional[int], method: str = "LTTB") -> Series:
+    # max_points 为 None 时返回全部点
+    method = check_max_points(max_points, method)
+    if max_points is None or len(timestamps) <= max_points:
+        return timestamps, values
+    if method == "AVG":
+        return bucket_average(timestamps, values, max_points)
+    if method == "MINMAX":
+        return bucket_minmax(timestamps, values, max_points)
+    return lttb(timestamps, values, max_points)
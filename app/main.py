@@ -3,8 +3,16 @@ from fastapi.responses import HTMLResponse
 
 from typing import List, Optional
 
-from app.db import engine, Base, init_db
-from app.api import superadmin, users, devices, areas, tasks
+from app.db import engine, Base, init_db, SessionLocal
+from app.api import superadmin, users, devices, areas, tasks, ingest
+from app.services import ingest_service
+from app.realtime import manager, handle_client_message
+from app.pubsub import create_backend
+from app.services.telemetry_service import telemetry
+from app.audit import audit_log
+from app.oplog import retention_job
+from app.services.scheduler_service import start_scheduler, stop_scheduler
+from app.services.actuation_service import actuation_executor
 
 app = FastAPI()
 
@@ -12,45 +20,53 @@ app = FastAPI()
 @app.on_event("startup")
 def on_startup():
     init_db()
+    audit_log.start()
+    retention_job.start()
+    actuation_executor.start()
+    db = SessionLocal()
+    try:
+        ingest_service.start_ingest(db)
+        start_scheduler(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_realtime():
+    # 推送任务与转发后端需要运行在服务的事件循环中
+    await manager.attach(create_backend())
+    telemetry.start()
+
+@app.on_event("shutdown")
+async def stop_realtime():
+    telemetry.stop()
+    await manager.detach()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # 退出前把缓冲中的上行数据与操作日志写入数据库
+    stop_scheduler()
+    ingest_service.stop_ingest()
+    actuation_executor.stop()
+    audit_log.stop()
+    retention_job.stop()
     
 app.include_router(superadmin.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(devices.router, prefix="/api")
 app.include_router(areas.router, prefix="/api")
 app.include_router(tasks.router, prefix="/api")
-
-# WebSocket connection manager for tracking all connected WebSocket clients
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-manager = ConnectionManager()
+app.include_router(ingest.router, prefix="/api")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    subscriber = await manager.connect(websocket)
     try:
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"You wrote: {data}", websocket)
-            await manager.broadcast(f"Broadcast message: {data}")
+            await handle_client_message(subscriber, data)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
-        
+
 @app.get("/")
 async def get():
     return HTMLResponse("""
@@ -61,7 +77,8 @@ async def get():
     </head>
     <body>
         <h1>WebSocket Client</h1>
-        <button onclick="sendMessage()">Send Message</button>
+        <input id="topic" value="system:1"/>
+        <button onclick="sendMessage()">Subscribe</button>
         <ul id='messages'>
         </ul>
         <script>
@@ -75,7 +92,8 @@ async def get():
             };
 
             function sendMessage() {
-                ws.send("Hello, World!");
+                const topic = document.getElementById('topic').value
+                ws.send(JSON.stringify({action: "subscribe", topics: [topic]}));
             }
         </script>
     </body>
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Integer, Float, Text, ForeignKey, TIMESTAMP, DateTime
+from sqlalchemy import Column, String, Integer, BigInteger, Float, Text, ForeignKey, TIMESTAMP, DateTime, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -73,6 +73,10 @@ class Area(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_areas_system_id", "system_id"),
+    )
+
 
 # 验证码表
 class VerificationCode(Base):
@@ -104,6 +108,10 @@ class Host(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_hosts_system_host", "system_id", "host_no"),
+    )
+
 class NodeHistory(Base):
     __tablename__ = "node_history"
 
@@ -115,6 +123,10 @@ class NodeHistory(Base):
     # 定义与 Node 的关系
     node = relationship("Node", back_populates="history")
 
+    __table_args__ = (
+        Index("ix_node_history_node_date", "node_id", "date"),
+    )
+
     def __repr__(self):
         return f"<NodeHistory(node_id={self.node_id}, date={self.date}, param_value={self.param_value})>"
 
@@ -136,6 +148,10 @@ class Node(Base):
     
     # 反向引用 NodeHistory
     history = relationship("NodeHistory", back_populates="node")
+
+    __table_args__ = (
+        Index("ix_nodes_system_host", "system_id", "host_no"),
+    )
     
     def __repr__(self):
         return f"<Node(id={self.id}, system_id='{self.system_id}', dev_name='{self.dev_name}', dev_eui='{self.dev_eui}')>"
@@ -151,6 +167,10 @@ class HostOperationsLog(Base):
     status_message = Column(Text, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_host_operations_logs_host_created", "host_no", "created_at"),
+    )
+
 class NodeOperationsLog(Base):
     __tablename__ = "node_operations_logs"
 
@@ -162,6 +182,10 @@ class NodeOperationsLog(Base):
     status_message = Column(Text, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_node_operations_logs_node_created", "node_id", "created_at"),
+    )
+
 # 任务管理
 class Task(Base):
     __tablename__ = "tasks"
@@ -191,11 +215,19 @@ class TaskStartTime(Base):
     task_id = Column(String(50), ForeignKey("tasks.task_id"))
     begin_time = Column(TIMESTAMP, nullable=False)
 
+class TaskStation(Base):
+    __tablename__ = "task_stations"
+
+    task_station_id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String(50), ForeignKey("tasks.task_id"), index=True)
+    station_id = Column(Integer, nullable=False)  # 任务动作的分站
+
 class TaskSenseParam(Base):
     __tablename__ = "task_sense_params"
 
     sense_id = Column(Integer, primary_key=True, autoincrement=True)
     task_id = Column(String(50), ForeignKey("tasks.task_id"))
+    node_id = Column(Integer, index=True, nullable=True)  # 提供传感数据的节点
     high_value = Column(Float, nullable=False)
     high_act = Column(String(20), nullable=False)
     low_value = Column(Float, nullable=False)
@@ -228,6 +260,10 @@ class Report(Base):
     created_date = Column(TIMESTAMP, nullable=False)
     user_id = Column(String(50), ForeignKey("users.user_id"))
 
+    __table_args__ = (
+        Index("ix_reports_user_created", "user_id", "created_date"),
+    )
+
 # 人员管理
 class Admin(Base):
     __tablename__ = "admins"
@@ -242,6 +278,38 @@ class HistoryData(Base):
     date = Column(DateTime, nullable=False)
     param_value = Column(Float, nullable=False)
 
+# 历史数据列式存储块，每行保存一个序列在一个时间分区内的一段连续样本
+class HistoryChunk(Base):
+    __tablename__ = "history_chunks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    series = Column(String(64), nullable=False)  # 序列标识，如 node:12 / station:3
+    partition = Column(Integer, nullable=False)  # 时间分区编号
+    start_ts = Column(BigInteger, nullable=False)  # 块内最早时间戳（毫秒）
+    end_ts = Column(BigInteger, nullable=False)  # 块内最晚时间戳（毫秒）
+    count = Column(Integer, nullable=False)  # 样本数
+    ts_blob = Column(LargeBinary, nullable=False)  # 差分编码并压缩的时间戳
+    value_blob = Column(LargeBinary, nullable=False)  # 压缩的 float32 数值
+    sealed = Column(Integer, nullable=False, default=0)  # 块是否已写满
+
+    __table_args__ = (
+        Index("ix_history_chunks_series_partition", "series", "partition", "start_ts"),
+    )
+
+# 历史数据预聚合，resolution 为聚合粒度（秒），bucket 为桶起始时间戳（毫秒）
+class HistoryRollup(Base):
+    __tablename__ = "history_rollups"
+
+    series = Column(String(64), primary_key=True)
+    resolution = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+    last_value = Column(Float, nullable=False)
+    last_ts = Column(BigInteger, nullable=False)
+
 class Substation(Base):
     __tablename__ = "substations"
 
@@ -260,5 +328,9 @@ class Substation(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())  # 创建时间
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())  # 更新时间
 
+    __table_args__ = (
+        Index("ix_substations_system_area_drv", "system_id", "area_id", "drv_type"),
+    )
+
     def __repr__(self):
         return f"<Station(id={self.id}, station_name='{self.station_name}', system_id='{self.system_id}')>"
\ No newline at end of file
@@ -0,0 +1,245 @@
+import re
+import threading
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from sqlalchemy import Index, MetaData, Table, event, insert, inspect, select, text, union_all
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import HostOperationsLog, NodeOperationsLog
+
+# 操作日志按月分区：
+# - PostgreSQL 上若基础表已由迁移改为按 created_at 的分区表（PARTITION BY RANGE），写入基础表，
+#   按月创建 PARTITION OF 子表，查询由数据库按时间范围裁剪分区；
+# - 其他情况（SQLite）每月一张结构相同的表 <基础表>_YYYYMM，查询只 UNION 与时间范围重叠的月表；
+# 过期数据按整月 DROP TABLE 删除，与数据量无关
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def months_between(begin: datetime, end: datetime) -> List[datetime]:
+    months, current = [], month_start(begin)
+    while current <= end:
+        months.append(current)
+        current = next_month(current)
+    return months
+
+
+def _connection(db: Union[Session, Connection]) -> Connection:
+    return db.connection() if isinstance(db, Session) else db
+
+
+# 本事务中新建的分区，提交后才记入 PartitionedLog 的缓存（回滚时建表语句同样被撤销）
+_PENDING = "oplog_pending_partitions"
+
+
+@event.listens_for(Engine, "commit")
+def _remember_partitions(conn: Connection) -> None:
+    for log, engine, name in conn.info.pop(_PENDING, ()):
+        with log._lock:
+            log._created.setdefault(engine, set()).add(name)
+
+
+@event.listens_for(Engine, "rollback")
+def _forget_partitions(conn: Connection) -> None:
+    conn.info.pop(_PENDING, None)
+
+
+class PartitionedLog:
+    def __init__(self, model, key: str):
+        self.base: Table = model.__table__
+        self.name = self.base.name
+        self.key = key
+        self._pattern = re.compile(rf"^{re.escape(self.name)}_(\d{{4}})(\d{{2}})$")
+        self._metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._native: Dict[str, bool] = {}
+        # 每个数据库已确认存在的分区，写入时命中则不再执行建表 DDL
+        self._created: "weakref.WeakKeyDictionary[Engine, set]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def partition_name(self, month: datetime) -> str:
+        return f"{self.name}_{month:%Y%m}"
+
+    def partition_month(self, name: str) -> Optional[datetime]:
+        match = self._pattern.match(name)
+        return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+    def table(self, name: str) -> Table:
+        # 月表与基础表结构相同，索引名带上月表名以免冲突
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                table = Table(name, self._metadata, *(column._copy() for column in self.base.columns),
+                              Index(f"ix_{name}_created", "created_at"),
+                              Index(f"ix_{name}_{self.key}_created", self.key, "created_at"))
+                self._tables[name] = table
+            return table
+
+    def is_native(self, db) -> bool:
+        # 仅当 PostgreSQL 上的基础表为分区表时使用原生分区
+        conn = _connection(db)
+        if conn.dialect.name != "postgresql":
+            return False
+        url = str(conn.engine.url)
+        if url not in self._native:
+            relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = :name"),
+                                   {"name": self.name}).scalar()
+            self._native[url] = relkind == "p"
+        return self._native[url]
+
+    def ensure(self, db, month: datetime) -> str:
+        conn = _connection(db)
+        name = self.partition_name(month)
+        if name in self._created.get(conn.engine, ()):
+            return name
+        if self.is_native(conn):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.name} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"))
+        else:
+            table = self.table(name)
+            conn.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        conn.info.setdefault(_PENDING, []).append((self, conn.engine, name))
+        return name
+
+    def insert(self, db, rows: List[Dict[str, Any]]) -> None:
+        # 按 created_at 所在月份分组写入，每月一条 executemany；未给出时间的取当前时间
+        now = datetime.now()
+        groups: Dict[datetime, List[Dict[str, Any]]] = {}
+        for row in rows:
+            row.setdefault("created_at", now)
+            groups.setdefault(month_start(row["created_at"]), []).append(row)
+        native = self.is_native(db)
+        for month, group in groups.items():
+            name = self.ensure(db, month)
+            db.execute(insert(self.base if native else self.table(name)), group)
+
+    def partitions(self, db) -> List[str]:
+        # 每次从数据库目录读取，其他进程新建的分区同样可见
+        names = inspect(_connection(db)).get_table_names()
+        return sorted(name for name in names if self._pattern.match(name))
+
+    def query(self, db, begin: datetime, end: datetime, key_value: Any = None, limit: int = 1000) -> List[Dict]:
+        # 返回 [begin, end] 内的日志，按时间倒序；只读取与时间范围重叠的分区
+        def scoped(table: Table):
+            stmt = select(*table.c).where(table.c.created_at >= begin, table.c.created_at <= end)
+            if key_value is not None:
+                stmt = stmt.where(table.c[self.key] == key_value)
+            return stmt
+
+        if self.is_native(db):
+            stmt = scoped(self.base)
+            created_at = self.base.c.created_at
+        else:
+            existing = set(self.partitions(db))
+            names = [self.partition_name(month) for month in months_between(begin, end)]
+            selects = [scoped(self.table(name)) for name in names if name in existing]
+            if not selects:
+                return []
+            if len(selects) == 1:
+                stmt = selects[0]
+                created_at = stmt.selected_columns.created_at
+            else:
+                merged = union_all(*selects).subquery()
+                stmt = select(merged)
+                created_at = merged.c.created_at
+        stmt = stmt.order_by(created_at.desc())
+        if limit > 0:
+            stmt = stmt.limit(limit)
+        return [dict(row) for row in db.execute(stmt).mappings()]
+
+    def drop_before(self, db, cutoff: datetime) -> List[str]:
+        # 删除整月都早于 cutoff 的分区
+        boundary = month_start(cutoff)
+        dropped = [name for name in self.partitions(db) if self.partition_month(name) < boundary]
+        conn = _connection(db)
+        with self._lock:
+            self._created.get(conn.engine, set()).difference_update(dropped)
+        for name in dropped:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        return dropped
+
+    def migrate_legacy(self, db) -> int:
+        # 把分区之前写入基础表的日志按月搬到月表（SQLite），返回搬移的行数
+        # 在 Python 中按月分组：旧日志的时间格式（数据库默认值）与绑定参数不同，不能直接按字符串比较分月
+        conn = _connection(db)
+        columns = [column for column in self.base.columns if column.name != "id"]
+        rows = [dict(row) for row in conn.execute(select(*columns).where(self.base.c.created_at.is_not(None))).mappings()]
+        if rows:
+            self.insert(conn, rows)
+        # 没有时间的旧日志无法归入分区，保留在基础表中
+        conn.execute(self.base.delete().where(self.base.c.created_at.is_not(None)))
+        return len(rows)
+
+
+host_logs = PartitionedLog(HostOperationsLog, "host_no")
+node_logs = PartitionedLog(NodeOperationsLog, "node_id")
+PARTITIONED_LOGS = (host_logs, node_logs)
+
+
+def apply_retention(db: Session, days: int = settings.OPLOG_RETENTION_DAYS,
+                    now: Optional[datetime] = None) -> List[str]:
+    cutoff = (now or datetime.now()) - timedelta(days=days)
+    dropped = []
+    for log in PARTITIONED_LOGS:
+        dropped.extend(log.drop_before(db, cutoff))
+    db.commit()
+    return dropped
+
+
+class RetentionJob:
+    # 后台线程定期删除过期的日志分区
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 days: int = settings.OPLOG_RETENTION_DAYS,
+                 interval: float = settings.OPLOG_RETENTION_INTERVAL):
+        self.session_factory = session_factory
+        self.days = days
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> List[str]:
+        db = self.session_factory()
+        try:
+            return apply_retention(db, self.days)
+        except Exception as e:
+            db.rollback()
+            print(f"删除过期操作日志分区失败: {e}")
+            return []
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None or self.days <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="oplog-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+retention_job = RetentionJob()
@@ -0,0 +1,88 @@
+import base64
+import json
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select, tuple_
+
+# 游标分页：按稳定的排序键续读，下一页条件为 (键) > (上一页最后一行的键)，
+# 深分页不再随 offset 线性变慢；未携带游标时仍按 first/number 偏移分页以兼容旧客户端
+# 总数与本页在同一条查询中得到：首页用窗口函数 count(*) over()（先于 offset/limit 计算），
+# 续读页用统计过滤条件（不含游标条件）的标量子查询，插入/删除后总数随之更新，也不信任客户端传回的数值
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    rows: List[Any]
+    total: int
+    next: Optional[str]
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps({"k": values}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> List[Any]:
+    # 旧版本游标中的 "t"（总数）直接忽略
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)["k"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("无效的分页游标")
+    if not isinstance(values, list) or not values:
+        raise InvalidCursor("无效的分页游标")
+    return values
+
+
+def apply_keyset(query, columns: Sequence, first: int = 0, number: int = 0, after: Optional[str] = None):
+    # query 可以是 Query 或 select()；number <= 0 表示不限制条数
+    return keyset_query(query, columns, first, number, after, with_total=False)
+
+
+def keyset_query(query, columns: Sequence, first: int = 0, number: int = 0, after: Optional[str] = None,
+                 with_total: bool = True):
+    # with_total 时在查询末尾附加总数列
+    total = func.count().over()
+    if after and with_total:
+        total = select(func.count()).select_from(query.order_by(None).subquery()).scalar_subquery()
+    query = query.order_by(*columns)
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(columns):
+            raise InvalidCursor("无效的分页游标")
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+    elif first:
+        query = query.offset(first)
+    if number > 0:
+        query = query.limit(number)
+    if with_total:
+        query = query.add_columns(total.label("total"))
+    return query
+
+
+def next_cursor(rows: Sequence, columns: Sequence, number: int) -> Optional[str]:
+    # 本页已满时返回下一页游标；不足一页说明已经是最后一页
+    if number <= 0 or len(rows) < number:
+        return None
+    last = rows[-1]
+    return encode_cursor(*(getattr(last, column.key) for column in columns))
+
+
+def build_page(rows: Sequence, columns: Sequence, number: int) -> Page:
+    # rows 为 keyset_query 的结果，拆出实体与总数列
+    total = rows[0][-1] if rows else 0
+    rows = [row[0] for row in rows]
+    return Page(rows, total, next_cursor(rows, columns, number))
+
+
+def paginate(query, columns: Sequence, first: int = 0, number: int = 0, after: Optional[str] = None) -> Page:
+    rows = keyset_query(query, columns, first, number, after).all()
+    if not rows and (first > 0 or after):
+        # 偏移超出末尾或游标之后已没有数据时，总数列没有返回行，只在这种情况下单独统计
+        return Page([], query.order_by(None).count(), None)
+    return build_page(rows, columns, number)
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+
+# 多进程（uvicorn --workers）之间转发 WebSocket 推送：
+# 每个进程先在本地扇出，再把消息批量发布到后端，其他进程收到后扇出给自己的连接
+# 后端：memory（同一进程内多个实例，测试用）、local（Unix 数据报套接字，同机多进程）、redis
+
+# 单条消息为 [topic, message, key]，topic 为 None 表示广播给所有连接
+Envelope = List[Optional[str]]
+Handler = Callable[[List[Envelope]], None]
+
+MAX_BATCH = 256
+# 单个数据包的字节数上限，低于 Unix 数据报默认的发送缓冲区大小；超出时拆成多个数据包
+MAX_PACKET_BYTES = 60000
+# 本地套接字发送遇到对方缓冲区已满时的重试次数与间隔（秒）
+SEND_RETRIES = 5
+SEND_RETRY_DELAY = 0.002
+
+
+class PubSubBackend(ABC):
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        await self._connect()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def stop(self) -> None:
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        await self._close()
+
+    def publish(self, topic: Optional[str], message: str, key: Optional[str] = None) -> None:
+        # 同步入队，由发送协程把同一轮事件循环中的消息合并成一个数据包
+        if self._outbox is not None:
+            self._outbox.put_nowait([topic, message, key])
+
+    def publish_threadsafe(self, topic: Optional[str], message: str, key: Optional[str] = None) -> None:
+        # 在事件循环以外的线程（如同步接口所在的线程池）中发布
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.publish, topic, message, key)
+
+    async def _send_loop(self) -> None:
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty() and len(batch) < MAX_BATCH:
+                batch.append(self._outbox.get_nowait())
+            for payload, count in self._packets(batch):
+                try:
+                    await self._send(payload)
+                    self.published += count
+                except Exception as e:
+                    print(f"发布推送消息失败: {e}")
+
+    def _packets(self, batch: List[Envelope]):
+        # 按字节数拆分数据包（json.dumps 默认转义非 ASCII 字符，字符数即字节数）；单条超长的消息单独成包
+        head = f'{{"o":"{self.origin}","m":['
+        parts: List[str] = []
+        size = len(head) + 2
+        for envelope in batch:
+            item = json.dumps(envelope, separators=(",", ":"))
+            if parts and size + len(item) + 1 > MAX_PACKET_BYTES:
+                yield head + ",".join(parts) + "]}", len(parts)
+                parts, size = [], len(head) + 2
+            parts.append(item)
+            size += len(item) + 1
+        if parts:
+            yield head + ",".join(parts) + "]}", len(parts)
+
+    def _deliver(self, payload) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        # 本进程发布的消息已经在本地扇出过
+        if data.get("o") == self.origin or self._handler is None:
+            return
+        self.received += len(data["m"])
+        self._handler(data["m"])
+
+    @abstractmethod
+    async def _connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def _send(self, payload: str) -> None:
+        ...
+
+    async def _close(self) -> None:
+        pass
+
+
+class MemoryBackend(PubSubBackend):
+    # 同名总线上的所有实例互相可见，用于在单进程内模拟多个 worker
+    _buses: Dict[str, List["MemoryBackend"]] = {}
+
+    def __init__(self, bus: str = "default"):
+        super().__init__()
+        self.bus = bus
+
+    async def _connect(self) -> None:
+        self._buses.setdefault(self.bus, []).append(self)
+
+    async def _send(self, payload: str) -> None:
+        for backend in list(self._buses.get(self.bus, [])):
+            backend._deliver(payload)
+
+    async def _close(self) -> None:
+        members = self._buses.get(self.bus, [])
+        if self in members:
+            members.remove(self)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, backend: "LocalSocketBackend"):
+        self.backend = backend
+
+    def datagram_received(self, data, addr):
+        self.backend._deliver(data)
+
+
+class LocalSocketBackend(PubSubBackend):
+    # 每个进程在同一目录下绑定一个 Unix 数据报套接字，发布时发送给目录中的所有套接字
+    def __init__(self, directory: str = settings.PUBSUB_SOCKET_DIR):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.origin}.sock")
+        self._transport = None
+        self._sock: Optional[socket.socket] = None
+        self.dropped = 0
+
+    async def _connect(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=self.path, family=socket.AF_UNIX)
+        # 发送使用单独的非阻塞套接字：asyncio 数据报传输的 sendto 不会抛出错误，无法发现已退出的进程
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    async def _send(self, payload: str) -> None:
+        data = payload.encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            await self._send_to(data, path)
+
+    async def _send_to(self, data: bytes, path: str) -> None:
+        # 对方接收缓冲区已满时稍等片刻重试，仍然满则丢弃发给该进程的这个数据包，避免卡住的进程拖慢发布
+        for attempt in range(SEND_RETRIES + 1):
+            try:
+                self._sock.sendto(data, path)
+                return
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 对应进程已退出，清理残留的套接字文件
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                return
+            except BlockingIOError:
+                if attempt < SEND_RETRIES:
+                    await asyncio.sleep(SEND_RETRY_DELAY)
+        self.dropped += 1
+
+    async def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class RedisBackend(PubSubBackend):
+    def __init__(self, url: str = settings.REDIS_URL, channel: str = settings.PUBSUB_CHANNEL):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> None:
+        from redis import asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        async for message in self._pubsub.listen():
+            if message and message.get("type") == "message":
+                self._deliver(message["data"])
+
+    async def _send(self, payload: str) -> None:
+        await self._redis.publish(self.channel, payload)
+
+    async def _close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.close()
+        if self._redis is not None:
+            await self._redis.close()
+
+
+def create_backend(name: str = settings.PUBSUB_BACKEND) -> Optional[PubSubBackend]:
+    # 未配置时只在本进程内推送（单 worker）
+    name = (name or "").lower()
+    if not name or name == "none":
+        return None
+    if name == "memory":
+        return MemoryBackend()
+    if name == "local":
+        return LocalSocketBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"不支持的推送后端: {name}")
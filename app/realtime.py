@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.config import settings
+from app.pubsub import Envelope, PubSubBackend
+
+# WebSocket 实时推送：客户端按主题订阅（system:<systemID> / area:<areaID> / node:<devEUI>），
+# 每个连接有独立的有界发送队列和发送协程，慢连接只会丢弃自己的旧消息，不会阻塞其他连接
+
+TOPIC_PREFIXES = ("system:", "area:", "node:")
+# 控制消息只在 worker 之间转发（如任务修改后各 worker 刷新内存中的调度索引），不推送给 WebSocket 连接
+CONTROL_PREFIX = "control:"
+
+_seq = itertools.count()
+
+
+class Subscriber:
+    def __init__(self, websocket: WebSocket, maxsize: int = settings.WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.topics: Set[str] = set()
+        # 带合并键的消息会覆盖队列中同键的旧消息（同一设备只保留最新状态）
+        self._pending: "OrderedDict[object, str]" = OrderedDict()
+        # 发送协程空闲时等待的 future，有新消息时直接唤醒（比 asyncio.Event 少一层等待者队列）
+        self._waiter: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def offer(self, message: str, key: Optional[str] = None) -> None:
+        if self.closed:
+            return
+        if key is None:
+            key = next(_seq)
+        elif key in self._pending:
+            self.coalesced += 1
+            del self._pending[key]
+        self._pending[key] = message
+        if len(self._pending) > self.maxsize:
+            self._pending.popitem(last=False)  # 队列已满时丢弃最旧的消息
+            self.dropped += 1
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _send_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if not self._pending:
+                    self._waiter = loop.create_future()
+                    await self._waiter
+                while self._pending:
+                    _, message = self._pending.popitem(last=False)
+                    await self.websocket.send_text(message)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 发送失败说明连接已断开，由接收端负责注销
+            self.closed = True
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._send_loop())
+
+    def stop(self) -> None:
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+
+
+class ConnectionManager:
+    def __init__(self):
+        self.subscribers: Dict[WebSocket, Subscriber] = {}
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self.backend: Optional[PubSubBackend] = None
+        self._control: Dict[str, Callable[[str], None]] = {}
+
+    async def attach(self, backend: Optional[PubSubBackend]) -> None:
+        # 接入多进程转发后端，其他 worker 发布的消息会在本进程扇出
+        if backend is None:
+            return
+        await backend.start(self._on_remote)
+        self.backend = backend
+
+    async def detach(self) -> None:
+        if self.backend is not None:
+            await self.backend.stop()
+            self.backend = None
+
+    def on_control(self, name: str, handler: Callable[[str], None]) -> None:
+        # 其他 worker 发布的控制消息由 handler 处理，在线程池中执行，可以访问数据库
+        self._control[CONTROL_PREFIX + name] = handler
+
+    def publish_control(self, name: str, message: str) -> None:
+        # 可在任意线程调用；未接入转发后端（单 worker）时无需通知
+        if self.backend is not None:
+            self.backend.publish_threadsafe(CONTROL_PREFIX + name, message)
+
+    @staticmethod
+    def _run_control(handler: Callable[[str], None], message: str) -> None:
+        try:
+            handler(message)
+        except Exception as e:
+            print(f"处理控制消息失败: {e}")
+
+    def _on_remote(self, batch: List[Envelope]) -> None:
+        for topic, message, key in batch:
+            if topic is not None and topic.startswith(CONTROL_PREFIX):
+                handler = self._control.get(topic)
+                if handler is not None:
+                    asyncio.get_running_loop().run_in_executor(None, self._run_control, handler, message)
+            elif topic is None:
+                self._fanout_all(message)
+            else:
+                self._fanout(topic, message, key)
+
+    def has_subscribers(self, topic: str) -> bool:
+        # 接入转发后端后无法得知其他 worker 的订阅情况，按有订阅者处理
+        return self.backend is not None or topic in self.topics
+
+    async def connect(self, websocket: WebSocket) -> Subscriber:
+        await websocket.accept()
+        subscriber = Subscriber(websocket)
+        subscriber.start()
+        self.subscribers[websocket] = subscriber
+        return subscriber
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        self.unsubscribe(subscriber, list(subscriber.topics))
+        subscriber.stop()
+
+    def subscribe(self, subscriber: Subscriber, topics: Iterable[str]) -> List[str]:
+        accepted = []
+        for topic in topics:
+            if not isinstance(topic, str) or not topic.startswith(TOPIC_PREFIXES):
+                continue
+            if topic.startswith("node:"):
+                topic = topic.lower()  # 上行数据中的 devEUI 统一为小写
+            self.topics.setdefault(topic, set()).add(subscriber)
+            subscriber.topics.add(topic)
+            accepted.append(topic)
+        return accepted
+
+    def unsubscribe(self, subscriber: Subscriber, topics: Iterable[str]) -> None:
+        for topic in topics:
+            members = self.topics.get(topic)
+            if members is not None:
+                members.discard(subscriber)
+                if not members:
+                    del self.topics[topic]
+            subscriber.topics.discard(topic)
+
+    def publish(self, topic: str, message: str, key: Optional[str] = None) -> int:
+        # 先在本进程扇出，再交给转发后端；返回本进程内的订阅者数
+        if self.backend is not None:
+            self.backend.publish(topic, message, key)
+        return self._fanout(topic, message, key)
+
+    def _fanout(self, topic: str, message: str, key: Optional[str] = None) -> int:
+        # 只把消息放入各订阅者队列，不等待发送完成，因此扇出耗时与连接快慢无关
+        members = self.topics.get(topic)
+        if not members:
+            return 0
+        for subscriber in members:
+            subscriber.offer(message, key)
+        return len(members)
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            subscriber.offer(message)
+
+    async def broadcast(self, message: str):
+        if self.backend is not None:
+            self.backend.publish(None, message)
+        self._fanout_all(message)
+
+    def _fanout_all(self, message: str) -> None:
+        for subscriber in self.subscribers.values():
+            subscriber.offer(message)
+
+    def stats(self) -> Dict[str, int]:
+        subscribers = list(self.subscribers.values())
+        return {
+            "connections": len(subscribers),
+            "topics": len(self.topics),
+            "sent": sum(s.sent for s in subscribers),
+            "dropped": sum(s.dropped for s in subscribers),
+            "coalesced": sum(s.coalesced for s in subscribers),
+            "relayed": self.backend.published if self.backend is not None else 0,
+            "received": self.backend.received if self.backend is not None else 0,
+        }
+
+
+manager = ConnectionManager()
+
+
+async def handle_client_message(subscriber: Subscriber, text: str) -> None:
+    # 客户端协议：{"action": "subscribe" | "unsubscribe" | "ping", "topics": [...]}
+    try:
+        request = json.loads(text)
+        action = request.get("action")
+        topics = request.get("topics") or []
+    except (ValueError, AttributeError):
+        subscriber.offer(json.dumps({"what": "WS_ERROR", "code": "3", "errNo": "400", "errMsg": "无效的消息格式"}))
+        return
+
+    if action == "subscribe":
+        accepted = manager.subscribe(subscriber, topics)
+        subscriber.offer(json.dumps({"what": "WS_SUB", "code": "0", "topics": accepted}))
+    elif action == "unsubscribe":
+        manager.unsubscribe(subscriber, topics)
+        subscriber.offer(json.dumps({"what": "WS_UNSUB", "code": "0", "topics": topics}))
+    elif action == "ping":
+        subscriber.offer(json.dumps({"what": "WS_PONG", "code": "0"}))
+    else:
+        subscriber.offer(json.dumps({"what": "WS_ERROR", "code": "3", "errNo": "400", "errMsg": f"未知操作: {action}"}))
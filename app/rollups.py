@@ -0,0 +1,187 @@
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import HistoryChunk, HistoryRollup
+from app.tsdb import Series, decode_chunk, node_series, station_series, to_ms
+
+# 历史数据预聚合：按 1 分钟 / 1 小时 / 1 天维护每个序列的 min/max/sum/count/last，
+# 在接入时增量更新，查询时选择满足点数要求的最粗粒度
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# 本地时区偏移，保证按天聚合的桶从本地零点开始
+_LOCAL_OFFSET_MS = time.localtime().tm_gmtoff * 1000
+
+
+def bucket_start(timestamps: np.ndarray, resolution: int) -> np.ndarray:
+    width = resolution * 1000
+    return (timestamps + _LOCAL_OFFSET_MS) // width * width - _LOCAL_OFFSET_MS
+
+
+def plan_resolution(begin: datetime, end: datetime, min_points: int = settings.ROLLUP_MIN_POINTS) -> Optional[int]:
+    # 选择桶数不少于 min_points 的最粗粒度；范围太短时返回 None 表示直接读原始数据
+    span = (end - begin).total_seconds()
+    for resolution in reversed(RESOLUTIONS):
+        if span / resolution >= min_points:
+            return resolution
+    return None
+
+
+def compute_rollups(keys: List[str], timestamps: np.ndarray, values: np.ndarray, resolution: int) -> List[Dict[str, Any]]:
+    if len(keys) == 0:
+        return []
+    series_names, codes = np.unique(np.asarray(keys), return_inverse=True)
+    buckets = bucket_start(timestamps, resolution)
+    # 按 (序列, 桶, 时间) 排序后每组连续，组内最后一个即 last
+    order = np.lexsort((timestamps, buckets, codes))
+    codes, buckets = codes[order], buckets[order]
+    timestamps, values = timestamps[order], values[order].astype(np.float64)
+
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    sums = np.add.reduceat(values, starts)
+    counts = np.diff(np.r_[starts, len(codes)])
+
+    return [
+        {
+            "series": str(series_names[code]),
+            "resolution": resolution,
+            "bucket": int(bucket),
+            "min_value": float(mn),
+            "max_value": float(mx),
+            "sum_value": float(sm),
+            "count": int(cnt),
+            "last_value": float(last),
+            "last_ts": int(last_ts),
+        }
+        for code, bucket, mn, mx, sm, cnt, last, last_ts in zip(
+            codes[starts], buckets[starts], mins, maxs, sums, counts, values[ends], timestamps[ends])
+    ]
+
+
+def upsert_rollups(db: Session, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(HistoryRollup)
+        smallest, largest = func.least, func.greatest
+    else:
+        stmt = sqlite.insert(HistoryRollup)
+        smallest, largest = func.min, func.max
+
+    table = HistoryRollup.__table__.c
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["series", "resolution", "bucket"],
+        set_={
+            "min_value": smallest(table.min_value, excluded.min_value),
+            "max_value": largest(table.max_value, excluded.max_value),
+            "sum_value": table.sum_value + excluded.sum_value,
+            "count": table.count + excluded.count,
+            "last_value": case((excluded.last_ts >= table.last_ts, excluded.last_value), else_=table.last_value),
+            "last_ts": largest(table.last_ts, excluded.last_ts),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def rollup_batch(db: Session, batch: List[Dict[str, Any]]) -> int:
+    timestamps = np.fromiter((to_ms(s["date"]) for s in batch), dtype=np.int64, count=len(batch))
+    values = np.fromiter((s["param_value"] for s in batch), dtype=np.float64, count=len(batch))
+    keys = [node_series(s["node_id"]) for s in batch]
+    station_rows = [i for i, s in enumerate(batch) if s.get("station_id") is not None]
+    if station_rows:
+        keys.extend(station_series(batch[i]["station_id"]) for i in station_rows)
+        timestamps = np.concatenate([timestamps, timestamps[station_rows]])
+        values = np.concatenate([values, values[station_rows]])
+
+    total = 0
+    for resolution in RESOLUTIONS:
+        rows = compute_rollups(keys, timestamps, values, resolution)
+        upsert_rollups(db, rows)
+        total += len(rows)
+    return total
+
+
+def ingest(batch: List[Dict[str, Any]], session_factory: Callable[[], Session]) -> None:
+    # 接入层批次回调：三种粒度在同一事务中更新
+    if not batch:
+        return
+    db = session_factory()
+    try:
+        rollup_batch(db, batch)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"更新历史数据聚合失败: {e}")
+    finally:
+        db.close()
+
+
+def query_rollups(db: Session, series_keys: Iterable[str], resolution: int, begin_ms: int, end_ms: int) -> Dict[str, Dict[str, np.ndarray]]:
+    series_keys = list(series_keys)
+    rows = db.query(HistoryRollup.series, HistoryRollup.bucket, HistoryRollup.min_value, HistoryRollup.max_value,
+                    HistoryRollup.sum_value, HistoryRollup.count, HistoryRollup.last_value).filter(
+        HistoryRollup.series.in_(series_keys),
+        HistoryRollup.resolution == resolution,
+        HistoryRollup.bucket >= int(bucket_start(np.int64(begin_ms), resolution)),
+        HistoryRollup.bucket <= end_ms,
+    ).order_by(HistoryRollup.series, HistoryRollup.bucket).all()
+
+    grouped: Dict[str, List[Any]] = {key: [] for key in series_keys}
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+
+    result = {}
+    for key, items in grouped.items():
+        data = np.array(items, dtype=np.float64).reshape(-1, 6)
+        counts = data[:, 4]
+        result[key] = {
+            "timestamps": data[:, 0].astype(np.int64),
+            "min": data[:, 1],
+            "max": data[:, 2],
+            "avg": np.divide(data[:, 3], counts, out=np.zeros_like(counts), where=counts > 0),
+            "count": counts.astype(np.int64),
+            "last": data[:, 5],
+        }
+    return result
+
+
+def backfill_rollups(db: Session, batch_size: int = 1000) -> int:
+    # 由列式存储中的全部序列（节点与分站）重建聚合：在同一事务中先清空 history_rollups 再逐个序列重新聚合，
+    # 可重复执行，接入已启动后执行也不会重复计数；应在 tsdb 的 backfill 之后执行
+    db.query(HistoryRollup).delete(synchronize_session=False)
+    total = 0
+    current, parts = None, []
+    chunks = db.query(HistoryChunk.series, HistoryChunk.ts_blob, HistoryChunk.value_blob).order_by(
+        HistoryChunk.series, HistoryChunk.start_ts).yield_per(batch_size)
+    for series, ts_blob, value_blob in chunks:
+        if series != current:
+            total += _rebuild_series(db, current, parts)
+            current, parts = series, []
+        parts.append(decode_chunk(ts_blob, value_blob))
+    total += _rebuild_series(db, current, parts)
+    db.commit()
+    return total
+
+
+def _rebuild_series(db: Session, series: Optional[str], parts: List[Series]) -> int:
+    if series is None or not parts:
+        return 0
+    timestamps = np.concatenate([part[0] for part in parts])
+    values = np.concatenate([part[1] for part in parts])
+    keys = [series] * len(timestamps)
+    for resolution in RESOLUTIONS:
+        upsert_rollups(db, compute_rollups(keys, timestamps, values, resolution))
+    return len(timestamps)
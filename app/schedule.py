@@ -0,0 +1,284 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# 定时/循环任务的触发规则：
+# - 动作日：repeatMode 为 ODD_DAY（单日）/ EVEN_DAY（双日）/ WORKDAY（周一至周五）/ INT_DAY（自 setupDay 起每隔 intervalDay 天），
+#   未设置 repeatMode 时，actDay 给出的日期（逗号分隔的 YYYY-MM-DD）为动作日，两者都未设置则每天动作；早于 setupDay 的日期不动作
+# - 动作时刻：TIMING 在每个动作日的各个开始时间（begin）触发，最多 number1 个；
+#   CYCLING 从每个开始时间起按 actOnTime 秒的周期循环 cycleNum 次，不跨过当天零点
+# 动作日规则按年展开为位图（第 i 位表示当年第 i 天），按不含 setupDay 的规则缓存（INT_DAY 只取 setupDay 对间隔的相位），
+# 规则相同的任务共用，setupDay 在取用时按二分截掉；任务修改后规则变化即对应新的缓存项，无需显式失效
+
+SCHEDULED_TYPES = ("TIMING", "CYCLING")
+REPEAT_MODES = ("ODD_DAY", "EVEN_DAY", "WORKDAY", "INT_DAY")
+
+# 寻找下一次触发时最多向后查找的天数
+MAX_LOOKAHEAD_DAYS = 800
+DAY_SECONDS = 86400
+# 缓存的（规则, 年）位图数量
+YEAR_MASK_CACHE_SIZE = 4096
+
+
+def parse_clock(value: Any) -> Optional[int]:
+    # 返回当天的秒数，支持 "HH:MM"、"HH:MM:SS"、完整日期时间字符串与 datetime
+    if isinstance(value, datetime):
+        return clock_seconds(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    if len(text) > 8:
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+        return clock_seconds(parsed)
+    parts = text.split(":")
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        return None
+    if len(numbers) not in (2, 3):
+        return None
+    hour, minute, second = (numbers + [0])[:3]
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        return None
+    return hour * 3600 + minute * 60 + second
+
+
+def clock_seconds(value: datetime) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def parse_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return datetime.fromisoformat(value.strip()[:10]).date()
+    except ValueError:
+        return None
+
+
+def parse_dates(value: Any) -> FrozenSet[date]:
+    if not isinstance(value, str):
+        return frozenset()
+    return frozenset(day for day in (parse_date(part) for part in value.split(",")) if day is not None)
+
+
+def _rule_active(day: date, repeat_mode: Optional[str], setup_day: Optional[date],
+                 interval_day: int, act_days: FrozenSet[date]) -> bool:
+    if setup_day is not None and day < setup_day:
+        return False
+    if repeat_mode == "ODD_DAY":
+        return day.day % 2 == 1
+    if repeat_mode == "EVEN_DAY":
+        return day.day % 2 == 0
+    if repeat_mode == "WORKDAY":
+        return day.weekday() < 5
+    if repeat_mode == "INT_DAY":
+        start = setup_day or day
+        return (day - start).days % interval_day == 0
+    if act_days:
+        return day in act_days
+    return True
+
+
+def rule_key(repeat_mode: Optional[str], setup_day: Optional[date], interval_day: int,
+             act_days: FrozenSet[date]) -> Tuple:
+    # 动作日规则去掉 setupDay 后的缓存键：() 表示每天动作
+    if repeat_mode in ("ODD_DAY", "EVEN_DAY", "WORKDAY"):
+        return (repeat_mode,)
+    if repeat_mode == "INT_DAY":
+        if setup_day is None or interval_day <= 1:
+            return ()
+        return (repeat_mode, interval_day, setup_day.toordinal() % interval_day)
+    if act_days:
+        return ("ACT_DAY", act_days)
+    return ()
+
+
+def _year_active(rule: Tuple, year: int) -> np.ndarray:
+    # 当年每天是否动作（不考虑 setupDay）
+    first, last = date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal()
+    ordinals = np.arange(first, last)
+    mode = rule[0] if rule else None
+    if mode in ("ODD_DAY", "EVEN_DAY"):
+        days = np.arange(f"{year}-01-01", f"{year + 1}-01-01", dtype="datetime64[D]")
+        month_day = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+        return month_day % 2 == (1 if mode == "ODD_DAY" else 0)
+    if mode == "WORKDAY":
+        # 序数 1（0001-01-01）为周一
+        return (ordinals - 1) % 7 < 5
+    if mode == "INT_DAY":
+        return ordinals % rule[1] == rule[2]
+    if mode == "ACT_DAY":
+        return np.isin(ordinals, [day.toordinal() for day in rule[1] if day.year == year])
+    return np.ones(len(ordinals), dtype=bool)
+
+
+@lru_cache(maxsize=YEAR_MASK_CACHE_SIZE)
+def year_mask(rule: Tuple, year: int) -> int:
+    # 当年动作日位图
+    return int.from_bytes(np.packbits(_year_active(rule, year), bitorder="little").tobytes(), "little")
+
+
+@lru_cache(maxsize=YEAR_MASK_CACHE_SIZE)
+def year_days(rule: Tuple, year: int) -> Tuple[int, ...]:
+    # 当年动作日的序数（date.toordinal），升序，用于按时间范围二分定位
+    first = date(year, 1, 1).toordinal()
+    return tuple((first + np.flatnonzero(_year_active(rule, year))).tolist())
+
+
+class TaskSchedule(NamedTuple):
+    task_id: int
+    task_type: str
+    action: Optional[str]
+    repeat_mode: Optional[str]
+    setup_day: Optional[date]
+    interval_day: int
+    act_days: FrozenSet[date]
+    offsets: Tuple[int, ...]  # 当天的触发时刻（秒），升序
+
+    @property
+    def rule(self) -> Tuple:
+        return rule_key(self.repeat_mode, self.setup_day, self.interval_day, self.act_days)
+
+    def year_mask(self, year: int) -> int:
+        setup_day = self.setup_day
+        if setup_day is not None and setup_day.year > year:
+            return 0
+        mask = year_mask(self.rule, year)
+        if setup_day is not None and setup_day.year == year:
+            mask &= -1 << (setup_day.timetuple().tm_yday - 1)
+        return mask
+
+    def is_active(self, day: date) -> bool:
+        if self.setup_day is not None and day < self.setup_day:
+            return False
+        return bool(year_mask(self.rule, day.year) >> (day.timetuple().tm_yday - 1) & 1)
+
+    def year_days(self, year: int) -> Tuple[int, ...]:
+        days = year_days(self.rule, year)
+        if self.setup_day is not None and self.setup_day.year >= year:
+            days = days[bisect_left(days, self.setup_day.toordinal()):]
+        return days
+
+    def active_ordinals(self, begin: date, end: Optional[date] = None, count: int = 0) -> List[int]:
+        # [begin, end] 内动作日的序数，按年二分截取，早于 setupDay 的部分一并截掉；
+        # end 为空时最多查找 MAX_LOOKAHEAD_DAYS 天，count > 0 时最多取 count 天
+        last = end or begin + timedelta(days=MAX_LOOKAHEAD_DAYS)
+        if self.act_days and self.repeat_mode not in REPEAT_MODES:
+            last = min(last, max(self.act_days))
+        if self.setup_day is not None and self.setup_day > begin:
+            begin = self.setup_day
+        first_ordinal, last_ordinal = begin.toordinal(), last.toordinal()
+        rule = self.rule
+        result: List[int] = []
+        for year in range(begin.year, last.year + 1):
+            days = year_days(rule, year)
+            start = bisect_left(days, first_ordinal)
+            stop = bisect_right(days, last_ordinal, start)
+            if count:
+                stop = min(stop, start + count - len(result))
+            result.extend(days[start:stop])
+            if count and len(result) >= count:
+                break
+        return result
+
+    def active_days(self, begin: date, end: Optional[date] = None) -> List[date]:
+        return [date.fromordinal(ordinal) for ordinal in self.active_ordinals(begin, end)]
+
+    def slots(self, after: datetime, end: Optional[datetime] = None, limit: int = 0) -> List[Tuple[date, int]]:
+        # 严格晚于 after、不晚于 end 的触发时间，以 (日期, 当天秒数) 给出，limit > 0 时最多给出 limit 个
+        offsets = self.offsets
+        if not offsets:
+            return []
+        after_day, after_second = after.date(), clock_seconds(after)
+        end_day = end.date() if end is not None else None
+        end_second = clock_seconds(end) if end is not None else DAY_SECONDS
+        # 第一天可能只剩部分时刻，多取一天
+        days = -(-limit // len(offsets)) + 1 if limit else 0
+        ordinals = self.active_ordinals(after_day, end_day, days)
+        if not ordinals:
+            return []
+        result = [(day, offset) for day in map(date.fromordinal, ordinals) for offset in offsets]
+        # 去掉第一天不晚于 after、最后一天晚于 end 的时刻
+        head = bisect_right(offsets, after_second) if ordinals[0] == after_day.toordinal() else 0
+        tail = len(result)
+        if end_day is not None and ordinals[-1] == end_day.toordinal():
+            tail -= len(offsets) - bisect_right(offsets, end_second)
+        if limit:
+            tail = min(tail, head + limit)
+        return result[head:tail]
+
+    def occurrences(self, after: datetime, end: Optional[datetime] = None, limit: int = 0) -> List[datetime]:
+        return [datetime(day.year, day.month, day.day) + timedelta(seconds=offset)
+                for day, offset in self.slots(after, end, limit)]
+
+    def next_fire(self, after: datetime) -> Optional[datetime]:
+        # 严格晚于 after 的下一次触发时间，没有则返回 None
+        fires = self.occurrences(after, limit=1)
+        return fires[0] if fires else None
+
+
+@lru_cache(maxsize=4096)
+def _day_text(day: date) -> str:
+    return day.isoformat()
+
+
+@lru_cache(maxsize=DAY_SECONDS)
+def _clock_text(offset: int) -> str:
+    return f"{offset // 3600:02d}:{offset // 60 % 60:02d}:{offset % 60:02d}"
+
+
+def format_slot(day: date, offset: int) -> str:
+    # "YYYY-MM-DD HH:MM:SS"，日期与时刻的文本分别缓存，预览大量任务时不必逐个格式化 datetime
+    return f"{_day_text(day)} {_clock_text(offset)}"
+
+
+def day_offsets(task_type: str, begin_offsets: Iterable[int], number1: Optional[int] = None,
+                cycle_num: Optional[int] = None, act_on_time: Optional[int] = None) -> Tuple[int, ...]:
+    begins = sorted(set(begin_offsets))
+    if task_type == "TIMING":
+        if number1:
+            begins = begins[:number1]
+        return tuple(begins)
+    if task_type == "CYCLING":
+        period = max(1, act_on_time or 0)
+        cycles = max(1, cycle_num or 1)
+        offsets = set()
+        for begin in begins:
+            for k in range(cycles):
+                offset = begin + k * period
+                if offset >= DAY_SECONDS:
+                    break
+                offsets.add(offset)
+        return tuple(sorted(offsets))
+    return ()
+
+
+def compile_task(task, begin_times: Iterable[Any]) -> Optional[TaskSchedule]:
+    # task 为 Task 模型（或具有相同字段的对象），begin_times 为开始时间列表；非定时/循环任务返回 None
+    if task.task_type not in SCHEDULED_TYPES:
+        return None
+    begin_offsets = [offset for offset in (parse_clock(value) for value in begin_times) if offset is not None]
+    offsets = day_offsets(task.task_type, begin_offsets, task.number1, task.cycle_num, task.act_on_time)
+    repeat_mode = (task.repeat_mode or "").upper() or None
+    interval_day = task.interval_day or 1
+    return TaskSchedule(
+        task_id=task.task_id,
+        task_type=task.task_type,
+        action=task.action,
+        repeat_mode=repeat_mode,
+        setup_day=parse_date(task.setup_day),
+        interval_day=max(1, interval_day),
+        act_days=parse_dates(task.act_day),
+        offsets=offsets,
+    )
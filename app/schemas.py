@@ -1,7 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from app.config import settings
+
 class SuperAdminLoginRequest(BaseModel):
     superID: str
     superPasswd: str
@@ -51,6 +53,7 @@ class AreaQueryRequest(BaseModel):
     systemID: str
     first: int
     number: int
+    after: Optional[str] = None  # 分页游标，取自上一页返回的 next
     token: str
     needAnswer: str = "yes"
     
@@ -199,6 +202,25 @@ class TaskDelete(BaseModel):
     systemID: str
     taskID: str
 
+class TaskPreviewRequest(BaseModel):
+    systemID: str
+    taskID: Optional[List[str]] = None  # 不传则预览系统下所有定时/循环任务
+    beginTime: Optional[str] = None  # 默认当前时间
+    endTime: Optional[str] = None
+    number: int = Field(10, ge=1, le=settings.TASK_PREVIEW_MAX_NUMBER)  # 每个任务最多返回的触发次数
+
+class TaskPreviewItem(BaseModel):
+    taskID: str
+    fireTime: List[str]
+
+class TaskPreviewResponse(BaseModel):
+    what: str = "PRV_TASK"
+    code: str
+    number: Optional[int] = None
+    tasks: Optional[List[TaskPreviewItem]] = None
+    errNo: Optional[str] = None
+    errMsg: Optional[str] = None
+
 class TaskQuery(BaseModel):
     systemID: str
     taskID: Optional[str]
@@ -275,13 +297,16 @@ class SystemTaskRunModeRequest(BaseModel):
     systemID: str
     first: int
     number: int
+    after: Optional[str] = None  # 分页游标，取自上一页返回的 next
 
 class SystemTaskRunModeResponse(BaseModel):
     what: str = "QRY_SYSTASK"
     code: str
     first: int
     number: int
+    total: Optional[int] = None
     tasks: Optional[List[TaskRunMode]] = []
+    next: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     what: str
@@ -351,6 +376,8 @@ class SystemListResponse(BaseModel):
     system: Optional[List[System]]
     errNo: Optional[str]
     errMsg: Optional[str]
+    total: Optional[int] = None
+    next: Optional[str] = None
 
 class AddStaffRequest(BaseModel):
     token: str
@@ -383,27 +410,22 @@ class StaffListResponse(BaseModel):
 
 class SubstationCreate(BaseModel):
     systemID: str
-    substationNo: int
-    devEUI: str
-    substationName: str
-    location: Optional[str] = None
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
-    memo: Optional[str] = None
+    hostNo: int
+    nodeNo: int
+    number: int
+    # 每项含 stationName/portNo/areaID/drvType/drvTime/mbAddr/mbParam/memo
+    controller: List[Dict[str, Any]]
 
 class SubstationUpdate(BaseModel):
     systemID: str
-    substationNo: int
-    devEUI: Optional[str] = None
-    substationName: Optional[str] = None
-    location: Optional[str] = None
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
-    memo: Optional[str] = None
+    number: int
+    # 每项含 stationID 及需要修改的字段（同添加分站）
+    controller: List[Dict[str, Any]]
 
 class SubstationDelete(BaseModel):
     systemID: str
-    substationNo: int
+    number: int
+    controller: List[Station]
 
 class SubstationQuery(BaseModel):
     systemID: str
@@ -412,6 +434,7 @@ class SubstationQuery(BaseModel):
     areaID: Optional[int] = None
     first: int
     number: int
+    after: Optional[str] = None  # 分页游标，取自上一页返回的 next
 
 
 # 主机相关的Schema
@@ -437,10 +460,37 @@ class HostDelete(BaseModel):
     systemID: str
     hostNo: int
 
+# 批量导入主机：host 为逐行数据（JSON 数组或 CSV 的各行），逐行按 HostImportRow 校验
+class HostImportRow(BaseModel):
+    hostNo: int
+    devEUI: Optional[str] = None  # VIRTUAL 主机自动生成
+    hostType: str
+    hostName: Optional[str] = None
+    maxConnection: Optional[int] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    userName: Optional[str] = None
+    phoneNum: Optional[str] = None
+    memo: Optional[str] = None
+
+class HostImportRequest(BaseModel):
+    systemID: str
+    mode: str = "ADD"  # ADD：已存在的主机报错；UPSERT：已存在的主机更新
+    atomic: bool = False  # 为 True 时任一行出错则整批不写入
+    host: List[Dict[str, Any]]
+
+class HostLogQuery(BaseModel):
+    beginDay: str
+    endDay: str
+    hostNo: Optional[int] = None  # 不传则查询所有主机
+    number: int = 1000  # 最多返回的条数，按时间倒序
+
 class HostQuery(BaseModel):
     systemID: str
     first: int
     number: int
+    after: Optional[str] = None  # 分页游标，取自上一页返回的 next
 
 
 # 节点相关的Schema
@@ -456,22 +506,31 @@ class NodeCreate(BaseModel):
 class NodeUpdate(BaseModel):
     systemID: str
     hostNo: int
-    nodeNo: int
+    nodeNo: Optional[int] = None
     nodeName: Optional[str] = None
     location: Optional[str] = None
     memo: Optional[str] = None
+    # 批量修改：每项含 nodeNo 及需要修改的 devName/devType/devPort/location/memo
+    controller: List[Dict[str, Any]] = []
 
 class NodeDelete(BaseModel):
     systemID: str
     hostNo: int
     nodeNo: int
 
+class NodeLogQuery(BaseModel):
+    beginDay: str
+    endDay: str
+    nodeNo: Optional[int] = None  # 不传则查询所有节点
+    number: int = 1000  # 最多返回的条数，按时间倒序
+
 class NodeQuery(BaseModel):
     systemID: str
     hostNo: Optional[int] = None
     nodeNo: Optional[int] = None
     first: int
     number: int
+    after: Optional[str] = None  # 分页游标，取自上一页返回的 next
     
     
 class StationHistoryRequest(BaseModel):
@@ -487,13 +546,17 @@ class StationHistoryRequest(BaseModel):
     beginDay: str
     endDay: str
     needAnswer: str
+    maxPoints: Optional[int] = None  # 每个设备最多返回的点数，不传则返回全部
+    downsample: Optional[str] = "LTTB"  # 降采样方法 LTTB/AVG/MINMAX
 
 class StationHistoryResponse(BaseModel):
     what: str
     code: str
-    paramNum: int
-    quantity: int
-    data: List[Dict[str, List[Dict[str, str]]]]
+    paramNum: int = 0
+    quantity: int = 0
+    data: List[Dict[str, List[Dict[str, str]]]] = []
+    errNo: Optional[str] = None
+    errMsg: Optional[str] = None
 
 
 class NodeActionRequest(BaseModel):
@@ -525,10 +588,22 @@ class NodeHistoryRequest(BaseModel):
     nodeID: str
     beginDay: str
     endDay: str
+    maxPoints: Optional[int] = None  # 最多返回的点数，不传则返回全部
+    downsample: Optional[str] = "LTTB"  # 降采样方法 LTTB/AVG/MINMAX
+
+class NodeHistoryExportRequest(BaseModel):
+    todo: str = "EXP_NODE_HISTORY"
+    token: str
+    nodeID: str
+    beginDay: str
+    endDay: str
+    format: str = "NDJSON"  # NDJSON/CSV
 
 class NodeHistoryResponse(BaseModel):
     what: str
     code: str
-    paramNum: int
-    quantity: int
-    data: List[Dict[str, List[Dict[str, str]]]]
+    paramNum: int = 0
+    quantity: int = 0
+    data: List[Dict[str, List[Dict[str, str]]]] = []
+    errNo: Optional[str] = None
+    errMsg: Optional[str] = None
@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Task, TaskHistory, TaskStation
+from app.services.rule_service import Actuation, sensor_rules
+from app.services.scheduler_service import Fire, task_scheduler
+
+# 任务动作下发：任务的分站按 concurrent（同时动作设备数量）分批，每批全部完成后间隔 wave_interval 再下发下一批，
+# 避免数百个分站同时动作造成冲击电流与 LoRa 下行拥塞；
+# 每个任务一个信号量，同一任务的多次执行（如上一次尚未下发完又被触发）合计也不超过 concurrent 个分站同时动作，
+# 信号量在执行线程中获取后才把下发交给共用的发送线程池，等待的任务不会占住发送线程；
+# 批次超时时尚未开始的下发被取消（NOT_SENT），已开始的记为 FAILED，其信号量在下发返回后释放；
+# 所有分站的结果在执行结束后一次写入 task_histories；分站下行尚未接入（未配置 sender）时不下发，结果记为 NOT_SENT
+
+
+class StationOutcome(NamedTuple):
+    wave: int
+    station_id: int
+    status: str  # SUCCESS / FAILED / NOT_SENT
+    executed_at: datetime
+    error: Optional[str]
+
+
+class WaveResult(NamedTuple):
+    wave: int
+    size: int
+    succeeded: int
+    failed: int
+    seconds: float
+
+
+class ExecutionResult(NamedTuple):
+    task_id: int
+    action: str
+    concurrent: int
+    waves: List[WaveResult]
+    outcomes: List[StationOutcome]
+
+
+class ActuationExecutor:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 sender: Optional[Callable[[int, str], bool]] = None,
+                 default_concurrent: int = settings.ACTUATION_DEFAULT_CONCURRENT,
+                 wave_interval: float = settings.ACTUATION_WAVE_INTERVAL,
+                 send_timeout: float = settings.ACTUATION_SEND_TIMEOUT,
+                 workers: int = settings.ACTUATION_WORKERS,
+                 max_runs: int = settings.ACTUATION_MAX_RUNS):
+        self.session_factory = session_factory
+        # 分站下发接口，失败时返回 False 或抛出异常；为空表示分站下行尚未接入
+        self.sender = sender
+        self.default_concurrent = default_concurrent
+        self.wave_interval = wave_interval
+        self.send_timeout = send_timeout
+        self.workers = workers
+        self.max_runs = max_runs
+        self._sends: Optional[ThreadPoolExecutor] = None
+        self._runs: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[int, Tuple[int, threading.BoundedSemaphore]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.recent: Deque[ExecutionResult] = deque(maxlen=100)
+        self.executions = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.not_sent = 0
+
+    def _semaphore(self, task_id: int, limit: int) -> threading.BoundedSemaphore:
+        # concurrent 修改后新的执行使用新的信号量，正在执行的批次不受影响
+        with self._lock:
+            current = self._semaphores.get(task_id)
+            if current is None or current[0] != limit:
+                current = self._semaphores[task_id] = (limit, threading.BoundedSemaphore(limit))
+            return current[1]
+
+    def _send(self, station_id: int, action: str) -> Tuple[str, Optional[str]]:
+        try:
+            return ("SUCCESS", None) if self.sender(station_id, action) else ("FAILED", "下发失败")
+        except Exception as e:
+            return "FAILED", str(e)
+
+    def _submit(self, sends: ThreadPoolExecutor, semaphore: threading.BoundedSemaphore, deadline: float,
+                station_id: int, action: str) -> Optional[Future]:
+        # 在执行线程中等待信号量，到 deadline 仍未获得时返回 None；下发结束（或被取消）后释放
+        if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            return None
+        try:
+            future = sends.submit(self._send, station_id, action)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: semaphore.release())
+        return future
+
+    @staticmethod
+    def _outcome(future: Optional[Future]) -> Tuple[str, Optional[str]]:
+        if future is None:
+            return "NOT_SENT", "等待同任务的其他执行超时"
+        if future.done() and not future.cancelled():
+            return future.result()
+        if future.cancel():
+            return "NOT_SENT", "超时未下发"
+        return "FAILED", "超时"
+
+    def _load(self, db: Session, task_id: int) -> Tuple[Optional[int], List[int]]:
+        concurrent = db.query(Task.concurrent).filter(Task.task_id == task_id).scalar()
+        stations = [station_id for (station_id,) in db.query(TaskStation.station_id)
+                    .filter(TaskStation.task_id == str(task_id)).order_by(TaskStation.task_station_id)]
+        return concurrent, stations
+
+    def execute(self, task_id: int, action: str, run_mode: str = "AUTO") -> ExecutionResult:
+        # 同步执行一次任务动作，返回每批的完成情况
+        db = self.session_factory()
+        try:
+            concurrent, stations = self._load(db, task_id)
+        finally:
+            db.close()
+        limit = max(1, concurrent or self.default_concurrent)
+        if self.sender is None:
+            # 未接入下行时不分批，也不能记为成功
+            executed_at = datetime.now()
+            outcomes = [StationOutcome(0, station_id, "NOT_SENT", executed_at, "分站下行尚未接入")
+                        for station_id in stations]
+            return self._finish(ExecutionResult(task_id, action, limit, [], outcomes), run_mode)
+        semaphore = self._semaphore(task_id, limit)
+        sends = self._sends or ThreadPoolExecutor(max_workers=limit, thread_name_prefix="actuation-send")
+
+        waves, outcomes = [], []
+        try:
+            for number, start in enumerate(range(0, len(stations), limit), 1):
+                if number > 1 and self._stop.wait(self.wave_interval):
+                    # 服务停止：其余批次不再下发，同样逐个分站记录
+                    stopped_at = datetime.now()
+                    outcomes.extend(StationOutcome(index // limit + 1, station_id, "NOT_SENT", stopped_at, "服务停止")
+                                    for index, station_id in enumerate(stations[start:], start))
+                    break
+                wave = stations[start:start + limit]
+                begin = time.monotonic()
+                deadline = begin + self.send_timeout
+                executed_at = datetime.now()
+                futures = [self._submit(sends, semaphore, deadline, station_id, action) for station_id in wave]
+                wait([future for future in futures if future is not None],
+                     timeout=max(0.0, deadline - time.monotonic()))
+                results = [self._outcome(future) for future in futures]
+                succeeded = sum(1 for status, _ in results if status == "SUCCESS")
+                failed = sum(1 for status, _ in results if status == "FAILED")
+                waves.append(WaveResult(number, len(wave), succeeded, failed, round(time.monotonic() - begin, 3)))
+                outcomes.extend(StationOutcome(number, station_id, status, executed_at, error)
+                                for station_id, (status, error) in zip(wave, results))
+        finally:
+            if sends is not self._sends:
+                sends.shutdown(wait=False)
+        return self._finish(ExecutionResult(task_id, action, limit, waves, outcomes), run_mode)
+
+    def _finish(self, result: ExecutionResult, run_mode: str) -> ExecutionResult:
+        self._record(result, run_mode)
+        self.recent.append(result)
+        self.executions += 1
+        self.succeeded += sum(wave.succeeded for wave in result.waves)
+        self.failed += sum(wave.failed for wave in result.waves)
+        self.not_sent += sum(1 for outcome in result.outcomes if outcome.status == "NOT_SENT")
+        return result
+
+    def _record(self, result: ExecutionResult, run_mode: str) -> None:
+        if not result.outcomes:
+            return
+        db = self.session_factory()
+        try:
+            db.execute(insert(TaskHistory), [{
+                "task_id": str(result.task_id),
+                "action": result.action,
+                "run_mode": run_mode,
+                "executed_at": outcome.executed_at,
+                "status": outcome.status,
+                "memo": f"分站 {outcome.station_id}" + (f" 第 {outcome.wave} 批" if outcome.wave else "")
+                        + (f": {outcome.error}" if outcome.error else ""),
+            } for outcome in result.outcomes])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"写入任务动作执行记录失败: {e}")
+        finally:
+            db.close()
+
+    def submit(self, task_id: int, action: str, run_mode: str = "AUTO") -> Optional[Future]:
+        # 后台执行；未启动时忽略
+        if self._runs is None:
+            return None
+        return self._runs.submit(self._execute_logged, task_id, action, run_mode)
+
+    def _execute_logged(self, task_id: int, action: str, run_mode: str) -> Optional[ExecutionResult]:
+        try:
+            return self.execute(task_id, action, run_mode)
+        except Exception as e:
+            print(f"任务 {task_id} 动作下发失败: {e}")
+            return None
+
+    def on_fires(self, fires: List[Fire]) -> None:
+        for fire in fires:
+            self.submit(fire.task_id, fire.schedule.action or "")
+
+    def on_actuations(self, actuations: List[Actuation]) -> None:
+        for actuation in actuations:
+            self.submit(actuation.task_id, actuation.action)
+
+    def start(self) -> None:
+        if self._runs is not None:
+            return
+        self._stop.clear()
+        self._sends = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="actuation-send")
+        self._runs = ThreadPoolExecutor(max_workers=self.max_runs, thread_name_prefix="actuation-run")
+
+    def stop(self) -> None:
+        # 不再等待批次间隔，已开始的批次完成后写入结果
+        self._stop.set()
+        runs, self._runs = self._runs, None
+        if runs is not None:
+            runs.shutdown(wait=True)
+        sends, self._sends = self._sends, None
+        if sends is not None:
+            sends.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "succeeded": self.succeeded, "failed": self.failed,
+                "not_sent": self.not_sent}
+
+
+actuation_executor = ActuationExecutor()
+task_scheduler.add_listener(actuation_executor.on_fires)
+sensor_rules.add_listener(actuation_executor.on_actuations)
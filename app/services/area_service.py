@@ -1,12 +1,12 @@
 from sqlalchemy.orm import Session
 from app.models import Area
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app import crud
 
 class AreaService:
     @staticmethod
     def get_areas(db: Session, system_id: str, first: int, number: int) -> List[Dict[str, Any]]:
-        areas = crud.get_areas(db, system_id, first, number)
+        areas = crud.get_areas(db, system_id, first, number).rows
         return [{
             "areaID": area.area_id,
             "areaName": area.area_name,
@@ -17,8 +17,10 @@ class AreaService:
         } for area in areas]
 
     @staticmethod
-    def get_areas(db: Session, system_id: str, first: int, number: int) -> tuple[List[Dict[str, Any]], int]:
-        areas = crud.get_areas(db, system_id, first, number)
+    def get_areas(db: Session, system_id: str, first: int, number: int,
+                  after: Optional[str] = None) -> tuple[List[Dict[str, Any]], int, Optional[str]]:
+        # 返回 (本页空间, 符合条件的总数, 下一页游标)
+        page = crud.get_areas(db, system_id, first, number, after)
         return [{
             "areaID": area.area_id,
             "areaName": area.area_name,
@@ -26,59 +28,58 @@ class AreaService:
             "areaValue": area.area_value,
             "areaHight": area.area_height,
             "memo": area.memo
-        } for area in areas], len(areas)
+        } for area in page.rows], page.total, page.next
         
     @staticmethod
-    def add_areas(db: Session, system_id: str, area_data: List[Dict[str, Any]]):
-        for area in area_data:
-            # 创建一个新的 Area 对象
-            new_area = Area(
-                system_id=system_id,
-                area_name=area["areaName"],  # areaID 是新增时为 0，数据库会自动生成
-                area_location=area["areaLocation"],
-                area_value=area["areaValue"],
-                area_height=area["areaHight"],
-                memo=area.get("memo", "")  # 备注是可选的
-            )
-            # 调用 CRUD 操作来添加区域
-            crud.add_area(db, new_area)
-        
+    def _area_values(area: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "area_name": area["areaName"],
+            "area_location": area["areaLocation"],
+            "area_value": area["areaValue"],
+            "area_height": area["areaHight"],
+            "memo": area.get("memo", "")  # 备注是可选的
+        }
+
+    @staticmethod
+    def _check_existing(db: Session, system_id: str, area_ids: List[str]):
+        # 一次性加载所有引用到的空间 ID，在内存中校验是否存在
+        existing = crud.get_existing_area_ids(db, system_id, area_ids)
+        missing = [area_id for area_id in area_ids if area_id not in existing]
+        if missing:
+            raise Exception(f"空间ID {', '.join(map(str, missing))} 不存在")
+
+    @staticmethod
+    def add_areas(db: Session, system_id: str, area_data: List[Dict[str, Any]]) -> List[str]:
+        # areaID 在新增时为 0，由服务端生成；返回新空间的 ID
+        rows = [{"system_id": system_id, **AreaService._area_values(area)} for area in area_data]
         try:
+            area_ids = crud.add_areas(db, rows)
             # 提交数据库事务
             db.commit()
         except Exception as e:
             # 如果失败，回滚事务
             db.rollback()
             raise Exception("空间添加失败: " + str(e))
+        return area_ids
         
     @staticmethod
-    def update_areas(db: Session, area_data: List[Dict[str, Any]]):
-        for area in area_data:
-            existing_area = crud.get_area_by_id(db, area["areaID"])
-            if existing_area:
-                existing_area.area_name = area["areaName"]
-                existing_area.area_location = area["areaLocation"]
-                existing_area.area_value = area["areaValue"]
-                existing_area.area_height = area["areaHight"]
-                existing_area.memo = area.get("memo", "")
-            else:
-                raise Exception(f"空间ID {area['areaID']} 不存在")
+    def update_areas(db: Session, system_id: str, area_data: List[Dict[str, Any]]):
+        rows = {area["areaID"]: {"area_id": area["areaID"], **AreaService._area_values(area)} for area in area_data}
+        AreaService._check_existing(db, system_id, list(rows))
         try:
+            crud.update_areas(db, list(rows.values()))
             db.commit()
         except Exception as e:
             db.rollback()
             raise Exception("空间修改失败: " + str(e))
 
     @staticmethod
-    def delete_areas(db: Session, area_ids: List[str]):
-        for area_id in area_ids:
-            area = crud.get_area_by_id(db, area_id)
-            if area:
-                crud.delete_area(db, area)
-            else:
-                raise Exception(f"空间ID {area_id} 不存在")
+    def delete_areas(db: Session, system_id: str, area_ids: List[str]):
+        area_ids = list(dict.fromkeys(area_ids))
+        AreaService._check_existing(db, system_id, area_ids)
         try:
+            crud.delete_areas(db, system_id, area_ids)
             db.commit()
         except Exception as e:
             db.rollback()
-            raise Exception("空间删除失败: " + str(e))
\ No newline at end of file
+            raise Exception("空间删除失败: " + str(e))
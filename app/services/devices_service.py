@@ -1,13 +1,25 @@
+import csv
+import io
+import json
 import uuid
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict
+from typing import Any, Callable, Dict, Iterator, List
 
-from app.schemas import HostCreate, HostUpdate, HostDelete, HostQuery
-from app.schemas import NodeCreate, NodeUpdate, NodeDelete, NodeQuery
+from app.schemas import HostCreate, HostUpdate, HostDelete, HostQuery, HostImportRow, HostImportRequest, HostLogQuery
+from app.schemas import NodeCreate, NodeUpdate, NodeDelete, NodeQuery, NodeLogQuery
 from app.schemas import SubstationCreate, SubstationUpdate, SubstationDelete, SubstationQuery
 from app.schemas import EquipmentStatusRequest, StationHistoryRequest, StationHistoryResponse, ErrorResponse
 from app.schemas import NodeActionRequest, NodeActionResponse, NodeStatusRequest, NodeStatusResponse, NodeHistoryRequest, NodeHistoryResponse
+from app.schemas import NodeHistoryExportRequest
 from app import crud
+from app.config import settings
+from app.db import SessionLocal
+from app.services.telemetry_service import telemetry
+from app.services.ingest_service import node_index
+from app.tsdb import from_ms
+from app.downsample import check_max_points, downsample
 
 # 模拟生成虚拟主机 EUI 的函数
 def generate_virtual_host_eui() -> str:
@@ -43,8 +55,68 @@ def modify_host_service(db: Session, data: HostUpdate) -> Dict:
 def delete_host_service(db: Session, data: HostDelete) -> Dict:
     return crud.delete_host(db, data)
 
-def query_host_service(db: Session, data: HostQuery) -> Dict:
-    return crud.query_host(db, data)
+IMPORT_MODES = ("ADD", "UPSERT")
+
+def parse_host_csv(content: bytes) -> List[Dict[str, Any]]:
+    # 首行为字段名（与 JSON 导入相同，如 hostNo,devEUI,hostType），空单元格视为未填写
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+    return [{k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()} for row in reader]
+
+def validate_host_rows(rows: List[Dict[str, Any]], require_eui: bool = True):
+    # 逐行校验格式并检查批内重复，返回 ([(行号, HostImportRow)], 错误列表)；行号从 1 开始。
+    # UPSERT 时更新已存在的主机可以不填 devEUI，新增的主机是否缺少 devEUI 在写入时检查
+    valid, errors = [], []
+    seen_nos, seen_euis = set(), set()
+    for index, raw in enumerate(rows, start=1):
+        try:
+            row = HostImportRow.model_validate(raw)
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            errors.append({"row": index, "hostNo": raw.get("hostNo") if isinstance(raw, dict) else None,
+                           "errMsg": message})
+            continue
+        if row.hostType == "VIRTUAL":
+            # 只在新增时使用，UPSERT 更新已存在的虚拟主机时保留原 devEUI
+            row.devEUI = generate_virtual_host_eui()
+        elif not row.devEUI and require_eui:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "缺少 devEUI"})
+            continue
+        if row.hostNo in seen_nos:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "主机编号重复"})
+            continue
+        if row.devEUI is not None and row.devEUI in seen_euis:
+            errors.append({"row": index, "hostNo": row.hostNo, "errMsg": "devEUI 重复"})
+            continue
+        seen_nos.add(row.hostNo)
+        if row.devEUI is not None:
+            seen_euis.add(row.devEUI)
+        valid.append((index, row))
+    return valid, errors
+
+def import_hosts_service(db: Session, data: HostImportRequest) -> Dict:
+    mode = data.mode.upper()
+    if mode not in IMPORT_MODES:
+        return {"what": "IMP_HOST", "code": "3", "errNo": "400", "errMsg": f"不支持的导入模式: {data.mode}"}
+    valid, errors = validate_host_rows(data.host, require_eui=mode != "UPSERT")
+    if errors and data.atomic:
+        return {"what": "IMP_HOST", "code": "3", "errNo": "400", "errMsg": "存在无效数据，未导入任何主机",
+                "number": 0, "added": 0, "updated": 0, "errors": errors}
+    result = crud.import_hosts(db, data.systemID, valid, mode, data.atomic)
+    errors = sorted(errors + result.get("errors", []), key=lambda e: e["row"])
+    result["errors"] = errors
+    if result["code"] == "0" and errors and result["number"] == 0:
+        # 没有任何一行导入成功
+        result.update({"code": "3", "errNo": "400", "errMsg": "没有可导入的主机"})
+    return result
+
+async def query_host_service(db: AsyncSession, data: HostQuery) -> Dict:
+    return await crud.query_host(db, data)
+
+def query_host_logs_service(db: Session, data: HostLogQuery) -> Dict:
+    try:
+        return crud.query_host_logs(db, data)
+    except ValueError as e:
+        return {"what": "QRY_HOST_LOG", "code": "3", "errNo": "400", "errMsg": str(e)}
 
 def add_node_service(db: Session, data: NodeCreate) -> Dict:
     # 验证节点数量
@@ -56,26 +128,58 @@ def add_node_service(db: Session, data: NodeCreate) -> Dict:
             "errMsg": "Node number must be greater than zero"
         }
     
-    # 调用 CRUD 层操作
-    return crud.add_node(db, data)
+    # 调用 CRUD 层操作，新节点立即加入上行 devEUI 索引与推送路由
+    result = crud.add_node(db, data)
+    if result["code"] == "0":
+        for node in result["node"]:
+            node_index.put(node["devEUI"], node["nodeNo"])
+            telemetry.put_node(node["nodeNo"], data.systemID)
+    return result
 
 def modify_node_service(db: Session, data: NodeUpdate) -> Dict:
+    # 可修改的字段不包括 devEUI，索引无需更新
     return crud.modify_node(db, data)
 
 def delete_node_service(db: Session, data: NodeDelete) -> Dict:
-    return crud.delete_node(db, data)
+    result = crud.delete_node(db, data)
+    if result["code"] == "0":
+        for node in result["node"]:
+            node_index.discard(node["devEUI"])
+            telemetry.discard_node(node["nodeNo"])
+    return result
+
+def query_node_logs_service(db: Session, data: NodeLogQuery) -> Dict:
+    try:
+        return crud.query_node_logs(db, data)
+    except ValueError as e:
+        return {"what": "QRY_NODE_LOG", "code": "3", "errNo": "400", "errMsg": str(e)}
 
 def query_node_service(db: Session, data: NodeQuery) -> Dict:
     return crud.query_node(db, data)
 
 def add_substation_service(db: Session, data: SubstationCreate) -> Dict:
-    return crud.add_substation(db, data)
+    result = crud.add_substation(db, data)
+    if result["code"] == "0":
+        for station in result["node"]:
+            node_index.put_station(data.nodeNo, station["portNo"], station["stationID"])
+        telemetry.refresh_stations(db, [station["stationID"] for station in result["node"]])
+    return result
 
 def modify_substation_service(db: Session, data: SubstationUpdate) -> Dict:
-    return crud.modify_substation(db, data)
+    result = crud.modify_substation(db, data)
+    if result["code"] == "0":
+        station_ids = [station["stationID"] for station in result["node"]]
+        node_index.refresh_stations(db, station_ids)
+        telemetry.refresh_stations(db, station_ids)
+    return result
 
 def delete_substation_service(db: Session, data: SubstationDelete) -> Dict:
-    return crud.delete_substation(db, data)
+    result = crud.delete_substation(db, data)
+    if result["code"] == "0":
+        for station in result["node"]:
+            node_index.discard_station(station["stationID"])
+            telemetry.discard_station(station["stationID"])
+    return result
 
 def query_substation_service(db: Session, data: SubstationQuery) -> Dict:
     return crud.query_substation(db, data)
@@ -100,7 +204,19 @@ def query_equipment_status(db: Session, request: EquipmentStatusRequest):
             return {"what": "QRY_EQUIP", "code": "3", "errNo": "1", "errMsg": f"查询设备 {station.stationID} 开关状态失败"}
     return {"what": "QRY_EQUIP", "code": "0", "number": request.number, "station": stations}
 
+def format_history_points(timestamps, values, **extra) -> list:
+    # 每个采样点一条记录：{"param": [{"date": ..., "param": ...}]}
+    dates = [from_ms(int(ts)).strftime("%Y-%m-%d %H:%M:%S") for ts in timestamps]
+    return [
+        {"param": [{**extra, "date": date, "param": str(round(float(value), 4))}]}
+        for date, value in zip(dates, values.tolist())
+    ]
+
 def query_station_history(db: Session, request: StationHistoryRequest):
+    try:
+        check_max_points(request.maxPoints, request.downsample)
+    except ValueError as e:
+        return StationHistoryResponse(what="QRY_HISTSTATION", code="3", errNo="400", errMsg=str(e))
     try:
         # 检查设备是否存在
         devices = crud.get_station_devices(db, request.systemID, request.areaID, request.devType, request.stationID)
@@ -124,10 +240,17 @@ def query_station_history(db: Session, request: StationHistoryRequest):
             )
         
         # 处理历史数据
-        processed_data = [
-            {"param": [{"param": param_value} for param_value in params]}
-            for params in data
-        ]
+        processed_data = []
+        for station_id, (timestamps, values) in data.items():
+            timestamps, values = downsample(timestamps, values, request.maxPoints, request.downsample)
+            processed_data.extend(format_history_points(timestamps, values, stationID=str(station_id)))
+        if not processed_data:
+            return StationHistoryResponse(
+                what="QRY_HISTSTATION",
+                code="3",
+                errNo="ERR002",
+                errMsg="未找到历史数据"
+            )
         
         return StationHistoryResponse(
             what="QRY_HISTSTATION",
@@ -137,7 +260,7 @@ def query_station_history(db: Session, request: StationHistoryRequest):
             data=processed_data
         )
     except Exception as e:
-        return ErrorResponse(
+        return StationHistoryResponse(
             what="QRY_HISTSTATION",
             code="3",
             errNo="ERR003",
@@ -161,6 +284,7 @@ def activate_node(db: Session, request: NodeActionRequest):
         node.status = "ACTIVE" if request.action == "ACTIVATE" else "DISABLED"
         db.commit()
         db.refresh(node)
+        telemetry.publish_status(node.dev_eui, request.nodeID, node.system_id, node.status)
         
         return NodeActionResponse(
             what="ACTIVATE_NODE",
@@ -193,6 +317,7 @@ def sleep_node(db: Session, request: NodeActionRequest):
         node.status = "SLEEP" if request.action == "SLEEP" else "AWAKE"
         db.commit()
         db.refresh(node)
+        telemetry.publish_status(node.dev_eui, request.nodeID, node.system_id, node.status)
         
         return NodeActionResponse(
             what="SLEEP_NODE",
@@ -236,10 +361,14 @@ def query_node_status(db: Session, request: NodeStatusRequest):
         )
 
 def query_node_history(db: Session, request: NodeHistoryRequest):
+    try:
+        check_max_points(request.maxPoints, request.downsample)
+    except ValueError as e:
+        return NodeHistoryResponse(what="QRY_NODE_HISTORY", code="3", errNo="400", errMsg=str(e))
     try:
         # 查找节点历史数据
-        history = crud.get_node_history_data(db, request.nodeID, request.beginDay, request.endDay)
-        if not history:
+        timestamps, values = crud.get_node_history_data(db, request.nodeID, request.beginDay, request.endDay)
+        if len(timestamps) == 0:
             return NodeHistoryResponse(
                 what="QRY_NODE_HISTORY",
                 code="3",
@@ -248,10 +377,8 @@ def query_node_history(db: Session, request: NodeHistoryRequest):
             )
 
         # 处理历史数据
-        processed_data = [
-            {"param": [{"param": param_value} for param_value in params]}
-            for params in history
-        ]
+        timestamps, values = downsample(timestamps, values, request.maxPoints, request.downsample)
+        processed_data = format_history_points(timestamps, values)
         
         return NodeHistoryResponse(
             what="QRY_NODE_HISTORY",
@@ -261,9 +388,32 @@ def query_node_history(db: Session, request: NodeHistoryRequest):
             data=processed_data
         )
     except Exception as e:
-        return ErrorResponse(
+        return NodeHistoryResponse(
             what="QRY_NODE_HISTORY",
             code="3",
             errNo="ERR002",
             errMsg=f"查询节点历史数据失败: {str(e)}"
         )
+
+EXPORT_MEDIA_TYPES = {"NDJSON": "application/x-ndjson", "CSV": "text/csv"}
+
+def encode_history_chunk(rows, export_format: str) -> str:
+    if export_format == "CSV":
+        return "".join(f"{date:%Y-%m-%d %H:%M:%S},{value}\n" for date, value in rows)
+    return "".join(
+        json.dumps({"date": f"{date:%Y-%m-%d %H:%M:%S}", "param": value}) + "\n" for date, value in rows
+    )
+
+def export_node_history(request: NodeHistoryExportRequest,
+                        session_factory: Callable[[], Session] = SessionLocal) -> Iterator[str]:
+    # 流式响应期间请求依赖中的会话可能已关闭，这里使用独立会话，导出结束后关闭
+    export_format = request.format.upper()
+    db = session_factory()
+    try:
+        if export_format == "CSV":
+            yield "date,param\n"
+        for rows in crud.iter_node_history(db, request.nodeID, request.beginDay, request.endDay,
+                                           settings.EXPORT_CHUNK_ROWS):
+            yield encode_history_chunk(rows, export_format)
+    finally:
+        db.close()
@@ -0,0 +1,429 @@
+import base64
+import json
+import queue
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud import chunked
+from app.db import SessionLocal
+from app.models import Node, NodeHistory, Substation
+from app.tsdb import ts_store
+from app import rollups
+from app.services.telemetry_service import telemetry
+from app.services.rule_service import sensor_rules
+
+# ChirpStack 上行数据接入：解码 -> devEUI 映射 node_id -> 批量写入 node_history
+
+
+class UplinkDecodeError(ValueError):
+    pass
+
+
+_HEX_EUI = re.compile(r"^[0-9a-fA-F]{16}$")
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def normalize_dev_eui(raw: str) -> str:
+    # v4 为 16 位十六进制，v3 HTTP 集成中为 base64
+    if _HEX_EUI.match(raw):
+        return raw.lower()
+    try:
+        decoded = base64.b64decode(raw, validate=True)
+    except Exception:
+        raise UplinkDecodeError(f"无效的 devEUI: {raw}")
+    if len(decoded) != 8:
+        raise UplinkDecodeError(f"无效的 devEUI: {raw}")
+    return decoded.hex()
+
+
+def parse_uplink_time(raw: Optional[str]) -> datetime:
+    if not raw:
+        return datetime.now()
+    # ChirpStack 时间精确到纳秒，fromisoformat 只支持到微秒
+    raw = _FRACTION.sub(r"\1", raw.replace("Z", "+00:00"))
+    parsed = datetime.fromisoformat(raw)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)  # 统一为本地时间，与查询条件一致
+    return parsed
+
+
+def _value_from_object(obj: Dict[str, Any]) -> Optional[float]:
+    # 优先使用编解码器输出的 value 字段，否则取第一个数值字段
+    if isinstance(obj.get("value"), (int, float)):
+        return float(obj["value"])
+    for value in obj.values():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+
+def _value_from_bytes(data: bytes) -> Optional[float]:
+    if len(data) == 2:
+        return float(struct.unpack(">h", data)[0])
+    if len(data) == 4:
+        return float(struct.unpack(">f", data)[0])
+    return None
+
+
+def decode_uplink(event: Dict[str, Any]) -> Dict[str, Any]:
+    # 同时兼容 ChirpStack v4（deviceInfo/object）与 v3（devEUI/objectJSON）格式
+    if not isinstance(event, dict):
+        raise UplinkDecodeError("上行事件不是 JSON 对象")
+    device_info = event.get("deviceInfo") or {}
+    if not isinstance(device_info, dict):
+        raise UplinkDecodeError("deviceInfo 不是 JSON 对象")
+    raw_eui = device_info.get("devEui") or event.get("devEUI")
+    if not raw_eui:
+        raise UplinkDecodeError("缺少 devEUI")
+    if not isinstance(raw_eui, str):
+        raise UplinkDecodeError(f"无效的 devEUI: {raw_eui}")
+
+    value = None
+    obj = event.get("object")
+    if obj is None and event.get("objectJSON"):
+        obj = json.loads(event["objectJSON"])
+    if isinstance(obj, dict):
+        value = _value_from_object(obj)
+    if value is None and event.get("data"):
+        value = _value_from_bytes(base64.b64decode(event["data"]))
+    if value is None:
+        raise UplinkDecodeError("无法从上行数据中解析参数值")
+
+    return {
+        "dev_eui": normalize_dev_eui(raw_eui),
+        "port": event.get("fPort", event.get("fport")),
+        "date": parse_uplink_time(event.get("time")),
+        "param_value": value,
+    }
+
+
+class NodeIndex:
+    # devEUI -> node_id 的内存索引，未命中时按需查库，并缓存不存在的 devEUI 避免反复查询
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, miss_ttl: float = 60.0):
+        self.session_factory = session_factory
+        self.miss_ttl = miss_ttl
+        self._by_eui: Dict[str, int] = {}
+        self._stations: Dict[tuple, int] = {}
+        self._station_keys: Dict[int, tuple] = {}
+        self._misses: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> int:
+        rows = db.query(Node.id, Node.dev_eui).all()
+        # 分站通过 (节点顺序号, 端口号) 对应到上行的 fPort
+        stations = db.query(Substation.id, Substation.node_no, Substation.port_no).all()
+        with self._lock:
+            self._by_eui = {dev_eui.lower(): node_id for node_id, dev_eui in rows}
+            self._stations = {(node_no, port_no): station_id for station_id, node_no, port_no in stations}
+            self._station_keys = {station_id: (node_no, port_no) for station_id, node_no, port_no in stations}
+            self._misses.clear()
+        return len(rows)
+
+    def put_station(self, node_id: int, port_no: int, station_id: int) -> None:
+        with self._lock:
+            self._discard_station(station_id)
+            self._stations[(node_id, port_no)] = station_id
+            self._station_keys[station_id] = (node_id, port_no)
+
+    def discard_station(self, station_id: int) -> None:
+        with self._lock:
+            self._discard_station(station_id)
+
+    def _discard_station(self, station_id: int) -> None:
+        key = self._station_keys.pop(station_id, None)
+        if key is not None and self._stations.get(key) == station_id:
+            del self._stations[key]
+
+    def refresh_stations(self, db: Session, station_ids: List[int]) -> None:
+        # 分站修改后按主键重新读取节点与端口，已不存在的分站移除
+        found = {}
+        for chunk in chunked(list(station_ids)):
+            found.update((station_id, (node_no, port_no)) for station_id, node_no, port_no in
+                         db.query(Substation.id, Substation.node_no, Substation.port_no).filter(Substation.id.in_(chunk)))
+        for station_id in station_ids:
+            if station_id in found:
+                self.put_station(*found[station_id], station_id)
+            else:
+                self.discard_station(station_id)
+
+    def station_for(self, node_id: int, port: Optional[int]) -> Optional[int]:
+        if port is None:
+            return None
+        return self._stations.get((node_id, port))
+
+    def put(self, dev_eui: str, node_id: int) -> None:
+        with self._lock:
+            self._by_eui[dev_eui.lower()] = node_id
+            self._misses.pop(dev_eui.lower(), None)
+
+    def discard(self, dev_eui: str) -> None:
+        # 节点删除后其 devEUI 不再解析，之后的上行按未知设备拒绝
+        with self._lock:
+            self._by_eui.pop(dev_eui.lower(), None)
+            self._misses[dev_eui.lower()] = time.monotonic()
+
+    def resolve(self, dev_eui: str) -> Optional[int]:
+        node_id = self._by_eui.get(dev_eui)
+        if node_id is not None:
+            return node_id
+
+        missed_at = self._misses.get(dev_eui)
+        if missed_at is not None and time.monotonic() - missed_at < self.miss_ttl:
+            return None
+
+        db = self.session_factory()
+        try:
+            node = db.query(Node.id).filter(Node.dev_eui.in_([dev_eui, dev_eui.upper()])).first()
+        finally:
+            db.close()
+
+        if node is None:
+            with self._lock:
+                self._misses[dev_eui] = time.monotonic()
+            return None
+        self.put(dev_eui, node.id)
+        return node.id
+
+
+class HistoryWriter:
+    # 缓冲上行样本，按条数或时间阈值批量写入 node_history，每批只提交一次事务
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 batch_size: int = settings.INGEST_BATCH_SIZE,
+                 flush_interval: float = settings.INGEST_FLUSH_INTERVAL,
+                 retry_limit: int = settings.INGEST_RETRY_LIMIT,
+                 retry_delay: float = settings.INGEST_RETRY_DELAY):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_limit = retry_limit
+        self.retry_delay = retry_delay
+        # 连续写入失败的次数，失败后到 _retry_at 之前不再写入
+        self._failures = 0
+        self._retry_at = 0.0
+        self._buffer: List[Dict[str, Any]] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._latencies: List[float] = []
+
+        self.rows_written = 0
+        self.batches_written = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        # 每批数据落库后回调，供实时推送、聚合等下游使用
+        self._listeners.append(listener)
+
+    def add(self, sample: Dict[str, Any]) -> None:
+        sample["received"] = time.monotonic()
+        with self._cond:
+            if not self._buffer:
+                self._oldest = sample["received"]
+            self._buffer.append(sample)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+            self._oldest = None
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        # 写入失败的批次放回缓冲区前面，保持样本顺序
+        with self._cond:
+            self._buffer[:0] = batch
+            oldest = min(s["received"] for s in batch)
+            self._oldest = oldest if self._oldest is None else min(self._oldest, oldest)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+
+            rows = [{"node_id": s["node_id"], "date": s["date"], "param_value": s["param_value"]} for s in batch]
+            db = self.session_factory()
+            try:
+                db.execute(insert(NodeHistory), rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self.errors += 1
+                self._failures += 1
+                self._retry_at = time.monotonic() + self.retry_delay
+                if self._failures <= self.retry_limit:
+                    self._requeue(batch)
+                    print(f"写入 node_history 失败，{self.retry_delay} 秒后重试（第 {self._failures} 次）: {e}")
+                else:
+                    self._failures = 0
+                    self.dropped += len(rows)
+                    print(f"写入 node_history 连续失败 {self.retry_limit + 1} 次，丢弃 {len(rows)} 条: {e}")
+                return 0
+            finally:
+                db.close()
+            self._failures = 0
+
+            # 以批内最早样本计算落库延迟
+            done = time.monotonic()
+            self._latencies.append(done - min(s["received"] for s in batch))
+            if len(self._latencies) > 1024:
+                del self._latencies[:512]
+            self.rows_written += len(rows)
+            self.batches_written += 1
+
+            for listener in self._listeners:
+                try:
+                    listener(batch)
+                except Exception as e:
+                    print(f"上行数据监听器执行失败: {e}")
+            return len(rows)
+
+    def _run(self) -> None:
+        while self._running:
+            with self._cond:
+                now = time.monotonic()
+                if len(self._buffer) < self.batch_size or now < self._retry_at:
+                    timeout = self.flush_interval
+                    if self._oldest is not None:
+                        timeout = max(0.0, self._oldest + self.flush_interval - now)
+                    self._cond.wait(max(timeout, self._retry_at - now))
+            # 写入失败后的重试间隔内不写入
+            if time.monotonic() < self._retry_at:
+                continue
+            self.flush()
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+        return {
+            "rowsWritten": self.rows_written,
+            "batchesWritten": self.batches_written,
+            "pending": self.pending(),
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "latencyP50Ms": pct(0.5),
+            "latencyP99Ms": pct(0.99),
+        }
+
+
+class UplinkConsumer:
+    # 本地 MQTT 替身：按 ChirpStack 主题格式投递原始消息，由后台线程解码入库
+    # 接入真实 MQTT 时，在客户端 on_message 中调用 publish(msg.topic, msg.payload) 即可
+    def __init__(self, index: NodeIndex, writer: HistoryWriter, maxsize: int = settings.INGEST_QUEUE_SIZE):
+        self.index = index
+        self.writer = writer
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self.rejected = 0
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        self._queue.put((topic, payload))
+
+    def handle(self, event: Dict[str, Any]) -> bool:
+        try:
+            sample = decode_uplink(event)
+        except (UplinkDecodeError, ValueError):
+            self.rejected += 1
+            return False
+        node_id = self.index.resolve(sample["dev_eui"])
+        if node_id is None:
+            self.rejected += 1
+            return False
+        sample["node_id"] = node_id
+        sample["station_id"] = self.index.station_for(node_id, sample["port"])
+        self.writer.add(sample)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            topic, payload = item
+            # 主题格式 application/{applicationId}/device/{devEui}/event/{event}
+            if not topic.endswith("/event/up"):
+                continue
+            # 任何异常都只拒绝当前消息，不能让消费线程退出
+            try:
+                self.handle(json.loads(payload))
+            except json.JSONDecodeError:
+                self.rejected += 1
+            except Exception as e:
+                self.rejected += 1
+                print(f"处理上行消息失败: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="uplink-consumer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+node_index = NodeIndex()
+history_writer = HistoryWriter()
+uplink_consumer = UplinkConsumer(node_index, history_writer)
+# 每批落库后先交给实时推送合并，再同步写入列式存储与预聚合，供历史查询使用
+history_writer.add_listener(telemetry.on_batch)
+history_writer.add_listener(lambda batch: ts_store.ingest(batch, history_writer.session_factory))
+history_writer.add_listener(lambda batch: rollups.ingest(batch, history_writer.session_factory))
+# 传感任务阈值规则在数据落库后判断
+history_writer.add_listener(sensor_rules.on_batch)
+
+
+def handle_uplink_events(events: List[Dict[str, Any]]) -> Dict:
+    accepted = sum(1 for event in events if uplink_consumer.handle(event))
+    return {"what": "UPLINK", "code": "0", "number": len(events), "accepted": accepted}
+
+
+def start_ingest(db: Session) -> None:
+    node_index.load(db)
+    sensor_rules.load(db)
+    history_writer.start()
+    uplink_consumer.start()
+
+
+def stop_ingest() -> None:
+    uplink_consumer.stop()
+    history_writer.stop()
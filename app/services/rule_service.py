@@ -0,0 +1,349 @@
+import threading
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Task, TaskHistory, TaskSenseParam
+
+# 传感任务（SENSOR）阈值规则：每批上行数据落库后按节点取出规则逐个判断，
+# 规则按 node_id 建立索引，只判断与样本节点相关的规则；
+# 状态在 NORMAL / HIGH / LOW 之间切换：越过高（低）阈值进入 HIGH（LOW），需回到阈值内回差距离才解除（回差），
+# 目标状态需连续 debounce 个样本保持才生效（去抖），进入 HIGH / LOW 时发出 highAct / lowAct 动作
+# 样本较多的批次使用 NumPy 批量判断：先按各规则当前状态一次算出所有 (样本, 规则) 的目标状态，
+# 只有出现状态变化的规则才按样本顺序逐个处理，结果与逐样本判断一致
+
+NORMAL, HIGH, LOW = 0, 1, -1
+LEVELS = {HIGH: "HIGH", LOW: "LOW"}
+# 批量判断退回逐样本判断后，再次尝试批量判断前间隔的批数
+BATCH_RETRY = 8
+
+
+class SenseRule(NamedTuple):
+    sense_id: int
+    task_id: int
+    node_id: int
+    high_value: float
+    high_act: str
+    low_value: float
+    low_act: str
+    high_exit: float  # 处于 HIGH 时低于该值才解除
+    low_exit: float  # 处于 LOW 时高于该值才解除
+
+
+class Actuation(NamedTuple):
+    task_id: int
+    node_id: int
+    sense_id: int
+    level: str
+    action: str
+    value: float
+    date: datetime
+
+
+def make_rule(param: TaskSenseParam, hysteresis: float) -> SenseRule:
+    deadband = max(0.0, param.high_value - param.low_value) * hysteresis
+    return SenseRule(param.sense_id, int(param.task_id), param.node_id, param.high_value, param.high_act,
+                     param.low_value, param.low_act, param.high_value - deadband, param.low_value + deadband)
+
+
+def target_state(rule: SenseRule, state: int, value: float) -> int:
+    if value >= rule.high_value:
+        return HIGH
+    if value <= rule.low_value:
+        return LOW
+    if state == HIGH and value > rule.high_exit:
+        return HIGH
+    if state == LOW and value < rule.low_exit:
+        return LOW
+    return NORMAL
+
+
+def advance(state: List[int], target: int, debounce: int) -> bool:
+    # state 为 [当前状态, 待切换状态, 已连续的样本数]，target 与当前状态不同；切换生效时返回 True
+    if target == state[1]:
+        state[2] += 1
+    else:
+        state[1], state[2] = target, 1
+    if state[2] < debounce:
+        return False
+    state[0], state[2] = target, 0
+    return True
+
+
+class RuleArrays:
+    # 规则阈值按节点连续存放的数组快照，nodes 升序，第 i 个节点的规则为 rules[starts[i]:starts[i] + counts[i]]
+    def __init__(self, by_node: Dict[int, List[SenseRule]]):
+        self.nodes = np.array(sorted(by_node), dtype=np.int64)
+        self.rules = [rule for node_id in self.nodes.tolist() for rule in by_node[node_id]]
+        self.index = {rule.sense_id: index for index, rule in enumerate(self.rules)}
+        self.counts = np.array([len(by_node[node_id]) for node_id in self.nodes.tolist()], dtype=np.int64)
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.high = np.array([rule.high_value for rule in self.rules], dtype=np.float64)
+        self.low = np.array([rule.low_value for rule in self.rules], dtype=np.float64)
+        self.high_exit = np.array([rule.high_exit for rule in self.rules], dtype=np.float64)
+        self.low_exit = np.array([rule.low_exit for rule in self.rules], dtype=np.float64)
+
+    def pairs(self, node_ids: np.ndarray):
+        # 返回每个 (样本, 规则) 组合的样本下标与规则下标，按样本顺序、同一样本内按规则顺序排列
+        if len(self.nodes) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        pos = np.minimum(np.searchsorted(self.nodes, node_ids), len(self.nodes) - 1)
+        samples = np.flatnonzero(self.nodes[pos] == node_ids)
+        pos = pos[samples]
+        counts = self.counts[pos]
+        pair_samples = np.repeat(samples, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pair_samples, np.repeat(self.starts[pos], counts) + offsets
+
+    def targets(self, rule_index: np.ndarray, states: np.ndarray, values: np.ndarray) -> np.ndarray:
+        # target_state 的向量化版本
+        high, low = self.high[rule_index], self.low[rule_index]
+        keep_high = (states == HIGH) & (values > self.high_exit[rule_index])
+        keep_low = (states == LOW) & (values < self.low_exit[rule_index])
+        return np.select([values >= high, values <= low, keep_high, keep_low], [HIGH, LOW, HIGH, LOW], NORMAL)
+
+
+def record_actuations(session_factory: Callable[[], Session], actuations: List[Actuation]) -> None:
+    # 默认处理：一批样本触发的动作一次写入 task_histories
+    db = session_factory()
+    try:
+        db.execute(insert(TaskHistory), [{
+            "task_id": str(act.task_id),
+            "action": act.action,
+            "run_mode": "AUTO",
+            "executed_at": act.date,
+            "status": "TRIGGERED",
+            "memo": f"{act.level} 节点 {act.node_id} 数值 {act.value}",
+        } for act in actuations])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"写入传感任务执行记录失败: {e}")
+    finally:
+        db.close()
+
+
+class SensorRuleEngine:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 hysteresis: float = settings.SENSOR_RULE_HYSTERESIS,
+                 debounce: int = settings.SENSOR_RULE_DEBOUNCE,
+                 handler: Optional[Callable[[List[Actuation]], None]] = None,
+                 batch_min: int = settings.SENSOR_RULE_BATCH_MIN):
+        self.session_factory = session_factory
+        self.hysteresis = hysteresis
+        self.debounce = max(1, debounce)
+        self.handler = handler or (lambda actuations: record_actuations(self.session_factory, actuations))
+        self._by_node: Dict[int, List[SenseRule]] = {}
+        self._by_task: Dict[int, List[SenseRule]] = {}
+        # sense_id -> [当前状态, 待切换状态, 已连续的样本数]，只保存不处于 NORMAL 或有待切换状态的规则
+        self._state: Dict[int, List[int]] = {}
+        self._arrays: Optional[RuleArrays] = None
+        self.batch_min = batch_min
+        self._skip_batches = 0
+        self._listeners: List[Callable[[List[Actuation]], None]] = []
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.evaluations = 0
+        self.actuations = 0
+
+    def add_listener(self, listener: Callable[[List[Actuation]], None]) -> None:
+        # 动作发出后回调，供下发执行使用
+        self._listeners.append(listener)
+
+    def _query(self, db: Session):
+        return (db.query(TaskSenseParam)
+                .join(Task, Task.task_id == TaskSenseParam.task_id)
+                .filter(Task.task_type == "SENSOR", TaskSenseParam.node_id.is_not(None)))
+
+    def load(self, db: Session) -> int:
+        return self.set_rules([make_rule(param, self.hysteresis) for param in self._query(db)])
+
+    def set_rules(self, rules: List[SenseRule]) -> int:
+        by_node: Dict[int, List[SenseRule]] = {}
+        by_task: Dict[int, List[SenseRule]] = {}
+        for rule in rules:
+            by_node.setdefault(rule.node_id, []).append(rule)
+            by_task.setdefault(rule.task_id, []).append(rule)
+        with self._lock:
+            self._by_node, self._by_task = by_node, by_task
+            self._arrays = None
+            # 重新加载时保留仍存在的规则的状态；写入线程可能同时在增加状态，先整体复制再筛选
+            sense_ids = {rule.sense_id for rule in rules}
+            self._state = {sense_id: state for sense_id, state in list(self._state.items()) if sense_id in sense_ids}
+        return len(rules)
+
+    def remove(self, task_id: int) -> None:
+        # 受影响节点的规则列表整体替换，判断线程读取到的列表不会在遍历中被修改
+        with self._lock:
+            self._arrays = None
+            for rule in self._by_task.pop(task_id, []):
+                remaining = [other for other in self._by_node.get(rule.node_id, []) if other.task_id != task_id]
+                if remaining:
+                    self._by_node[rule.node_id] = remaining
+                else:
+                    self._by_node.pop(rule.node_id, None)
+                self._state.pop(rule.sense_id, None)
+
+    def reindex(self, db: Session, task_id: int) -> None:
+        # 任务新增/修改/删除后重新读取该任务的传感参数
+        rules = [make_rule(param, self.hysteresis)
+                 for param in self._query(db).filter(TaskSenseParam.task_id == str(task_id))]
+        self.remove(task_id)
+        if not rules:
+            return
+        with self._lock:
+            self._arrays = None
+            self._by_task[task_id] = rules
+            for rule in rules:
+                self._by_node[rule.node_id] = self._by_node.get(rule.node_id, []) + [rule]
+
+    def rules_for(self, node_id: int) -> List[SenseRule]:
+        return self._by_node.get(node_id, [])
+
+    def arrays(self) -> RuleArrays:
+        # 规则变化后在下一次批量判断时重建
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = RuleArrays(self._by_node)
+            return self._arrays
+
+    def process(self, samples: List[Dict[str, Any]]) -> List[Actuation]:
+        actuations = []
+        by_node, states, debounce = self._by_node, self._state, self.debounce
+        evaluations = 0
+        for sample in samples:
+            rules = by_node.get(sample["node_id"])
+            if not rules:
+                continue
+            value = sample["param_value"]
+            for rule in rules:
+                evaluations += 1
+                state = states.get(rule.sense_id)
+                if state is None:
+                    if target_state(rule, NORMAL, value) == NORMAL:
+                        continue
+                    state = states[rule.sense_id] = [NORMAL, NORMAL, 0]
+                target = target_state(rule, state[0], value)
+                if target == state[0]:
+                    self._settle(rule.sense_id, state)
+                    continue
+                if advance(state, target, debounce) and target != NORMAL:
+                    actuations.append(self._actuation(rule, target, value, sample["date"]))
+        self.samples += len(samples)
+        self.evaluations += evaluations
+        self.actuations += len(actuations)
+        return actuations
+
+    def _settle(self, sense_id: int, state: List[int]) -> None:
+        # 保持当前状态：清零去抖计数，回到 NORMAL 的规则不再保存状态
+        if state[0] == NORMAL:
+            self._state.pop(sense_id, None)
+        else:
+            state[2] = 0
+
+    def _actuation(self, rule: SenseRule, target: int, value: float, date: datetime) -> Actuation:
+        action = rule.high_act if target == HIGH else rule.low_act
+        return Actuation(rule.task_id, rule.node_id, rule.sense_id, LEVELS[target], action, value, date)
+
+    def process_batch(self, samples: List[Dict[str, Any]]) -> List[Actuation]:
+        # 与 process 结果相同的批量判断
+        arrays = self.arrays()
+        count = len(samples)
+        node_ids = np.fromiter(map(itemgetter("node_id"), samples), dtype=np.int64, count=count)
+        values = np.fromiter(map(itemgetter("param_value"), samples), dtype=np.float64, count=count)
+        pair_samples, pair_rules = arrays.pairs(node_ids)
+        if len(pair_rules) == 0:
+            self.samples += count
+            return []
+
+        # 按各规则当前状态算出每个组合的目标状态；只保存了非 NORMAL 的状态，不必逐个查询本批涉及的规则。
+        # remove 会在请求线程中删除状态，遍历前在锁内取快照
+        states, rules = self._state, arrays.rules
+        with self._lock:
+            snapshot = list(states.items())
+        current = np.zeros(len(rules), dtype=np.int8)
+        pending = []
+        for sense_id, state in snapshot:
+            index = arrays.index.get(sense_id)
+            if index is not None:
+                current[index] = state[0]
+                if state[2]:
+                    pending.append((index, state))
+        pair_values = values[pair_samples]
+        pair_current = current[pair_rules]
+        changed = arrays.targets(pair_rules, pair_current, pair_values) != pair_current
+
+        changing = np.zeros(len(rules), dtype=bool)
+        changing[pair_rules[changed]] = True
+        selected = np.flatnonzero(changing[pair_rules])
+        # 大部分规则都在切换状态（数值频繁越过阈值）时批量判断没有收益，改为逐样本判断，
+        # 并在之后的 BATCH_RETRY 批直接逐样本判断
+        if len(selected) * 2 > len(pair_rules):
+            self._skip_batches = BATCH_RETRY
+            return self.process(samples)
+        self.samples += count
+        self.evaluations += len(pair_rules)
+
+        # 本批内状态不变的规则只需清零去抖计数
+        touched = np.zeros(len(rules), dtype=bool)
+        touched[pair_rules] = True
+        for index, state in pending:
+            if touched[index] and not changing[index]:
+                self._settle(rules[index].sense_id, state)
+
+        # 其余规则按样本顺序逐个处理
+        selected = selected[np.argsort(pair_rules[selected], kind="stable")]
+        emitted = []
+        debounce = self.debounce
+        for pair, index, value in zip(selected.tolist(), pair_rules[selected].tolist(),
+                                      pair_values[selected].tolist()):
+            rule = rules[index]
+            state = states.get(rule.sense_id)
+            if state is None:
+                if target_state(rule, NORMAL, value) == NORMAL:
+                    continue
+                state = states[rule.sense_id] = [NORMAL, NORMAL, 0]
+            target = target_state(rule, state[0], value)
+            if target == state[0]:
+                self._settle(rule.sense_id, state)
+                continue
+            if advance(state, target, debounce) and target != NORMAL:
+                emitted.append((pair, self._actuation(rule, target, value, samples[pair_samples[pair]]["date"])))
+        emitted.sort(key=lambda item: item[0])
+        self.actuations += len(emitted)
+        return [actuation for _, actuation in emitted]
+
+    def on_batch(self, batch: List[Dict[str, Any]]) -> None:
+        # 在写入线程中调用：判断规则，发出的动作批量记录并交给监听者
+        if len(batch) >= self.batch_min and self._skip_batches == 0:
+            actuations = self.process_batch(batch)
+        else:
+            self._skip_batches = max(0, self._skip_batches - 1)
+            actuations = self.process(batch)
+        if not actuations:
+            return
+        self.handler(actuations)
+        for listener in self._listeners:
+            try:
+                listener(actuations)
+            except Exception as e:
+                print(f"传感动作监听器执行失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rules": sum(len(rules) for rules in self._by_task.values()),
+            "nodes": len(self._by_node),
+            "samples": self.samples,
+            "evaluations": self.evaluations,
+            "actuations": self.actuations,
+        }
+
+
+sensor_rules = SensorRuleEngine()
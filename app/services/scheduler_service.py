@@ -0,0 +1,397 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud import chunked
+from app.db import SessionLocal
+from app.models import Task, TaskHistory, TaskStartTime
+from app.schedule import SCHEDULED_TYPES, TaskSchedule, compile_task
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能通过 SCHEDULER_MODE 指定运行调度的进程
+    fcntl = None
+
+# 定时/循环任务调度：所有任务按下一次触发时间放入带位置索引的小顶堆，
+# 调度线程只等待堆顶到期，不轮询数据库；任务增删改时单独重建该任务的条目，插入与取消均为 O(log n)
+
+
+class Fire(NamedTuple):
+    task_id: int
+    when: datetime
+    schedule: TaskSchedule
+
+
+class IndexedHeap:
+    # 小顶堆，元素为 (时间, 键)，额外维护 键 -> 下标，支持按键更新与删除
+    def __init__(self):
+        self._items: List[Tuple[float, int]] = []
+        self._pos: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._pos
+
+    def peek(self) -> Optional[Tuple[float, int]]:
+        return self._items[0] if self._items else None
+
+    def push(self, when: float, key: int) -> None:
+        if key in self._pos:
+            index = self._pos[key]
+            old = self._items[index][0]
+            self._items[index] = (when, key)
+            if when < old:
+                self._up(index)
+            else:
+                self._down(index)
+            return
+        self._items.append((when, key))
+        self._pos[key] = len(self._items) - 1
+        self._up(len(self._items) - 1)
+
+    def remove(self, key: int) -> bool:
+        index = self._pos.pop(key, None)
+        if index is None:
+            return False
+        last = self._items.pop()
+        if index < len(self._items):
+            self._items[index] = last
+            self._pos[last[1]] = index
+            self._down(index)
+            self._up(index)
+        return True
+
+    def pop(self) -> Tuple[float, int]:
+        top = self._items[0]
+        self.remove(top[1])
+        return top
+
+    def heapify(self, items: List[Tuple[float, int]]) -> None:
+        self._items = list(items)
+        for index in reversed(range(len(self._items) // 2)):
+            self._down(index, rebuild=True)
+        self._pos = {key: index for index, (_, key) in enumerate(self._items)}
+
+    def _swap(self, i: int, j: int) -> None:
+        items = self._items
+        items[i], items[j] = items[j], items[i]
+        self._pos[items[i][1]] = i
+        self._pos[items[j][1]] = j
+
+    def _up(self, index: int) -> None:
+        items = self._items
+        while index > 0:
+            parent = (index - 1) // 2
+            if items[index] >= items[parent]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _down(self, index: int, rebuild: bool = False) -> None:
+        items = self._items
+        size = len(items)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and items[child] < items[smallest]:
+                    smallest = child
+            if smallest == index:
+                return
+            if rebuild:
+                # 建堆时下标映射最后统一生成
+                items[index], items[smallest] = items[smallest], items[index]
+            else:
+                self._swap(index, smallest)
+            index = smallest
+
+
+def record_fires(session_factory: Callable[[], Session], fires: List[Fire]) -> None:
+    # 默认处理：同一时刻到期的任务批量写入 task_histories
+    db = session_factory()
+    try:
+        db.execute(insert(TaskHistory), [{
+            "task_id": str(fire.task_id),
+            "action": fire.schedule.action or "",
+            "run_mode": "AUTO",
+            "executed_at": fire.when,
+            "status": "FIRED",
+        } for fire in fires])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"写入任务执行记录失败: {e}")
+    finally:
+        db.close()
+
+
+def compile_tasks(db: Session, task_ids: List[int]) -> Dict[int, Optional[TaskSchedule]]:
+    compiled = {}
+    for chunk in chunked(task_ids):
+        tasks = db.query(Task).filter(Task.task_id.in_(chunk)).all()
+        begins: Dict[str, List] = {}
+        for task_id, begin_time in db.query(TaskStartTime.task_id, TaskStartTime.begin_time).filter(
+                TaskStartTime.task_id.in_([str(task_id) for task_id in chunk])):
+            begins.setdefault(str(task_id), []).append(begin_time)
+        for task in tasks:
+            compiled[task.task_id] = compile_task(task, begins.get(str(task.task_id), []))
+    return compiled
+
+
+class TaskScheduler:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 handler: Optional[Callable[[List[Fire]], None]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.session_factory = session_factory
+        self.handler = handler or (lambda fires: record_fires(self.session_factory, fires))
+        self.clock = clock
+        self._heap = IndexedHeap()
+        self._schedules: Dict[int, TaskSchedule] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._listeners: List[Callable[[List[Fire]], None]] = []
+        self.fired = 0
+        self.max_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add_listener(self, listener: Callable[[List[Fire]], None]) -> None:
+        # 触发记录写入后回调，供下发执行使用
+        self._listeners.append(listener)
+
+    def _next(self, schedule: TaskSchedule, after: float) -> Optional[float]:
+        when = schedule.next_fire(datetime.fromtimestamp(after))
+        return when.timestamp() if when is not None else None
+
+    def load(self, db: Session) -> int:
+        # 启动时一次性加载所有定时/循环任务及其开始时间
+        tasks = db.query(Task).filter(Task.task_type.in_(SCHEDULED_TYPES)).all()
+        begins: Dict[str, List] = {}
+        for task_id, begin_time in db.query(TaskStartTime.task_id, TaskStartTime.begin_time):
+            begins.setdefault(str(task_id), []).append(begin_time)
+        now = self.clock()
+        schedules, items = {}, []
+        for task in tasks:
+            schedule = compile_task(task, begins.get(str(task.task_id), []))
+            when = self._next(schedule, now)
+            schedules[task.task_id] = schedule
+            if when is not None:
+                items.append((when, task.task_id))
+        with self._cond:
+            self._schedules = schedules
+            self._heap.heapify(items)
+            self._cond.notify()
+        return len(items)
+
+    def upsert(self, schedule: Optional[TaskSchedule], task_id: Optional[int] = None) -> None:
+        # schedule 为 None（任务不再是定时/循环任务）时等同于取消
+        if schedule is None:
+            self.cancel(task_id)
+            return
+        when = self._next(schedule, self.clock())
+        with self._cond:
+            self._schedules[schedule.task_id] = schedule
+            if when is None:
+                self._heap.remove(schedule.task_id)
+            else:
+                self._heap.push(when, schedule.task_id)
+            self._cond.notify()
+
+    def cancel(self, task_id: int) -> bool:
+        with self._cond:
+            self._schedules.pop(task_id, None)
+            removed = self._heap.remove(task_id)
+            self._cond.notify()
+        return removed
+
+    def reindex(self, db: Session, task_id: int) -> None:
+        # 任务新增/修改/删除后重新读取该任务
+        task = db.query(Task).filter(Task.task_id == task_id).first()
+        if task is None:
+            self.cancel(task_id)
+            return
+        begins = [row.begin_time for row in
+                  db.query(TaskStartTime.begin_time).filter(TaskStartTime.task_id == str(task_id))]
+        self.upsert(compile_task(task, begins), task_id)
+
+    def schedules(self, db: Session, task_ids: List[int]) -> Dict[int, Optional[TaskSchedule]]:
+        # 已编译的任务直接取缓存（reindex/cancel 时更新），其余一次性查询编译后放入缓存；非定时/循环任务为 None
+        with self._cond:
+            found = {task_id: self._schedules[task_id] for task_id in task_ids if task_id in self._schedules}
+        missing = [task_id for task_id in task_ids if task_id not in found]
+        if missing:
+            compiled = compile_tasks(db, missing)
+            with self._cond:
+                for task_id, schedule in compiled.items():
+                    self._schedules.setdefault(task_id, schedule)
+            found.update(compiled)
+        return found
+
+    def next_fire_time(self, task_id: int) -> Optional[datetime]:
+        with self._cond:
+            if task_id not in self._heap:
+                return None
+            index = self._heap._pos[task_id]
+            return datetime.fromtimestamp(self._heap._items[index][0])
+
+    def tick(self, now: Optional[float] = None) -> List[Fire]:
+        # 取出所有到期的任务并排入下一次触发，返回本次触发列表
+        now = self.clock() if now is None else now
+        fires = []
+        with self._cond:
+            while self._heap and self._heap.peek()[0] <= now:
+                when, task_id = self._heap.pop()
+                schedule = self._schedules.get(task_id)
+                if schedule is None:
+                    continue
+                self.max_lag = max(self.max_lag, now - when)
+                fires.append(Fire(task_id, datetime.fromtimestamp(when), schedule))
+                following = self._next(schedule, max(when, now))
+                if following is not None:
+                    self._heap.push(following, task_id)
+        if fires:
+            self.fired += len(fires)
+            try:
+                self.handler(fires)
+            except Exception as e:
+                print(f"任务触发处理失败: {e}")
+            for listener in self._listeners:
+                try:
+                    listener(fires)
+                except Exception as e:
+                    print(f"任务触发监听器执行失败: {e}")
+        return fires
+
+    def _run(self) -> None:
+        while self._running:
+            with self._cond:
+                top = self._heap.peek()
+                timeout = None if top is None else top[0] - self.clock()
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+            self.tick()
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="task-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        return {"scheduled": len(self._heap), "fired": self.fired, "maxLagMs": round(self.max_lag * 1000, 2)}
+
+
+class SchedulerLease:
+    # 同机的多个 worker 通过文件锁选出唯一运行调度线程的进程；进程退出时锁由操作系统释放
+    def __init__(self, path: str = settings.SCHEDULER_LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        if self._file is not None or fcntl is None:
+            return True
+        handle = open(self.path, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class SchedulerElection:
+    # 多 worker 时只有一个进程运行调度线程，否则每个任务会被每个 worker 各触发一次；
+    # 其他 worker 仍维护已编译的任务（供预览），并定期重试加锁，持锁进程退出后由其中一个接管
+    def __init__(self, scheduler: TaskScheduler, lease: SchedulerLease,
+                 session_factory: Callable[[], Session] = SessionLocal,
+                 mode: str = settings.SCHEDULER_MODE,
+                 interval: float = settings.SCHEDULER_ELECTION_INTERVAL):
+        self.scheduler = scheduler
+        self.lease = lease
+        self.session_factory = session_factory
+        self.mode = (mode or "auto").lower()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def try_lead(self, reload: bool = True) -> bool:
+        if self.scheduler.running:
+            return True
+        if self.mode == "off" or (self.mode != "on" and not self.lease.acquire()):
+            return False
+        if reload:
+            # 接管时重新加载，只排入之后的触发，不补发原进程已经触发过的
+            db = self.session_factory()
+            try:
+                self.scheduler.load(db)
+            finally:
+                db.close()
+        self.scheduler.start()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if self.try_lead():
+                    return
+            except Exception as e:
+                print(f"接管任务调度失败: {e}")
+
+    def start(self) -> None:
+        # 调用前已加载任务，首次加锁成功时直接启动
+        self._stop.clear()
+        if self.try_lead(reload=False) or self.mode != "auto":
+            return
+        self._thread = threading.Thread(target=self._run, name="scheduler-election", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.scheduler.stop()
+        self.lease.release()
+
+
+task_scheduler = TaskScheduler()
+scheduler_election = SchedulerElection(task_scheduler, SchedulerLease())
+
+
+def start_scheduler(db: Session) -> None:
+    # 所有 worker 都加载任务（预览与增删改时的索引），调度线程只在选出的进程中运行
+    task_scheduler.load(db)
+    scheduler_election.start()
+
+
+def stop_scheduler() -> None:
+    scheduler_election.stop()
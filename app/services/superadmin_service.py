@@ -1,6 +1,7 @@
 import os
 import hashlib
 from sqlalchemy.orm import Session
+from typing import Optional
 from app import crud
 from app.utils import send_sms_verification, verify_sms_code
 from app.schemas import SystemCreate, SystemUpdate
@@ -49,5 +50,5 @@ def validate_superadmin(db: Session, super_id: str) -> bool:
     superadmin = crud.get_superadmin_by_id(db, super_id)
     return superadmin is not None
 
-def list_managed_systems_service(db: Session, first: int = 0, number: int = 0):
-    return crud.list_systems(db, first, number)
+def list_managed_systems_service(db: Session, first: int = 0, number: int = 0, after: Optional[str] = None):
+    return crud.list_systems(db, first, number, after)
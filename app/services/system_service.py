@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.crud import (
     get_admin_by_credentials,
     get_system_by_name,
@@ -31,5 +32,5 @@ def modify_existing_system(db: Session, systemID: str, system_data: SystemUpdate
 def change_system_status_service(db: Session, systemID: str, status: bool):
     return change_system_status(db, systemID, status)
 
-def list_managed_systems_service(db: Session, first: int = 0, number: int = 10):
-    return list_systems(db, first, number)
+def list_managed_systems_service(db: Session, first: int = 0, number: int = 10, after: Optional[str] = None):
+    return list_systems(db, first, number, after)
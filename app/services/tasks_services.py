@@ -5,20 +5,54 @@ from app.schemas import (TaskCreate, TaskUpdate, TaskDelete, TaskQuery,
                          TaskRunModeRequest, TaskRunModeResponse, 
                          TaskHistoryRequest, TaskHistoryResponse,
                          SystemTaskRunModeRequest, SystemTaskRunModeResponse,
-                         ErrorResponse, TaskRunMode)
+                         ErrorResponse, TaskRunMode,
+                         TaskPreviewRequest, TaskPreviewResponse, TaskPreviewItem)
 from app.models import Task,TaskHistory
+from app.crud import chunked
+from app.schedule import MAX_LOOKAHEAD_DAYS, SCHEDULED_TYPES, format_slot
+from app.services.scheduler_service import task_scheduler
+from app.services.rule_service import sensor_rules
+from app.realtime import manager
+from app.db import SessionLocal
+from datetime import datetime, timedelta
+
+# 任务增删改后只重建调度器与传感规则索引中该任务的条目，并通知其他 worker 重建各自的索引
+def reindex_task(db: Session, task_id: int) -> None:
+    task_scheduler.reindex(db, task_id)
+    sensor_rules.reindex(db, task_id)
+
+def _on_task_changed(message: str) -> None:
+    db = SessionLocal()
+    try:
+        reindex_task(db, int(message))
+    finally:
+        db.close()
+
+manager.on_control("task", _on_task_changed)
 
 def add_task(db: Session, task_data: TaskCreate):
     task_dict = task_data.dict()
-    return create_task(db, task_dict)
+    task = create_task(db, task_dict)
+    reindex_task(db, task.task_id)
+    manager.publish_control("task", str(task.task_id))
+    return task
 
 def modify_task(db: Session, task_data: TaskUpdate):
     task_dict = task_data.dict()
     task_id = task_dict.pop('taskID')
-    return update_task(db, task_id, task_dict)
+    task = update_task(db, task_id, task_dict)
+    if task:
+        reindex_task(db, task.task_id)
+        manager.publish_control("task", str(task.task_id))
+    return task
 
 def remove_task(db: Session, task_data: TaskDelete):
-    return delete_task(db, task_data.taskID)
+    task = delete_task(db, task_data.taskID)
+    if task:
+        task_scheduler.cancel(task.task_id)
+        sensor_rules.remove(task.task_id)
+        manager.publish_control("task", str(task.task_id))
+    return task
 
 def query_task(db: Session, task_data: TaskQuery):
     if task_data.taskID:
@@ -28,6 +62,34 @@ def query_task(db: Session, task_data: TaskQuery):
     else:
         return get_tasks(db, task_data.systemID)
 
+def preview_tasks(db: Session, request: TaskPreviewRequest):
+    # 使用调度器缓存的任务规则计算每个任务在时间范围内的前 number 次触发时间
+    try:
+        begin = datetime.fromisoformat(request.beginTime) if request.beginTime else datetime.now()
+        end = datetime.fromisoformat(request.endTime) if request.endTime else None
+        requested = [int(task_id) for task_id in request.taskID or []]
+    except ValueError as e:
+        return TaskPreviewResponse(code="3", errNo="400", errMsg=f"参数格式错误: {str(e)}")
+    # 结束时间最多取到开始后 MAX_LOOKAHEAD_DAYS 天，与未指定结束时间时的查找范围一致
+    if end is not None:
+        end = min(end, begin + timedelta(days=MAX_LOOKAHEAD_DAYS))
+    query = db.query(Task.task_id).filter(Task.system_id == request.systemID, Task.task_type.in_(SCHEDULED_TYPES))
+    if requested:
+        task_ids = []
+        for chunk in chunked(requested):
+            task_ids.extend(task_id for (task_id,) in query.filter(Task.task_id.in_(chunk)))
+    else:
+        task_ids = [task_id for (task_id,) in query]
+    schedules = task_scheduler.schedules(db, task_ids)
+    items = []
+    for task_id in sorted(task_ids):
+        schedule = schedules.get(task_id)
+        if schedule is None:
+            continue
+        fire_times = [format_slot(day, offset) for day, offset in schedule.slots(begin, end, request.number)]
+        items.append(TaskPreviewItem(taskID=str(task_id), fireTime=fire_times))
+    return TaskPreviewResponse(code="0", number=len(items), tasks=items)
+
 def set_task_run_mode(db: Session, request: TaskRunModeRequest):
     try:
         # 1. 验证请求中的 taskID 是否存在
@@ -117,7 +179,8 @@ def query_task_history(db: Session, request: TaskHistoryRequest):
 def query_all_task_run_modes(db: Session, request: SystemTaskRunModeRequest):
     try:
         # 从 CRUD 层获取任务列表
-        tasks = get_all_task_run_modes(db, request.systemID, request.first, request.number)
+        page = get_all_task_run_modes(db, request.systemID, request.first, request.number, request.after)
+        tasks = page.rows
         
         if not tasks:
             return SystemTaskRunModeResponse(
@@ -125,6 +188,7 @@ def query_all_task_run_modes(db: Session, request: SystemTaskRunModeRequest):
                 code="0",
                 first=request.first,
                 number=0,
+                total=page.total,
                 tasks=[]
             )
         
@@ -135,7 +199,9 @@ def query_all_task_run_modes(db: Session, request: SystemTaskRunModeRequest):
             code="0",
             first=request.first,
             number=len(task_list),
-            tasks=task_list
+            total=page.total,
+            tasks=task_list,
+            next=page.next
         )
     except Exception as e:
         return ErrorResponse(
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.crud import chunked
+from app.models import Node, Substation
+from app.realtime import ConnectionManager, manager
+from app.tsdb import to_ms
+
+# 实时数据推送：接入层每批写库后，把样本按设备合并，在推送窗口内同一设备只推送最新值，
+# 节点状态变化同样经窗口推送；推送主题为 node:<devEUI>、system:<systemID>、area:<areaID>
+
+# 推送帧使用短字段名：e=devEUI, n=nodeID, t=毫秒时间戳, v=数值, s=分站ID, c=窗口内合并的样本数
+DATA_FRAME = "NODE_DATA"
+STATUS_FRAME = "NODE_STATUS"
+
+
+class TelemetryPublisher:
+    def __init__(self, hub: ConnectionManager = manager,
+                 session_factory: Callable[[], Session] = SessionLocal,
+                 window: float = settings.WS_COALESCE_WINDOW, miss_ttl: float = 60.0):
+        self.hub = hub
+        self.session_factory = session_factory
+        self.window = window
+        self.miss_ttl = miss_ttl
+        # node_id -> system_id、station_id -> area_id：写入线程按需查库补齐，
+        # 节点/分站增删改后由设备服务更新，不存在的 id 缓存 miss_ttl 秒避免每批重复查询
+        self._systems: Dict[int, str] = {}
+        self._areas: Dict[int, str] = {}
+        self._node_misses: Dict[int, float] = {}
+        self._station_misses: Dict[int, float] = {}
+        # 路由每次被修改都加一，查库期间路由被修改时丢弃查询结果，避免写回已删除或已修改的旧路由
+        self._routes_version = 0
+        self._routes_lock = threading.Lock()
+        # 待推送的最新数据，写入线程与事件循环之间用锁交换
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.samples_coalesced = 0
+
+    def put_node(self, node_id: int, system_id: str) -> None:
+        with self._routes_lock:
+            self._routes_version += 1
+            self._systems[node_id] = system_id
+            self._node_misses.pop(node_id, None)
+
+    def discard_node(self, node_id: int) -> None:
+        # 节点删除后 id 可能被新节点复用，旧系统的订阅者不能再收到该 id 的数据
+        with self._routes_lock:
+            self._routes_version += 1
+            self._systems.pop(node_id, None)
+            self._node_misses.pop(node_id, None)
+
+    def put_station(self, station_id: int, area_id: Optional[str]) -> None:
+        with self._routes_lock:
+            self._routes_version += 1
+            self._station_misses.pop(station_id, None)
+            if area_id is None:
+                self._areas.pop(station_id, None)
+            else:
+                self._areas[station_id] = area_id
+
+    def discard_station(self, station_id: int) -> None:
+        with self._routes_lock:
+            self._routes_version += 1
+            self._areas.pop(station_id, None)
+            self._station_misses.pop(station_id, None)
+
+    def refresh_stations(self, db: Session, station_ids: List[int]) -> None:
+        # 分站新增/修改后按主键重新读取所属区域，已不存在的分站移除
+        found = {}
+        for chunk in chunked(list(station_ids)):
+            found.update(db.query(Substation.id, Substation.area_id).filter(Substation.id.in_(chunk)).all())
+        for station_id in station_ids:
+            if station_id in found:
+                self.put_station(station_id, found[station_id])
+            else:
+                self.discard_station(station_id)
+
+    def _missing(self, ids, routes: Dict[int, str], misses: Dict[int, float], now: float) -> set:
+        return {i for i in ids if i is not None and i not in routes
+                and not (i in misses and now - misses[i] < self.miss_ttl)}
+
+    def _resolve_routes(self, batch: List[Dict[str, Any]]) -> None:
+        now = time.monotonic()
+        missing_nodes = self._missing({s["node_id"] for s in batch}, self._systems, self._node_misses, now)
+        missing_stations = self._missing({s.get("station_id") for s in batch}, self._areas,
+                                         self._station_misses, now)
+        if not missing_nodes and not missing_stations:
+            return
+        version = self._routes_version
+        db = self.session_factory()
+        try:
+            systems = dict(db.query(Node.id, Node.system_id).filter(Node.id.in_(missing_nodes)).all()) \
+                if missing_nodes else {}
+            areas = dict(db.query(Substation.id, Substation.area_id)
+                         .filter(Substation.id.in_(missing_stations)).all()) if missing_stations else {}
+        finally:
+            db.close()
+        with self._routes_lock:
+            if version != self._routes_version:
+                return
+            self._systems.update(systems)
+            self._areas.update((station_id, area_id) for station_id, area_id in areas.items() if area_id is not None)
+            self._node_misses.update((node_id, now) for node_id in missing_nodes - systems.keys())
+            self._station_misses.update((station_id, now) for station_id in missing_stations
+                                        if areas.get(station_id) is None)
+
+    def on_batch(self, batch: List[Dict[str, Any]]) -> None:
+        # 在写入线程中调用：只做合并，不触碰 WebSocket
+        if not batch:
+            return
+        try:
+            self._resolve_routes(batch)
+        except Exception as e:
+            print(f"加载推送路由失败: {e}")
+
+        with self._lock:
+            for sample in batch:
+                dev_eui = sample["dev_eui"]
+                current = self._latest.get(dev_eui)
+                ts = to_ms(sample["date"])
+                if current is not None:
+                    current["c"] += 1
+                    self.samples_coalesced += 1
+                    if ts < current["t"]:
+                        continue
+                else:
+                    current = self._latest[dev_eui] = {"c": 1}
+                current.update({
+                    "e": dev_eui,
+                    "n": sample["node_id"],
+                    "t": ts,
+                    "v": sample["param_value"],
+                    "s": sample.get("station_id"),
+                })
+
+    def publish_status(self, dev_eui: str, node_id: Any, system_id: Optional[str], status: str) -> None:
+        # 可在任意线程调用（同步接口运行在线程池中）
+        dev_eui = dev_eui.lower()
+        with self._lock:
+            self._status[dev_eui] = {"e": dev_eui, "n": node_id, "sys": system_id, "st": status}
+
+    def _topics(self, frame: Dict[str, Any], system_id: Optional[str]) -> List[str]:
+        topics = [f"node:{frame['e']}"]
+        if system_id is not None:
+            topics.append(f"system:{system_id}")
+        area_id = self._areas.get(frame.get("s"))
+        if area_id is not None:
+            topics.append(f"area:{area_id}")
+        return topics
+
+    def _send(self, what: str, frame: Dict[str, Any], system_id: Optional[str]) -> None:
+        topics = [t for t in self._topics(frame, system_id) if self.hub.has_subscribers(t)]
+        if not topics:
+            return
+        # 同一帧只编码一次；合并键保证慢连接队列里同一设备只保留最新一帧
+        message = json.dumps({"what": what, **frame}, separators=(",", ":"))
+        key = f"{what}:{frame['e']}"
+        for topic in topics:
+            self.frames_sent += self.hub.publish(topic, message, key)
+
+    def flush(self) -> int:
+        # 在事件循环中调用，返回本窗口推送的设备数
+        with self._lock:
+            latest, self._latest = self._latest, {}
+            status, self._status = self._status, {}
+        for frame in latest.values():
+            self._send(DATA_FRAME, frame, self._systems.get(frame["n"]))
+        for frame in status.values():
+            self._send(STATUS_FRAME, frame, frame.pop("sys"))
+        return len(latest) + len(status)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"实时数据推送失败: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"framesSent": self.frames_sent, "samplesCoalesced": self.samples_coalesced}
+
+
+telemetry = TelemetryPublisher()
@@ -0,0 +1,280 @@
+import threading
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import HistoryChunk, HistoryData, NodeHistory
+
+# 节点/分站历史数据的列式存储：每个序列按时间分区、分块保存，
+# 时间戳（int64 毫秒，差分编码）与数值（float32，字节重排）分别压缩后存入 history_chunks
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def node_series(node_id: Any) -> str:
+    return f"node:{node_id}"
+
+
+def station_series(station_id: Any) -> str:
+    return f"station:{station_id}"
+
+
+def to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def from_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000)
+
+
+def encode_chunk(timestamps: np.ndarray, values: np.ndarray) -> Tuple[bytes, bytes]:
+    deltas = np.diff(timestamps.astype(np.int64), prepend=np.int64(0))
+    # float32 按字节位重排后相邻字节更相似，压缩率明显更高
+    shuffled = values.astype(np.float32).view(np.uint8).reshape(-1, 4).T.copy()
+    return zlib.compress(deltas.tobytes(), 1), zlib.compress(shuffled.tobytes(), 1)
+
+
+def decode_chunk(ts_blob: bytes, value_blob: bytes) -> Series:
+    timestamps = np.cumsum(np.frombuffer(zlib.decompress(ts_blob), dtype=np.int64))
+    shuffled = np.frombuffer(zlib.decompress(value_blob), dtype=np.uint8)
+    values = shuffled.reshape(4, -1).T.copy().view(np.float32).ravel()
+    return timestamps, values
+
+
+def empty_series() -> Series:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+class _Head:
+    # 分区内尚未写满的块，保存在内存中，每次 flush 覆盖写入对应的 chunk 行
+    __slots__ = ("timestamps", "values", "chunk_id", "dirty")
+
+    def __init__(self):
+        self.timestamps: List[np.ndarray] = []
+        self.values: List[np.ndarray] = []
+        self.chunk_id: Optional[int] = None
+        self.dirty = False
+
+    def arrays(self, parts: int) -> Series:
+        # 只合并前 parts 段（flush 开始时已有的数据），不修改块本身
+        timestamps = np.concatenate(self.timestamps[:parts])
+        values = np.concatenate(self.values[:parts])
+        if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+        return timestamps, values
+
+
+class TimeSeriesStore:
+    def __init__(self, chunk_size: int = settings.TSDB_CHUNK_SIZE,
+                 partition_hours: int = settings.TSDB_PARTITION_HOURS):
+        self.chunk_size = chunk_size
+        self.partition_ms = partition_hours * 3600 * 1000
+        self._heads: Dict[Tuple[str, int], _Head] = {}
+        self._lock = threading.Lock()
+
+    def append(self, series: str, timestamps: np.ndarray, values: np.ndarray) -> None:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        partitions = timestamps // self.partition_ms
+        with self._lock:
+            for partition in np.unique(partitions):
+                mask = partitions == partition
+                head = self._heads.setdefault((series, int(partition)), _Head())
+                head.timestamps.append(timestamps[mask])
+                head.values.append(values[mask])
+                head.dirty = True
+
+    def flush(self, db: Session) -> int:
+        # 写满的块封存后从内存移除；未写满的块以同一行持续覆盖。
+        # 提交成功后才修改内存中的块，提交失败时数据仍标记为 dirty，下次 flush 重试
+        with self._lock:
+            dirty = [(key, head, len(head.timestamps)) for key, head in self._heads.items() if head.dirty]
+            for _, head, _ in dirty:
+                head.dirty = False
+
+        try:
+            new_rows, updated_rows, results = [], [], []
+            for (series, partition), head, parts in dirty:
+                timestamps, values = head.arrays(parts)
+                chunk_id = head.chunk_id
+                while len(timestamps) >= self.chunk_size:
+                    full_ts, full_values = timestamps[:self.chunk_size], values[:self.chunk_size]
+                    timestamps, values = timestamps[self.chunk_size:], values[self.chunk_size:]
+                    row = self._chunk_row(series, partition, full_ts, full_values, sealed=True)
+                    if chunk_id is None:
+                        new_rows.append(row)
+                    else:
+                        updated_rows.append({"id": chunk_id, **row})
+                        chunk_id = None
+                if len(timestamps):
+                    row = self._chunk_row(series, partition, timestamps, values, sealed=False)
+                    if chunk_id is None:
+                        chunk_id = db.execute(insert(HistoryChunk).returning(HistoryChunk.id), row).scalar_one()
+                    else:
+                        updated_rows.append({"id": chunk_id, **row})
+                results.append((head, parts, timestamps, values, chunk_id))
+
+            if new_rows:
+                db.execute(insert(HistoryChunk), new_rows)
+            if updated_rows:
+                db.execute(update(HistoryChunk), updated_rows)
+            db.commit()
+        except Exception:
+            with self._lock:
+                for _, head, _ in dirty:
+                    head.dirty = True
+            raise
+
+        with self._lock:
+            for head, parts, timestamps, values, chunk_id in results:
+                # flush 期间追加的数据保留在后面，下次 flush 写入
+                head.timestamps[:parts] = [timestamps]
+                head.values[:parts] = [values]
+                head.chunk_id = chunk_id
+            for key, head, _ in dirty:
+                if not head.dirty and len(head.timestamps) == 1 and len(head.timestamps[0]) == 0 \
+                        and self._heads.get(key) is head:
+                    del self._heads[key]
+        return len(dirty)
+
+    def evict_before(self, cutoff_ms: int) -> None:
+        # 早于 cutoff 的分区不会再有新数据写入，释放其内存中的块（数据已落库）
+        partition = cutoff_ms // self.partition_ms
+        with self._lock:
+            for key in [key for key, head in self._heads.items() if key[1] < partition and not head.dirty]:
+                del self._heads[key]
+
+    def _chunk_row(self, series: str, partition: int, timestamps: np.ndarray,
+                   values: np.ndarray, sealed: bool) -> Dict[str, Any]:
+        ts_blob, value_blob = encode_chunk(timestamps, values)
+        return {
+            "series": series,
+            "partition": partition,
+            "start_ts": int(timestamps[0]),
+            "end_ts": int(timestamps[-1]),
+            "count": len(timestamps),
+            "ts_blob": ts_blob,
+            "value_blob": value_blob,
+            "sealed": 1 if sealed else 0,
+        }
+
+    def range_scan(self, db: Session, series_keys: Iterable[str], begin_ms: int, end_ms: int) -> Dict[str, Series]:
+        series_keys = list(series_keys)
+        result: Dict[str, Series] = {key: empty_series() for key in series_keys}
+        if not series_keys:
+            return result
+
+        chunks = db.query(HistoryChunk.series, HistoryChunk.start_ts, HistoryChunk.end_ts,
+                          HistoryChunk.ts_blob, HistoryChunk.value_blob).filter(
+            HistoryChunk.series.in_(series_keys),
+            HistoryChunk.partition >= begin_ms // self.partition_ms,
+            HistoryChunk.partition <= end_ms // self.partition_ms,
+            HistoryChunk.start_ts <= end_ms,
+            HistoryChunk.end_ts >= begin_ms,
+        ).order_by(HistoryChunk.series, HistoryChunk.start_ts).all()
+
+        grouped: Dict[str, List[Series]] = {}
+        for series, start_ts, end_ts, ts_blob, value_blob in chunks:
+            timestamps, values = decode_chunk(ts_blob, value_blob)
+            # 只有跨越查询边界的块才需要裁剪
+            if start_ts < begin_ms or end_ts > end_ms:
+                mask = (timestamps >= begin_ms) & (timestamps <= end_ms)
+                timestamps, values = timestamps[mask], values[mask]
+            grouped.setdefault(series, []).append((timestamps, values))
+
+        for series, parts in grouped.items():
+            timestamps = np.concatenate([p[0] for p in parts])
+            values = np.concatenate([p[1] for p in parts])
+            if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+                order = np.argsort(timestamps, kind="stable")
+                timestamps, values = timestamps[order], values[order]
+            result[series] = (timestamps, values)
+        return result
+
+    def append_batch(self, batch: List[Dict[str, Any]]) -> int:
+        # 接入层批次：按序列分组后追加到内存块，返回批次中最新的时间戳
+        timestamps = np.fromiter((to_ms(s["date"]) for s in batch), dtype=np.int64, count=len(batch))
+        values = np.fromiter((s["param_value"] for s in batch), dtype=np.float32, count=len(batch))
+        keys = [node_series(s["node_id"]) for s in batch]
+        station_rows = [i for i, s in enumerate(batch) if s.get("station_id") is not None]
+        if station_rows:
+            keys.extend(station_series(batch[i]["station_id"]) for i in station_rows)
+            timestamps = np.concatenate([timestamps, timestamps[station_rows]])
+            values = np.concatenate([values, values[station_rows]])
+        self.append_series(keys, timestamps, values)
+        return int(timestamps.max())
+
+    def append_series(self, keys: List[str], timestamps: np.ndarray, values: np.ndarray) -> None:
+        # 多个序列的样本按序列分组后追加
+        key_array = np.array(keys)
+        order = np.argsort(key_array, kind="stable")
+        sorted_keys = key_array[order]
+        bounds = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        for part in np.split(order, bounds):
+            self.append(str(key_array[part[0]]), timestamps[part], values[part])
+
+    def ingest(self, batch: List[Dict[str, Any]], session_factory: Callable[[], Session]) -> None:
+        if not batch:
+            return
+        latest = self.append_batch(batch)
+        db = session_factory()
+        try:
+            self.flush(db)
+        except Exception as e:
+            db.rollback()
+            print(f"写入时序存储失败: {e}")
+        finally:
+            db.close()
+        self.evict_before(latest - self.partition_ms)
+
+
+ts_store = TimeSeriesStore()
+
+
+def backfill_node_history(db: Session, store: Optional[TimeSeriesStore] = None, batch_size: int = 50000) -> int:
+    # 将已有的 node_history 行导入列式存储（升级后执行），可重复执行
+    query = db.query(NodeHistory.node_id, NodeHistory.date, NodeHistory.param_value).order_by(
+        NodeHistory.node_id, NodeHistory.date)
+    return _backfill(db, store, query, node_series, batch_size)
+
+
+def backfill_station_history(db: Session, store: Optional[TimeSeriesStore] = None, batch_size: int = 50000) -> int:
+    # 将升级前的分站历史（history_data，device_id 为分站 ID）导入列式存储，可重复执行
+    query = db.query(HistoryData.device_id, HistoryData.date, HistoryData.param_value).order_by(
+        HistoryData.device_id, HistoryData.date)
+    return _backfill(db, store, query, station_series, batch_size)
+
+
+def _backfill(db: Session, store: Optional[TimeSeriesStore], query, series_key: Callable[[Any], str],
+              batch_size: int) -> int:
+    # 每个序列只导入早于其最早数据块的样本：该时刻之后的数据已由接入层或上一次导入写入，重复执行不会重复导入。
+    # 默认使用独立的内存块，接入层的 flush 不会提交导入到一半的数据；全部导入在最后一次 flush 中提交
+    store = store or TimeSeriesStore()
+    covered = dict(db.query(HistoryChunk.series, func.min(HistoryChunk.start_ts)).group_by(HistoryChunk.series).all())
+    total = 0
+    keys: List[str] = []
+    timestamps: List[int] = []
+    values: List[float] = []
+    for source_id, date, value in query.yield_per(batch_size):
+        key, ts = series_key(source_id), to_ms(date)
+        start = covered.get(key)
+        if start is not None and ts >= start:
+            continue
+        keys.append(key)
+        timestamps.append(ts)
+        values.append(value)
+        if len(keys) >= batch_size:
+            store.append_series(keys, np.array(timestamps, dtype=np.int64), np.array(values, dtype=np.float32))
+            total += len(keys)
+            keys, timestamps, values = [], [], []
+    if keys:
+        store.append_series(keys, np.array(timestamps, dtype=np.int64), np.array(values, dtype=np.float32))
+        total += len(keys)
+    store.flush(db)
+    return total
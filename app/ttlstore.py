@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# 带有效期的键值存储，用于短信验证码：每个账号最多保留 max_per_id 个未过期的值，超出时淘汰最早的
+# memory：进程内，按过期时间的小顶堆清理，每次读写时顺带弹出已到期的条目，过期清理为摊还 O(log n)，不依赖再次访问同一账号
+# redis：每个账号一个有序集合（成员为值、分值为过期时间），多 worker 共享，键本身也设置过期时间
+
+
+class TTLStore(ABC):
+    def __init__(self, max_per_id: int = settings.VERIFY_MAX_CODES_PER_ID):
+        self.max_per_id = max_per_id
+
+    @abstractmethod
+    def put(self, identity: str, value: str, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, identity: str) -> List[str]:
+        # 返回该账号所有未过期的值，最新的在后
+        ...
+
+    @abstractmethod
+    def discard(self, identity: str) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryTTLStore(TTLStore):
+    def __init__(self, max_per_id: int = settings.VERIFY_MAX_CODES_PER_ID,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_per_id)
+        self.clock = clock
+        self._entries: Dict[str, Deque[Tuple[float, str]]] = {}
+        # (过期时间, 序号, 账号)；被覆盖或淘汰的条目留在堆中，弹出时忽略
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, _, identity = heapq.heappop(self._heap)
+            entries = self._entries.get(identity)
+            if entries is None:
+                continue
+            live = deque(item for item in entries if item[0] > now)
+            if live:
+                self._entries[identity] = live
+            else:
+                del self._entries[identity]
+
+    def put(self, identity: str, value: str, ttl: float) -> None:
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            expires_at = now + ttl
+            entries = self._entries.setdefault(identity, deque())
+            entries.append((expires_at, value))
+            while len(entries) > self.max_per_id:
+                entries.popleft()
+            heapq.heappush(self._heap, (expires_at, next(self._seq), identity))
+
+    def get(self, identity: str) -> List[str]:
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            return [value for expires_at, value in self._entries.get(identity, ()) if expires_at > now]
+
+    def discard(self, identity: str) -> None:
+        with self._lock:
+            self._entries.pop(identity, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(self.clock())
+            return sum(len(entries) for entries in self._entries.values())
+
+
+class RedisTTLStore(TTLStore):
+    def __init__(self, url: str = settings.REDIS_URL, prefix: str = "iotserver:verify:",
+                 max_per_id: int = settings.VERIFY_MAX_CODES_PER_ID):
+        super().__init__(max_per_id)
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def put(self, identity: str, value: str, ttl: float) -> None:
+        key = self.prefix + identity
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zadd(key, {value: now + ttl})
+        # 只保留最新的 max_per_id 个
+        pipe.zremrangebyrank(key, 0, -self.max_per_id - 1)
+        pipe.expire(key, int(ttl) + 1)
+        pipe.execute()
+
+    def get(self, identity: str) -> List[str]:
+        values = self._redis.zrangebyscore(self.prefix + identity, time.time(), "+inf")
+        return [value.decode() if isinstance(value, bytes) else value for value in values]
+
+    def discard(self, identity: str) -> None:
+        self._redis.delete(self.prefix + identity)
+
+    def __len__(self) -> int:
+        total = 0
+        for key in self._redis.scan_iter(match=self.prefix + "*"):
+            total += self._redis.zcount(key, time.time(), "+inf")
+        return total
+
+
+def create_ttl_store(name: str = settings.VERIFY_STORE_BACKEND) -> TTLStore:
+    name = (name or "memory").lower()
+    if name == "memory":
+        return MemoryTTLStore()
+    if name == "redis":
+        return RedisTTLStore()
+    raise ValueError(f"不支持的验证码存储: {name}")
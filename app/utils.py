@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
 import requests
-import time
 import jwt
 from dotenv import load_dotenv
 import os
 
+from app.config import settings
+from app.ttlstore import create_ttl_store
+
 load_dotenv()  # 加载 .env 文件中的环境变量
 SECRET_KEY = os.getenv("SECRET_KEY")# 用于签名 token 的密钥
 
@@ -17,8 +19,8 @@ def generate_admin_token(admin_id: str) -> str:
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
     return token
 
-# 假设我们用一个字典存储验证码和过期时间（TODO 为了示例）
-verification_store = {}
+# 验证码存储：按 VERIFY_STORE_BACKEND 选择进程内或 Redis，过期的验证码自动清理
+verification_store = create_ttl_store()
 
 def format_date(date_str: str) -> datetime:
     return datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
@@ -57,25 +59,12 @@ def generate_verification_code() -> str:
 
     
 def remove_verification_code(superID: str) -> None:
-    if superID in verification_store:
-        del verification_store[superID]
+    verification_store.discard(superID)
         
 def store_verification_code(superID: str, code: str) -> None:
-    expiration_time = time.time() + 300  # 5分钟有效期
-    verification_store[superID] = {"code": code, "expires_at": expiration_time}
+    # 默认 5 分钟有效期；同一账号最多保留 VERIFY_MAX_CODES_PER_ID 个验证码（默认 1，新验证码替换旧验证码）
+    verification_store.put(superID, code, settings.VERIFY_CODE_TTL)
 
 def verify_sms_code(superID: str, code: str) -> bool:
-    # 从存储中获取验证码信息
-    stored_info = verification_store.get(superID)
-    
-    if not stored_info:
-        return False
-    
-    # 检查验证码是否过期
-    if time.time() > stored_info["expires_at"]:
-        # 过期后删除验证码
-        remove_verification_code(superID)
-        return False
-    
-    # 验证码是否匹配
-    return stored_info["code"] == code
+    # 只返回未过期的验证码，与其中任意一个匹配即通过
+    return code in verification_store.get(superID)
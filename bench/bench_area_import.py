@@ -0,0 +1,79 @@
+# 空间批量新增/修改/删除基准：逐个按 ID 查询（改造前）与按集合批量执行（改造后）对比
+# 用法: python -m bench.bench_area_import [空间数]
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.db import create_db_engine
+from app.models import Area, Base
+from app.services.area_service import AreaService
+
+
+def make_areas(count: int):
+    return [{"areaName": f"room{i}", "areaLocation": f"F{i // 50}", "areaValue": 20.0, "areaHight": 3.0}
+            for i in range(count)]
+
+
+def per_row(db, system_id: str, areas) -> dict:
+    # 改造前的实现：逐个 db.add，修改与删除时逐个 get_area_by_id
+    timings = {}
+    start = time.perf_counter()
+    for area in areas:
+        crud.add_area(db, Area(system_id=system_id, area_name=area["areaName"], area_location=area["areaLocation"],
+                               area_value=area["areaValue"], area_height=area["areaHight"], memo=""))
+    db.commit()
+    timings["add"] = time.perf_counter() - start
+    ids = [a for (a,) in db.query(Area.area_id).filter(Area.system_id == system_id)]
+
+    start = time.perf_counter()
+    for area_id in ids:
+        existing = crud.get_area_by_id(db, area_id)
+        existing.area_name = "renamed"
+    db.commit()
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for area_id in ids:
+        crud.delete_area(db, crud.get_area_by_id(db, area_id))
+    db.commit()
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+
+def bulk(db, system_id: str, areas) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    ids = AreaService.add_areas(db, system_id, areas)
+    timings["add"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    AreaService.update_areas(db, system_id, [{"areaID": area_id, **area, "areaName": "renamed"}
+                                             for area_id, area in zip(ids, areas)])
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    AreaService.delete_areas(db, system_id, ids)
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+
+def main(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        areas = make_areas(count)
+        for name, run in (("逐个查询", per_row), ("批量执行", bulk)):
+            db = Session()
+            timings = run(db, name, areas)
+            db.close()
+            print(f"{name}: " + ", ".join(f"{op} {seconds * 1000:.1f} ms" for op, seconds in timings.items()))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
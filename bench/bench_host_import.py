@@ -0,0 +1,54 @@
+# /api/host/import 批量导入基准：逐行 add_host（每行两次提交）与单事务批量写入对比
+# 用法: python -m bench.bench_host_import [主机数]
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.db import create_db_engine
+from app.models import Base, Host, HostOperationsLog
+from app.schemas import HostImportRequest
+from app.services import devices_service
+
+
+def make_rows(count: int, offset: int = 0):
+    return [{"hostNo": offset + i, "devEUI": f"{offset + i:016x}", "hostType": "LORA",
+             "hostName": f"host{offset + i}", "location": "A"} for i in range(count)]
+
+
+def run(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        # 逐行写入只取 1/10 的数量估算，完整跑一遍过慢
+        sample = max(1, count // 10)
+        db = Session()
+        start = time.perf_counter()
+        for row in make_rows(sample, offset=count):
+            # 与 crud.add_host 相同：先提交主机，再提交操作日志
+            db.add(Host(system_id="bench", host_no=row["hostNo"], dev_eui=row["devEUI"], host_type=row["hostType"],
+                        host_name=row["hostName"], location=row["location"]))
+            db.commit()
+            db.add(HostOperationsLog(host_no=row["hostNo"], operation="ADD", status_code="0"))
+            db.commit()
+        per_row = (time.perf_counter() - start) / sample
+        db.close()
+
+        db = Session()
+        start = time.perf_counter()
+        result = devices_service.import_hosts_service(db, HostImportRequest(systemID="bench", host=make_rows(count)))
+        elapsed = time.perf_counter() - start
+        db.close()
+        assert result["added"] == count, result
+
+        print(f"逐行写入: {per_row * 1000:.2f} ms/行, 估算 {count} 行 {per_row * count:.2f} s")
+        print(f"批量导入: {count} 行 {elapsed:.2f} s ({count / elapsed:.0f} 行/s)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
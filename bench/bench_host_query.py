@@ -0,0 +1,125 @@
+# /api/host/query 并发吞吐基准：对比在 async 接口中直接调用同步 ORM（改造前）与异步会话（改造后）
+# 用法: python -m bench.bench_host_query [并发数] [请求数] [模拟的数据库往返延迟毫秒数]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.db import get_async_db, to_async_url
+from app.models import Base, Host
+from app.schemas import HostQuery
+
+
+POOL = {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+
+
+def add_latency(engine, latency_ms: int) -> None:
+    # 用 SQLite 的 trace 回调在执行语句的线程中等待，模拟网络数据库的往返延迟：
+    # 同步会话中等待发生在事件循环线程，aiosqlite 中发生在其后台线程
+    if not latency_ms:
+        return
+    delay = latency_ms / 1000
+
+    def trace(statement):
+        time.sleep(delay)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        if hasattr(dbapi_connection, "run_async"):
+            dbapi_connection.run_async(lambda conn: conn.set_trace_callback(trace))
+        else:
+            dbapi_connection.set_trace_callback(trace)
+
+
+def seed(url: str, latency_ms: int, hosts: int = 5000) -> sessionmaker:
+    # 两种写法使用相同的连接池配置；改造前的写法在并发超过连接池上限时会互相等待直到超时，
+    # 因为释放连接的依赖项清理需要事件循环调度，而事件循环正被阻塞的查询占用
+    engine = create_engine(url, **POOL)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([Host(system_id=f"sys{i % 50}", host_no=i, dev_eui=f"{i:016x}", host_type="LORA", host_name=f"h{i}")
+                for i in range(hosts)])
+    db.commit()
+    db.close()
+    engine.dispose()
+    add_latency(engine, latency_ms)
+    return Session
+
+
+def legacy_app(Session: sessionmaker) -> FastAPI:
+    # 改造前的写法：async def 接口内执行阻塞查询，查询期间事件循环无法处理其他请求
+    app = FastAPI()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.post("/api/host/query")
+    async def query_host(data: HostQuery, db: Session = Depends(get_db)):
+        hosts = db.query(Host).filter(Host.system_id == data.systemID).offset(data.first).limit(data.number).all()
+        return {"what": "QRY_HOST", "code": "0", "number": len(hosts),
+                "host": [{"hostNo": h.host_no, "devEUI": h.dev_eui, "hostName": h.host_name} for h in hosts]}
+
+    return app
+
+
+def async_app(url: str, latency_ms: int) -> FastAPI:
+    from app.main import app
+
+    engine = create_async_engine(to_async_url(url), **POOL)
+    add_latency(engine.sync_engine, latency_ms)
+    AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get_bench_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = get_bench_db
+    return app
+
+
+async def run(app: FastAPI, concurrency: int, requests: int):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/host/query", json={"systemID": f"sys{i % 50}", "first": 0, "number": 50})
+                assert response.status_code == 200
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    values = np.array(latencies) * 1000
+    return requests / elapsed, np.percentile(values, 50), np.percentile(values, 99)
+
+
+def main(concurrency: int = 20, requests: int = 1000, latency_ms: int = 5):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_host.db')}"
+    Session = seed(url, latency_ms)
+    for name, app in (("before", legacy_app(Session)), ("after", async_app(url, latency_ms))):
+        rps, p50, p99 = asyncio.run(run(app, concurrency, requests))
+        print(f"{name:6s} concurrency={concurrency} requests={requests} latency={latency_ms}ms "
+              f"throughput={rps:.0f}/s p50={p50:.1f}ms p99={p99:.1f}ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
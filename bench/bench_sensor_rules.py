@@ -0,0 +1,86 @@
+# 传感规则判断基准：逐样本按节点索引判断与 NumPy 批量判断对比（相当于 1 秒 100k 个样本的接入量），
+# 另给出逐样本扫描全部规则（改造前的做法）的推算值
+# 用法: python -m bench.bench_sensor_rules [节点数] [每节点规则数] [样本数] [每批样本数]
+import random
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services.rule_service import SensorRuleEngine, make_rule, target_state
+
+
+def make_engine(nodes: int, per_node: int) -> SensorRuleEngine:
+    engine = SensorRuleEngine(hysteresis=0.05, debounce=2, handler=lambda actuations: None)
+    rules = []
+    for node_id in range(nodes):
+        for k in range(per_node):
+            sense_id = len(rules) + 1
+            param = SimpleNamespace(sense_id=sense_id, task_id=str(sense_id), node_id=node_id,
+                                    high_value=30.0 + k, high_act="TURN-ON", low_value=20.0 - k, low_act="TURN-OFF")
+            rules.append(make_rule(param, engine.hysteresis))
+    engine.set_rules(rules)
+    return engine
+
+
+def make_samples(nodes: int, count: int, noisy: bool):
+    # steady：每个节点在 25 附近随机游走，偶尔越过阈值；noisy：数值在 10~40 间均匀分布，频繁切换
+    rng = random.Random(1)
+    now = datetime.now()
+    levels = [25.0] * nodes
+    samples = []
+    for _ in range(count):
+        node_id = rng.randrange(nodes)
+        if noisy:
+            value = rng.uniform(10.0, 40.0)
+        else:
+            levels[node_id] = min(45.0, max(5.0, levels[node_id] + rng.gauss(0, 1.0)))
+            value = levels[node_id]
+        samples.append({"node_id": node_id, "param_value": value, "date": now})
+    return samples
+
+
+def scan_all(engine: SensorRuleEngine, nodes: int, samples) -> int:
+    # 改造前的做法：每个样本遍历全部规则筛选节点
+    rules = [rule for node_id in range(nodes) for rule in engine.rules_for(node_id)]
+    matched = 0
+    for sample in samples:
+        for rule in rules:
+            if rule.node_id == sample["node_id"]:
+                target_state(rule, 0, sample["param_value"])
+                matched += 1
+    return matched
+
+
+def run(engine: SensorRuleEngine, samples, batch_size: int):
+    actuations = []
+    engine.handler = actuations.extend
+    start = time.perf_counter()
+    for offset in range(0, len(samples), batch_size):
+        engine.on_batch(samples[offset:offset + batch_size])
+    return actuations, time.perf_counter() - start
+
+
+def main(nodes: int, per_node: int, count: int, batch_size: int) -> None:
+    for noisy in (False, True):
+        samples = make_samples(nodes, count, noisy)
+        print(f"{'noisy' if noisy else 'steady'}: {nodes * per_node} 条规则，{count} 个样本，每批 {batch_size}")
+        results = {}
+        for name, batch_min in (("逐样本", len(samples) + 1), ("NumPy 批量", 1)):
+            engine = make_engine(nodes, per_node)
+            engine.batch_min = batch_min
+            actuations, elapsed = run(engine, samples, batch_size)
+            results[name] = actuations
+            print(f"  {name}: {elapsed * 1000:.1f} ms，{count / elapsed:,.0f} 样本/s，发出 {len(actuations)} 个动作")
+        assert results["逐样本"] == results["NumPy 批量"]
+
+    sample_count = min(count, 1000)
+    start = time.perf_counter()
+    scan_all(make_engine(nodes, per_node), nodes, samples[:sample_count])
+    elapsed = (time.perf_counter() - start) * count / sample_count
+    print(f"扫描全部规则（按 {sample_count} 个样本推算）: {elapsed * 1000:.1f} ms，{count / elapsed:,.0f} 样本/s")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [5000, 2, 100000, 5000][len(args):]))
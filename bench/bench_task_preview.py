@@ -0,0 +1,90 @@
+# 任务触发时间预览基准：逐日判断规则（改造前）与按年位图展开并缓存（改造后）对比
+# 用法: python -m bench.bench_task_preview [任务数] [每个任务的预览次数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db import create_db_engine
+from app.models import Base, Task, TaskStartTime
+from app.schedule import _rule_active, year_days, year_mask
+from app.schemas import TaskPreviewRequest
+from app.services import tasks_services
+from app.services.scheduler_service import TaskScheduler
+
+MODES = ["ODD_DAY", "EVEN_DAY", "WORKDAY", "INT_DAY", ""]
+
+
+def populate(db, count: int) -> None:
+    rng = random.Random(1)
+    db.execute(insert(Task), [{
+        "task_id": i, "system_id": "S1", "task_name": f"task{i}", "task_type": rng.choice(["TIMING", "CYCLING"]),
+        "action": "TURN-ON", "act_time": 0, "act_on_time": 900, "number1": 4,
+        # setupDay 各不相同，规则缓存不应随之增长
+        "setup_day": (date(2025, 1, 1) + timedelta(days=rng.randrange(0, 450))).isoformat(),
+        "repeat_mode": rng.choice(MODES), "interval_day": rng.randint(1, 7), "cycle_num": 4, "area_id": "A1",
+    } for i in range(1, count + 1)])
+    db.execute(insert(TaskStartTime), [{
+        "task_id": str(i), "begin_time": datetime(2026, 1, 1) + timedelta(seconds=rng.randrange(0, 86400, 60)),
+    } for i in range(1, count + 1) for _ in range(2)])
+    db.commit()
+
+
+def per_day(schedules, begin: datetime, end: datetime, number: int) -> int:
+    # 改造前：每个任务逐日调用规则判断，再逐个格式化触发时间
+    total = 0
+    for schedule in schedules:
+        day, fire_times = begin.date(), []
+        while day <= end.date() and len(fire_times) < number:
+            if _rule_active(day, schedule.repeat_mode, schedule.setup_day, schedule.interval_day, schedule.act_days):
+                base = datetime(day.year, day.month, day.day)
+                for offset in schedule.offsets:
+                    when = base + timedelta(seconds=offset)
+                    if begin < when <= end and len(fire_times) < number:
+                        fire_times.append(when.isoformat(sep=" "))
+            day += timedelta(days=1)
+        total += len(fire_times)
+    return total
+
+
+def best_of(run, repeat: int = 5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main(count: int, number: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        populate(db, count)
+        tasks_services.task_scheduler = scheduler = TaskScheduler(Session)
+        request = TaskPreviewRequest(systemID="S1", beginTime="2026-03-01 00:00:00",
+                                     endTime="2026-03-31 23:59:59", number=number)
+
+        response, elapsed = best_of(lambda: tasks_services.preview_tasks(db, request), repeat=1)
+        fires = sum(len(item.fireTime) for item in response.tasks)
+        print(f"首次（查询并编译）: {count} 个任务 {fires} 次触发 {elapsed * 1000:.1f} ms，"
+              f"位图缓存 {year_mask.cache_info().currsize + year_days.cache_info().currsize} 项")
+        response, elapsed = best_of(lambda: tasks_services.preview_tasks(db, request))
+        print(f"缓存: {count} 个任务 {fires} 次触发 {elapsed * 1000:.1f} ms")
+
+        schedules = [s for s in scheduler.schedules(db, list(range(1, count + 1))).values() if s is not None]
+        fires, elapsed = best_of(lambda: per_day(schedules, datetime(2026, 3, 1), datetime(2026, 3, 31, 23, 59, 59), number))
+        print(f"逐日判断: {fires} 次触发 {elapsed * 1000:.1f} ms（不含查询与响应构造）")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
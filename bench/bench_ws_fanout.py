@@ -0,0 +1,50 @@
+# WebSocket 扇出延迟基准：大量订阅者在同一主题上时，从发布到各连接完成发送的耗时
+# 用法: python -m bench.bench_ws_fanout [连接数] [消息数]
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from app.realtime import ConnectionManager
+
+
+class BenchWebSocket:
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        # 消息内容即发布时刻，让出一次事件循环模拟网络写
+        await asyncio.sleep(0)
+        self.latencies.append(time.perf_counter() - float(message))
+
+
+async def run(connections: int, messages: int):
+    manager = ConnectionManager()
+    latencies = []
+    for _ in range(connections):
+        subscriber = await manager.connect(BenchWebSocket(latencies))
+        manager.subscribe(subscriber, ["system:bench"])
+
+    publish_cost = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        manager.publish("system:bench", repr(start))
+        publish_cost.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+    while len(latencies) < connections * messages:
+        await asyncio.sleep(0.01)
+
+    values = np.array(latencies) * 1000
+    print(f"connections={connections} messages={messages} "
+          f"publish={np.mean(publish_cost) * 1000:.2f}ms "
+          f"p50={np.percentile(values, 50):.1f}ms p99={np.percentile(values, 99):.1f}ms")
+    print(manager.stats())
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(run(*args) if args else run(10000, 20))
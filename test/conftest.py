@@ -1,14 +1,12 @@
 # test/conftest.py
 import pytest
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.db import Base, get_db, init_db
+from app.db import Base, get_db, init_db, DATABASE_URL, create_db_engine
 from app.models import SuperAdmin,System
 from sqlalchemy.orm import Session
 
-# 使用 SQLite 内存数据库进行测试
-SQLALCHEMY_DATABASE_URL = "sqlite:///smart_park_management.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# 与应用使用同一配置（DATABASE_URL）的数据库进行测试
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture(scope="module")
@@ -41,4 +39,14 @@ def test_superadmin(db: Session):
 def test_system(db: Session):
     # 清理之前的测试数据
     db.query(System).filter(System.system_id == "systemID").delete()
-    db.commit()
\ No newline at end of file
+    db.commit()
+
+# 独立的内存数据库，供不依赖 HTTP 接口的服务层测试使用
+@pytest.fixture(scope="function")
+def mem_session_factory():
+    from sqlalchemy.pool import StaticPool
+    from app.models import Base as ModelBase
+    mem_engine = create_db_engine("sqlite://", poolclass=StaticPool)
+    ModelBase.metadata.create_all(bind=mem_engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=mem_engine)
+    mem_engine.dispose()
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.crud import create_task, update_task
+from app.models import TaskHistory, TaskStation
+from app.services.actuation_service import ActuationExecutor
+
+
+class FakeSender:
+    # 记录同时动作的分站数，station_id 为 failing 中的分站返回失败
+    def __init__(self, delay=0.02, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.active = 0
+        self.peak = 0
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, station_id, action):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.sent.append(station_id)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if station_id == 99:
+            raise RuntimeError("网关无响应")
+        return station_id not in self.failing
+
+
+def scene_task(db, stations, concurrent):
+    return create_task(db, {"systemID": "S1", "taskName": "场景", "taskType": "SCENERY", "action": "TURN-ON",
+                            "concurrent": concurrent, "areaID": "A1",
+                            "station": [{"stationID": str(station)} for station in stations]})
+
+
+def test_waves_respect_concurrent_and_record_in_one_batch(mem_session_factory):
+    db = mem_session_factory()
+    task = scene_task(db, list(range(1, 24)) + [99, 1], concurrent=10)
+    sender = FakeSender(failing={5})
+    executor = ActuationExecutor(mem_session_factory, sender=sender, wave_interval=0.01)
+
+    statements = []
+    engine = db.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    result = executor.execute(task.task_id, "TURN-ON")
+    event.remove(engine, "before_cursor_execute", listener)
+
+    # 重复的分站只保存一次：24 个分站分为 10、10、4 三批
+    assert [(w.wave, w.size) for w in result.waves] == [(1, 10), (2, 10), (3, 4)]
+    assert sender.peak <= 10 and sorted(sender.sent) == list(range(1, 24)) + [99]
+    assert [w.failed for w in result.waves] == [1, 0, 1]
+    assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 1
+
+    rows = db.query(TaskHistory).filter(TaskHistory.task_id == str(task.task_id)).all()
+    assert len(rows) == 24
+    failed = sorted(row.memo for row in rows if row.status == "FAILED")
+    assert failed == ["分站 5 第 1 批: 下发失败", "分站 99 第 3 批: 网关无响应"]
+    db.close()
+
+
+def test_overlapping_runs_share_task_semaphore(mem_session_factory):
+    db = mem_session_factory()
+    task = scene_task(db, range(1, 7), concurrent=3)
+    sender = FakeSender(delay=0.05)
+    executor = ActuationExecutor(mem_session_factory, sender=sender, wave_interval=0.0)
+    executor.start()
+    futures = [executor.submit(task.task_id, "TURN-ON") for _ in range(3)]
+    results = [future.result(timeout=10) for future in futures]
+    executor.stop()
+    assert sender.peak <= 3 and len(sender.sent) == 18
+    assert all(len(result.waves) == 2 for result in results)
+    assert executor.stats() == {"executions": 3, "succeeded": 18, "failed": 0, "not_sent": 0}
+
+    # 修改分站与 concurrent 后的执行按新的设置分批
+    update_task(db, str(task.task_id), {"stationID": "7,8,9,10", "concurrent": 4})
+    assert [s for (s,) in db.query(TaskStation.station_id).filter(TaskStation.task_id == str(task.task_id))] == [7, 8, 9, 10]
+    result = executor.execute(task.task_id, "TURN-OFF")
+    assert [(w.wave, w.size) for w in result.waves] == [(1, 4)]
+    db.close()
+
+
+def test_without_sender_records_not_sent(mem_session_factory):
+    db = mem_session_factory()
+    task = scene_task(db, [1, 2, 3], concurrent=2)
+    executor = ActuationExecutor(mem_session_factory)
+    result = executor.execute(task.task_id, "TURN-ON")
+    assert result.waves == [] and [o.status for o in result.outcomes] == ["NOT_SENT"] * 3
+    rows = db.query(TaskHistory).filter(TaskHistory.task_id == str(task.task_id)).all()
+    assert {(row.status, row.memo) for row in rows} == {("NOT_SENT", f"分站 {i}: 分站下行尚未接入") for i in (1, 2, 3)}
+    assert executor.stats() == {"executions": 1, "succeeded": 0, "failed": 0, "not_sent": 3}
+    db.close()
+
+
+def test_waiting_runs_do_not_hold_send_threads(mem_session_factory):
+    db = mem_session_factory()
+    slow = scene_task(db, [1], concurrent=1)
+    fast = scene_task(db, [50], concurrent=1)
+    sender = FakeSender(delay=0.3)
+    sender_fast = lambda station_id, action: station_id == 50 or sender(station_id, action)
+    executor = ActuationExecutor(mem_session_factory, sender=sender_fast, wave_interval=0.0, workers=2, max_runs=4)
+    executor.start()
+    # 同一任务的后两次执行在执行线程中等待信号量，另一个任务仍有空闲的发送线程
+    slow_runs = [executor.submit(slow.task_id, "TURN-ON") for _ in range(3)]
+    time.sleep(0.05)
+    [wave] = executor.submit(fast.task_id, "TURN-ON").result(timeout=5).waves
+    assert wave.succeeded == 1 and wave.seconds < 0.15
+    assert all(run.result(timeout=5).waves[0].succeeded == 1 for run in slow_runs)
+    executor.stop()
+    db.close()
+
+
+def test_timeout_cancels_queued_sends(mem_session_factory):
+    db = mem_session_factory()
+    task = scene_task(db, [1, 2], concurrent=2)
+    released = threading.Event()
+    sender = lambda station_id, action: released.wait(5)
+    executor = ActuationExecutor(mem_session_factory, sender=sender, send_timeout=0.1, workers=1)
+    executor.start()
+    result = executor.execute(task.task_id, "TURN-ON")
+    # 分站 1 已在下发（超时记为失败），分站 2 仍在排队，被取消且未下发
+    assert [(o.station_id, o.status, o.error) for o in result.outcomes] == [
+        (1, "FAILED", "超时"), (2, "NOT_SENT", "超时未下发")]
+    assert [(w.succeeded, w.failed) for w in result.waves] == [(0, 1)]
+    # 已开始的下发返回后才归还信号量
+    semaphore = executor._semaphore(task.task_id, 2)
+    assert semaphore._value == 1
+    released.set()
+    executor.stop()
+    assert semaphore._value == 2
+    db.close()
+
+
+def test_stop_records_remaining_waves(mem_session_factory):
+    db = mem_session_factory()
+    task = scene_task(db, range(1, 6), concurrent=2)
+    executor = ActuationExecutor(mem_session_factory, sender=FakeSender(delay=0.0), wave_interval=5)
+    executor.start()
+    future = executor.submit(task.task_id, "TURN-ON")
+    time.sleep(0.1)
+    executor.stop()
+    result = future.result(timeout=5)
+    # 第一批已下发，其余两批因服务停止记为 NOT_SENT
+    assert [(o.wave, o.station_id, o.status) for o in result.outcomes] == [
+        (1, 1, "SUCCESS"), (1, 2, "SUCCESS"), (2, 3, "NOT_SENT"), (2, 4, "NOT_SENT"), (3, 5, "NOT_SENT")]
+    rows = db.query(TaskHistory).filter(TaskHistory.task_id == str(task.task_id)).all()
+    assert sorted(row.memo for row in rows if row.status == "NOT_SENT") == [
+        "分站 3 第 2 批: 服务停止", "分站 4 第 2 批: 服务停止", "分站 5 第 3 批: 服务停止"]
+    assert executor.stats()["not_sent"] == 3
+    db.close()
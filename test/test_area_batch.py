@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import event
+
+from app.models import Area
+from app.services.area_service import AreaService
+
+
+def _area(i, **extra):
+    return {"areaName": f"room{i}", "areaLocation": "F1", "areaValue": 10.0, "areaHight": 3.0, **extra}
+
+
+def test_bulk_area_operations(mem_session_factory):
+    db = mem_session_factory()
+    ids = AreaService.add_areas(db, "sys1", [_area(i) for i in range(1000)])
+    other = AreaService.add_areas(db, "sys2", [_area(0)])
+    assert len(set(ids)) == 1000 and db.query(Area).filter(Area.system_id == "sys1").count() == 1000
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        AreaService.update_areas(db, "sys1", [{"areaID": area_id, **_area(9, memo="m")} for area_id in ids])
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    # 1000 个 ID 分两批校验，一条批量 UPDATE
+    assert [s.split()[0] for s in statements] == ["SELECT", "SELECT", "UPDATE"]
+    assert db.query(Area).filter(Area.memo == "m").count() == 1000
+
+    # 任一空间不存在（或属于其他系统）时整批不修改
+    with pytest.raises(Exception, match=other[0]):
+        AreaService.delete_areas(db, "sys1", ids[:10] + other)
+    assert db.query(Area).count() == 1001
+
+    AreaService.delete_areas(db, "sys1", ids[:600])
+    assert db.query(Area).filter(Area.system_id == "sys1").count() == 400
+    db.close()
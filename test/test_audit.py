@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+
+from app.audit import AuditLogWriter
+from app.oplog import host_logs, node_logs
+
+
+def all_logs(db, log):
+    return log.query(db, datetime(2000, 1, 1), datetime(2100, 1, 1), limit=0)
+
+
+def test_audit_writer_batches_and_flushes_on_stop(mem_session_factory):
+    writer = AuditLogWriter(mem_session_factory, maxsize=100, batch_size=10, flush_interval=60)
+    writer.start()
+    for i in range(25):
+        writer.host(i, "ADD")
+    writer.node(1, "DELETE")
+    # 满一批即由后台线程写入，不必等到 flush_interval
+    deadline = time.monotonic() + 5
+    while writer.written < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.written >= 10
+
+    writer.stop()
+    db = mem_session_factory()
+    assert len(all_logs(db, host_logs)) == 25
+    [log] = all_logs(db, node_logs)
+    assert (log["node_id"], log["operation"], log["status_code"]) == (1, "DELETE", "0")
+    assert log["created_at"] is not None
+    db.close()
+
+
+def test_audit_writer_overflow_policies(mem_session_factory):
+    dropping = AuditLogWriter(mem_session_factory, maxsize=3, batch_size=100, overflow="drop")
+    assert [dropping.host(i, "ADD") for i in range(5)] == [True, True, True, False, False]
+    assert dropping.stats()["dropped"] == 2
+
+    # 后台线程未运行时队列满由调用方直接写入，不丢失日志
+    blocking = AuditLogWriter(mem_session_factory, maxsize=3, batch_size=100, block_timeout=0.01)
+    for i in range(7):
+        assert blocking.host(i, "MODIFY")
+    assert (blocking.written, blocking.pending(), blocking.blocked) == (4, 3, 1)
+    blocking.stop()
+    db = mem_session_factory()
+    assert len(all_logs(db, host_logs)) == 7
+    db.close()
@@ -0,0 +1,22 @@
+from sqlalchemy.pool import StaticPool
+
+from app.db import create_db_engine, is_memory_sqlite
+
+
+def test_sqlite_engine_uses_wal_and_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql("PRAGMA cache_size").scalar() < 0
+    assert engine.pool.size() > 0
+    engine.dispose()
+
+
+def test_memory_sqlite_engine_accepts_pool_override():
+    assert is_memory_sqlite("sqlite://")
+    assert not is_memory_sqlite("sqlite:///file.db")
+    engine = create_db_engine("sqlite://", poolclass=StaticPool)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+    engine.dispose()
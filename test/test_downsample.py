@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.downsample import bucket_average, bucket_minmax, downsample, lttb
+
+
+def make_series(length=10000):
+    timestamps = np.arange(length, dtype=np.int64) * 60000
+    values = np.sin(np.linspace(0, 20, length)).astype(np.float32)
+    values[length // 3] = 50.0  # 尖峰
+    return timestamps, values
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    timestamps, values = make_series()
+    ts, vals = lttb(timestamps, values, 200)
+    assert len(ts) == 200
+    assert ts[0] == timestamps[0] and ts[-1] == timestamps[-1]
+    assert np.all(np.diff(ts) > 0)
+    assert vals.max() == 50.0
+
+
+def test_bucket_average_and_minmax():
+    timestamps, values = make_series(1000)
+    ts, vals = bucket_average(timestamps, values, 100)
+    assert len(ts) == 100
+    assert np.isclose(vals[0], values[:10].mean())
+
+    ts, vals = bucket_minmax(timestamps, values, 100)
+    assert len(ts) <= 100
+    assert np.all(np.diff(ts) > 0)
+    assert vals.max() == 50.0 and vals.min() == values.min()
+
+
+def test_downsample_passthrough_and_unknown_method():
+    timestamps, values = make_series(50)
+    ts, vals = downsample(timestamps, values, None)
+    assert len(ts) == 50
+    ts, vals = downsample(timestamps, values, 100)
+    assert len(ts) == 50
+    try:
+        downsample(timestamps, values, 10, "MEDIAN")
+    except ValueError:
+        return
+    assert False, "expected ValueError"
+
+
+def test_max_points_below_method_minimum_is_rejected():
+    timestamps, values = make_series(1000)
+    assert len(downsample(timestamps, values, 3)[0]) == 3
+    assert len(downsample(timestamps, values, 2, "MINMAX")[0]) <= 2
+    assert len(downsample(timestamps, values, 1, "AVG")[0]) == 1
+    for max_points, method in ((2, "LTTB"), (1, "LTTB"), (1, "MINMAX"), (0, "AVG"), (-5, "AVG")):
+        try:
+            downsample(timestamps, values, max_points, method)
+        except ValueError:
+            continue
+        assert False, f"expected ValueError for {method} {max_points}"
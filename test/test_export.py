@@ -0,0 +1,39 @@
+import json
+from datetime import datetime, timedelta
+
+from app.models import NodeHistory
+from app.schemas import NodeHistoryExportRequest
+from app.services import devices_service
+
+
+def seed(session_factory, count=12):
+    db = session_factory()
+    start = datetime(2024, 4, 1)
+    db.add_all([NodeHistory(node_id=2, date=start + timedelta(hours=i), param_value=i * 0.5) for i in range(count)])
+    db.add(NodeHistory(node_id=3, date=start, param_value=99))
+    db.commit()
+    db.close()
+
+
+def export(session_factory, export_format, monkeypatch):
+    monkeypatch.setattr(devices_service.settings, "EXPORT_CHUNK_ROWS", 5)
+    request = NodeHistoryExportRequest(token="t", nodeID="2", beginDay="2024-04-01", endDay="2024-04-01",
+                                       format=export_format)
+    return list(devices_service.export_node_history(request, session_factory))
+
+
+def test_export_ndjson_in_chunks(mem_session_factory, monkeypatch):
+    seed(mem_session_factory)
+    chunks = export(mem_session_factory, "ndjson", monkeypatch)
+    assert len(chunks) == 3
+    lines = "".join(chunks).splitlines()
+    assert len(lines) == 12
+    assert json.loads(lines[1]) == {"date": "2024-04-01 01:00:00", "param": 0.5}
+
+
+def test_export_csv(mem_session_factory, monkeypatch):
+    seed(mem_session_factory)
+    lines = "".join(export(mem_session_factory, "CSV", monkeypatch)).splitlines()
+    assert lines[0] == "date,param"
+    assert lines[-1] == "2024-04-01 11:00:00,5.5"
+    assert len(lines) == 13
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app.db import get_db
+from app.main import app
+from app.models import Host
+from app.oplog import host_logs
+from app.schemas import HostImportRequest
+from app.services import devices_service
+
+
+def _host(no, **extra):
+    return {"hostNo": no, "devEUI": f"{no:016x}", "hostType": "LORA", **extra}
+
+
+def test_import_hosts_reports_row_errors(mem_session_factory):
+    db = mem_session_factory()
+    db.add(Host(system_id="other", host_no=9, dev_eui="e9", host_type="LORA"))
+    db.commit()
+
+    rows = [_host(1), _host(2, hostName="h2"), {"hostNo": "x", "hostType": "LORA"},
+            _host(1), _host(9), {"hostNo": 3, "hostType": "VIRTUAL"}]
+    result = devices_service.import_hosts_service(db, HostImportRequest(systemID="s1", host=rows))
+    assert (result["code"], result["added"], result["updated"]) == ("0", 3, 0)
+    assert [e["row"] for e in result["errors"]] == [3, 4, 5]
+    assert db.query(Host).filter(Host.system_id == "s1").count() == 3
+    assert db.query(Host.dev_eui).filter(Host.host_no == 3).scalar().startswith("VIRTUAL_")
+    assert len(host_logs.query(db, datetime(2000, 1, 1), datetime.now())) == 3
+
+    # UPSERT：已存在的主机更新；atomic 时任一行出错则整批不写入
+    rows = [_host(2, hostName="renamed"), _host(4)]
+    result = devices_service.import_hosts_service(db, HostImportRequest(systemID="s1", mode="upsert", host=rows))
+    assert (result["added"], result["updated"]) == (1, 1)
+    assert db.query(Host.host_name).filter(Host.host_no == 2).scalar() == "renamed"
+
+    # 未填写的字段保留原值，已存在的虚拟主机保留原 devEUI
+    db.query(Host).filter(Host.host_no == 2).update({"location": "A 区", "phone_num": "123"})
+    db.commit()
+    virtual_eui = db.query(Host.dev_eui).filter(Host.host_no == 3).scalar()
+    rows = [{"hostNo": 2, "hostType": "LORA", "memo": "m"}, {"hostNo": 3, "hostType": "VIRTUAL", "hostName": "v"},
+            {"hostNo": 7, "hostType": "LORA"}]
+    result = devices_service.import_hosts_service(db, HostImportRequest(systemID="s1", mode="UPSERT", host=rows))
+    assert (result["added"], result["updated"]) == (0, 2)
+    assert [(e["row"], e["errMsg"]) for e in result["errors"]] == [(3, "缺少 devEUI")]
+    db.expire_all()
+    host = db.query(Host).filter(Host.host_no == 2).one()
+    assert (host.host_name, host.location, host.phone_num, host.memo, host.dev_eui) == (
+        "renamed", "A 区", "123", "m", f"{2:016x}")
+    assert db.query(Host.dev_eui, Host.host_name).filter(Host.host_no == 3).one() == (virtual_eui, "v")
+
+    rows = [_host(5), _host(9)]
+    result = devices_service.import_hosts_service(db, HostImportRequest(systemID="s1", atomic=True, host=rows))
+    assert result["code"] == "3" and [e["row"] for e in result["errors"]] == [2]
+    assert db.query(Host).filter(Host.host_no == 5).count() == 0
+    db.close()
+
+
+def test_import_hosts_csv_endpoint(mem_session_factory):
+    def override():
+        db = mem_session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    try:
+        client = TestClient(app)
+        content = "hostNo,devEUI,hostType,hostName\n1,00000000000000a1,LORA,一号\n2,,LORA,\n"
+        response = client.post("/api/host/import_csv", params={"systemID": "s1"},
+                               files={"csvFile": ("hosts.csv", content.encode("utf-8-sig"), "text/csv")})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["added"] == 1 and body["errors"][0]["row"] == 2
+
+        response = client.post("/api/host/import", json={"systemID": "s1", "host": [_host(1)]})
+        assert response.status_code == 400
+        assert response.json()["detail"]["errors"][0]["errMsg"] == "主机编号已存在"
+    finally:
+        app.dependency_overrides.pop(get_db, None)
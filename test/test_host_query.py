@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import get_async_db, to_async_url
+from app.main import app
+from app.models import Base, Host
+
+
+def test_to_async_url():
+    assert to_async_url("sqlite:///a.db") == "sqlite+aiosqlite:///a.db"
+    assert to_async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert to_async_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+def test_query_host_uses_async_session(tmp_path):
+    url = f"sqlite:///{tmp_path / 'hosts.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Host(system_id="sysA", host_no=i, dev_eui=f"{i:016x}", host_type="LORA") for i in range(3)])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+    AsyncSession = async_sessionmaker(create_async_engine(to_async_url(url)), expire_on_commit=False)
+
+    async def override():
+        async with AsyncSession() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = override
+    try:
+        client = TestClient(app)
+        response = client.post("/api/host/query", json={"systemID": "sysA", "first": 1, "number": 5})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["number"] == 2
+        assert body["total"] == 3
+        assert [h["hostNo"] for h in body["host"]] == [1, 2]
+
+        # 游标续读：第一页两条，第二页从 hostNo=1 之后开始
+        page = client.post("/api/host/query", json={"systemID": "sysA", "first": 0, "number": 2}).json()
+        assert [h["hostNo"] for h in page["host"]] == [0, 1]
+        page = client.post("/api/host/query", json={"systemID": "sysA", "first": 0, "number": 2,
+                                                    "after": page["next"]}).json()
+        assert [h["hostNo"] for h in page["host"]] == [2]
+        assert page["total"] == 3
+        assert page["next"] is None
+
+        response = client.post("/api/host/query", json={"systemID": "missing", "first": 0, "number": 5})
+        assert response.status_code == 400
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
@@ -0,0 +1,167 @@
+import base64
+from datetime import datetime
+
+from app.models import Node, NodeHistory
+from app.services.ingest_service import (HistoryWriter, NodeIndex, UplinkConsumer,
+                                         decode_uplink, UplinkDecodeError)
+
+
+def add_node(session_factory, dev_eui="0102030405060708"):
+    db = session_factory()
+    node = Node(system_id="sys1", host_no=1, dev_eui=dev_eui, dev_name="n1", dev_type="TEMP")
+    db.add(node)
+    db.commit()
+    node_id = node.id
+    db.close()
+    return node_id
+
+
+def test_decode_uplink_v4_object():
+    sample = decode_uplink({
+        "deviceInfo": {"devEui": "0102030405060708"},
+        "time": "2024-09-01T08:00:00.123456789Z",
+        "fPort": 2,
+        "object": {"battery": 98, "value": 21.5},
+    })
+    assert sample["dev_eui"] == "0102030405060708"
+    assert sample["port"] == 2
+    assert sample["param_value"] == 21.5
+
+
+def test_decode_uplink_v3_raw_bytes():
+    sample = decode_uplink({
+        "devEUI": base64.b64encode(bytes.fromhex("0102030405060708")).decode(),
+        "data": base64.b64encode((215).to_bytes(2, "big")).decode(),
+    })
+    assert sample["dev_eui"] == "0102030405060708"
+    assert sample["param_value"] == 215.0
+
+
+def test_decode_uplink_without_value():
+    try:
+        decode_uplink({"deviceInfo": {"devEui": "0102030405060708"}, "object": {"status": "ok"}})
+    except UplinkDecodeError:
+        return
+    assert False, "expected UplinkDecodeError"
+
+
+def test_consumer_batches_into_node_history(mem_session_factory):
+    node_id = add_node(mem_session_factory)
+    writer = HistoryWriter(mem_session_factory, batch_size=10, flush_interval=60)
+    batches = []
+    writer.add_listener(batches.append)
+    consumer = UplinkConsumer(NodeIndex(mem_session_factory), writer)
+
+    for i in range(25):
+        consumer.handle({"deviceInfo": {"devEui": "0102030405060708"}, "object": {"value": i}})
+    assert not consumer.handle({"deviceInfo": {"devEui": "ffffffffffffffff"}, "object": {"value": 1}})
+
+    writer.flush()
+    db = mem_session_factory()
+    assert db.query(NodeHistory).filter(NodeHistory.node_id == node_id).count() == 25
+    db.close()
+    assert writer.stats()["rowsWritten"] == 25
+    assert sum(len(batch) for batch in batches) == 25
+    assert consumer.rejected == 1
+
+
+def test_writer_background_flush_by_size(mem_session_factory):
+    node_id = add_node(mem_session_factory)
+    writer = HistoryWriter(mem_session_factory, batch_size=5, flush_interval=60)
+    consumer = UplinkConsumer(NodeIndex(mem_session_factory), writer)
+    writer.start()
+    consumer.start()
+    for i in range(5):
+        consumer.publish("application/1/device/0102030405060708/event/up",
+                         b'{"deviceInfo": {"devEui": "0102030405060708"}, "object": {"value": 1}}')
+    consumer.publish("application/1/device/0102030405060708/event/join", b"{}")
+    consumer.stop()
+    writer.stop()
+    assert writer.batches_written >= 1
+    assert writer.rows_written == 5
+
+
+def test_index_follows_node_and_substation_changes(mem_session_factory, monkeypatch):
+    from types import SimpleNamespace
+    from app.schemas import SubstationCreate, SubstationDelete, SubstationUpdate
+    from app.services import devices_service
+
+    node_id = add_node(mem_session_factory)
+    index = NodeIndex(mem_session_factory)
+    monkeypatch.setattr(devices_service, "node_index", index)
+    db = mem_session_factory()
+    index.load(db)
+
+    station = {"stationName": "s", "portNo": 2, "areaID": "a", "drvType": "LIGHT", "drvTime": 0,
+               "mbAddr": "1", "mbParam": "9600"}
+    result = devices_service.add_substation_service(db, SubstationCreate(
+        systemID="sys1", hostNo=1, nodeNo=node_id, number=1, controller=[station]))
+    station_id = result["node"][0]["stationID"]
+    assert index.station_for(node_id, 2) == station_id
+
+    # 修改端口后旧端口不再对应该分站
+    devices_service.modify_substation_service(db, SubstationUpdate(
+        systemID="sys1", number=1, controller=[{"stationID": station_id, "portNo": 3}]))
+    assert (index.station_for(node_id, 2), index.station_for(node_id, 3)) == (None, station_id)
+
+    devices_service.delete_substation_service(db, SubstationDelete(
+        systemID="sys1", number=1, controller=[{"stationID": str(station_id)}]))
+    assert index.station_for(node_id, 3) is None
+
+    assert index.resolve("0102030405060708") == node_id
+    devices_service.delete_node_service(db, SimpleNamespace(controller=[{"nodeNo": node_id}]))
+    assert index.resolve("0102030405060708") is None
+    db.close()
+
+
+def test_consumer_survives_malformed_uplinks(mem_session_factory):
+    add_node(mem_session_factory)
+    writer = HistoryWriter(mem_session_factory, batch_size=100, flush_interval=60)
+    consumer = UplinkConsumer(NodeIndex(mem_session_factory), writer)
+    for event in ([1], "x", 5, {"deviceInfo": "abc"}, {"devEUI": 12}):
+        try:
+            decode_uplink(event)
+        except UplinkDecodeError:
+            pass
+        else:
+            raise AssertionError(event)
+
+    consumer.start()
+    for payload in (b"[1]", b'"x"', b"5", b'{"deviceInfo": "abc"}', b"{",
+                    b'{"deviceInfo": {"devEui": "0102030405060708"}, "object": {"value": 1}}'):
+        consumer.publish("application/1/device/0102030405060708/event/up", payload)
+    consumer.stop()
+    assert consumer.rejected == 5 and writer.pending() == 1
+
+
+def test_writer_retries_failed_batches(mem_session_factory):
+    from types import SimpleNamespace
+
+    node_id = add_node(mem_session_factory)
+    failures = [2]
+
+    def session_factory():
+        if failures[0]:
+            failures[0] -= 1
+            def fail(*args, **kwargs):
+                raise RuntimeError("database is locked")
+            return SimpleNamespace(execute=fail, commit=None, rollback=lambda: None, close=lambda: None)
+        return mem_session_factory()
+
+    writer = HistoryWriter(session_factory, batch_size=100, flush_interval=60, retry_limit=2, retry_delay=0)
+    sample = lambda i: {"node_id": node_id, "date": datetime(2024, 9, 1, 8, 0, i), "param_value": float(i)}
+    writer.add(sample(0))
+    # 失败的批次放回缓冲区，之后与新样本一起写入
+    assert writer.flush() == 0 and writer.pending() == 1
+    writer.add(sample(1))
+    assert writer.flush() == 0 and writer.pending() == 2
+    assert writer.flush() == 2
+    db = mem_session_factory()
+    assert [row.param_value for row in db.query(NodeHistory).order_by(NodeHistory.date)] == [0.0, 1.0]
+    db.close()
+
+    # 连续失败超过 retry_limit 次后丢弃
+    failures[0] = 3
+    writer.add(sample(2))
+    assert [writer.flush() for _ in range(3)] == [0, 0, 0]
+    assert writer.pending() == 0 and writer.stats()["dropped"] == 1
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import crud
+from app.models import Node
+from app.oplog import month_start, node_logs
+from app.schemas import NodeUpdate
+
+
+def _statements(db):
+    statements = []
+    engine = db.get_bind()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before)
+
+
+def test_modify_node_batch_is_set_based(mem_session_factory):
+    db = mem_session_factory()
+    db.add_all([Node(system_id="s1", host_no=1, dev_eui=f"{i:016x}", dev_name=f"n{i}", dev_type="TEMP")
+                for i in range(300)])
+    db.add(Node(system_id="s2", host_no=1, dev_eui="ffffffffffffffff", dev_name="other", dev_type="TEMP"))
+    db.commit()
+    other_id = db.query(Node.id).filter(Node.system_id == "s2").scalar()
+
+    # 本月日志表已存在时不再执行建表 DDL
+    node_logs.ensure(db, month_start(datetime.now()))
+    db.commit()
+
+    controller = [{"nodeNo": i, "devName": f"renamed{i}", "devPort": 2} for i in range(1, 301)]
+    controller += [{"nodeNo": other_id, "devName": "x"}, {"nodeNo": 999}, {"devName": "no id"}]
+    statements, stop = _statements(db)
+    try:
+        result = crud.modify_node(db, NodeUpdate(systemID="s1", hostNo=1, controller=controller))
+    finally:
+        stop()
+
+    assert result["code"] == "0" and result["number"] == 300
+    assert result["node"][0] == {"nodeNo": 1, "devEUI": f"{0:016x}"}
+    assert sorted(str(e["nodeNo"]) for e in result["errors"]) == sorted(["None", "999", str(other_id)])
+    # 预取、批量更新与日志写入各一条语句，与节点数量无关
+    assert len([s for s in statements if not s.lstrip().startswith(("BEGIN", "COMMIT"))]) == 3
+    assert db.query(Node.dev_name).filter(Node.id == 300).scalar() == "renamed300"
+    assert db.query(Node.dev_name).filter(Node.id == other_id).scalar() == "other"
+    assert len(node_logs.query(db, datetime(2000, 1, 1), datetime.now(), limit=0)) == 300
+
+    # 单个节点修改仍然可用
+    result = crud.modify_node(db, NodeUpdate(systemID="s1", hostNo=1, nodeNo=5, nodeName="single"))
+    assert result["number"] == 1 and db.query(Node.dev_name).filter(Node.id == 5).scalar() == "single"
+    result = crud.modify_node(db, NodeUpdate(systemID="s1", hostNo=2, nodeNo=5, nodeName="x"))
+    assert result["code"] == "3" and result["errNo"] == "404"
+    db.close()
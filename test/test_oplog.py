@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from sqlalchemy import event, insert
+
+from app import crud
+from app.models import HostOperationsLog
+from app.oplog import apply_retention, host_logs, months_between
+from app.schemas import HostLogQuery
+
+
+def test_months_between_crosses_year():
+    months = months_between(datetime(2025, 11, 15), datetime(2026, 2, 1))
+    assert [f"{m:%Y%m}" for m in months] == ["202511", "202512", "202601", "202602"]
+
+
+def test_partitioned_logs_query_and_retention(mem_session_factory):
+    db = mem_session_factory()
+    host_logs.insert(db, [{"host_no": 1, "operation": "ADD", "status_code": "0", "created_at": datetime(2026, m, 10)}
+                          for m in (1, 2, 3, 4)])
+    host_logs.insert(db, [{"host_no": 2, "operation": "MODIFY", "status_code": "0",
+                           "created_at": datetime(2026, 3, 20)}])
+    db.commit()
+    assert host_logs.partitions(db) == [f"host_operations_logs_20260{m}" for m in (1, 2, 3, 4)]
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        rows = host_logs.query(db, datetime(2026, 2, 1), datetime(2026, 3, 31))
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert [(r["host_no"], r["created_at"].month) for r in rows] == [(2, 3), (1, 3), (1, 2)]
+    # 只读取二、三月的分区
+    query = [s for s in statements if "UNION ALL" in s][0]
+    assert "_202602" in query and "_202603" in query and "_202601" not in query and "_202604" not in query
+
+    result = crud.query_host_logs(db, HostLogQuery(beginDay="2026-03-01", endDay="2026-04-30", hostNo=1))
+    assert [log["time"] for log in result["log"]] == ["2026-04-10 00:00:00", "2026-03-10 00:00:00"]
+
+    # 保留 60 天：整月早于 3 月 1 日的分区被删除
+    dropped = apply_retention(db, days=60, now=datetime(2026, 4, 30))
+    assert sorted(dropped) == ["host_operations_logs_202601", "host_operations_logs_202602"]
+    assert host_logs.partitions(db) == ["host_operations_logs_202603", "host_operations_logs_202604"]
+    db.close()
+
+
+def test_migrate_legacy_rows(mem_session_factory):
+    db = mem_session_factory()
+    db.execute(insert(HostOperationsLog), [{"host_no": 1, "operation": "ADD", "created_at": datetime(2025, 12, 31, 23)},
+                                           {"host_no": 1, "operation": "DELETE", "created_at": datetime(2026, 1, 1)}])
+    assert host_logs.migrate_legacy(db) == 2
+    db.commit()
+    assert db.query(HostOperationsLog).count() == 0
+    assert host_logs.partitions(db) == ["host_operations_logs_202512", "host_operations_logs_202601"]
+    rows = host_logs.query(db, datetime(2026, 1, 1), datetime(2026, 1, 31))
+    assert [r["operation"] for r in rows] == ["DELETE"]
+    db.close()
+
+
+def test_partition_ddl_runs_once_per_month(mem_session_factory):
+    db = mem_session_factory()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        # 回滚的建表不计入缓存，下次写入重新建表
+        host_logs.insert(db, [{"host_no": 1, "operation": "ADD", "status_code": "0", "created_at": datetime(2026, 5, 1)}])
+        db.rollback()
+        for day in (2, 3, 4):
+            host_logs.insert(db, [{"host_no": 1, "operation": "ADD", "status_code": "0",
+                                   "created_at": datetime(2026, 5, day)}])
+            db.commit()
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert len([s for s in statements if s.lstrip().startswith("CREATE TABLE")]) == 2
+    assert len(host_logs.query(db, datetime(2026, 5, 1), datetime(2026, 5, 31))) == 3
+
+    # 删除分区后再次写入会重新建表
+    apply_retention(db, 30, now=datetime(2026, 7, 1))
+    host_logs.insert(db, [{"host_no": 1, "operation": "ADD", "status_code": "0", "created_at": datetime(2026, 5, 5)}])
+    db.commit()
+    assert host_logs.partitions(db) == ["host_operations_logs_202605"]
+    db.close()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from app.pubsub import LocalSocketBackend, MemoryBackend, create_backend
+from app.realtime import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.messages.append(message)
+
+
+async def relay(backends):
+    # 两个 ConnectionManager 模拟两个 worker，各自有一个订阅连接
+    workers, sockets = [], []
+    for backend in backends:
+        hub = ConnectionManager()
+        await hub.attach(backend)
+        ws = FakeWebSocket()
+        hub.subscribe(await hub.connect(ws), ["system:sys1"])
+        workers.append(hub)
+        sockets.append(ws)
+
+    workers[0].publish("system:sys1", json.dumps({"v": 1}), key="node:1")
+    await workers[1].broadcast("hello")
+    await asyncio.sleep(0.05)
+    for hub in workers:
+        await hub.detach()
+    return sockets
+
+
+def test_memory_backend_reaches_other_workers():
+    first, second = asyncio.run(relay([MemoryBackend("t1"), MemoryBackend("t1")]))
+    # 本进程消息只扇出一次，不会因回环重复
+    assert sorted(first.messages) == sorted(second.messages) == ["hello", '{"v": 1}']
+
+
+def test_local_socket_backend_reaches_other_workers(tmp_path):
+    directory = str(tmp_path / "ws")
+    first, second = asyncio.run(relay([LocalSocketBackend(directory), LocalSocketBackend(directory)]))
+    assert sorted(first.messages) == sorted(second.messages) == ["hello", '{"v": 1}']
+
+
+def test_create_backend():
+    assert create_backend("") is None
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    try:
+        create_backend("kafka")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_local_socket_backend_splits_packets_and_removes_stale_sockets(tmp_path):
+    import os
+    import socket
+
+    directory = tmp_path / "ws"
+    directory.mkdir()
+    # 已退出进程留下的套接字文件：绑定后关闭，不删除文件
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stale.bind(str(directory / "dead.sock"))
+    stale.close()
+
+    async def run():
+        sender, receiver = LocalSocketBackend(str(directory)), LocalSocketBackend(str(directory))
+        received = []
+        await sender.start(lambda batch: None)
+        await receiver.start(received.extend)
+        # 256 条 2KB 的消息超过单个数据报的长度上限
+        for i in range(256):
+            sender.publish("system:sys1", f"{i:04d}" + "x" * 2000)
+        await asyncio.sleep(0.2)
+        await sender.stop()
+        await receiver.stop()
+        return received, sender
+
+    received, sender = asyncio.run(run())
+    assert [message[:4] for _, message, _ in received] == [f"{i:04d}" for i in range(256)]
+    assert sender.published == 256
+    assert not os.path.exists(directory / "dead.sock")
+
+
+def test_control_messages_reach_other_workers_only():
+    received = []
+
+    async def run():
+        workers = []
+        for _ in range(2):
+            hub = ConnectionManager()
+            await hub.attach(MemoryBackend("control"))
+            hub.on_control("task", received.append)
+            ws = FakeWebSocket()
+            hub.subscribe(await hub.connect(ws), ["system:sys1"])
+            workers.append((hub, ws))
+        # 控制消息可以在线程池中发布，只交给其他 worker 的处理函数，不推送给连接
+        await asyncio.get_running_loop().run_in_executor(None, workers[0][0].publish_control, "task", "42")
+        await asyncio.sleep(0.05)
+        for hub, _ in workers:
+            await hub.detach()
+        return [ws.messages for _, ws in workers]
+
+    assert asyncio.run(run()) == [[], []]
+    assert received == ["42"]
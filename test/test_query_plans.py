@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event, select
+
+from app import crud
+from app.models import Host, HostOperationsLog, Node, NodeOperationsLog, Substation
+from app.pagination import apply_keyset, encode_cursor
+from app.schemas import NodeQuery
+
+# 查询计划回归测试：热点查询必须走索引（SQLite 的 SEARCH ... USING INDEX），不能退化为全表扫描
+
+
+@contextmanager
+def captured_selects(db):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def query_plan(db, statement, parameters=()):
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def plans_of(db, call):
+    with captured_selects(db) as statements:
+        result = call()
+        if hasattr(result, "__next__"):
+            list(result)
+    assert statements
+    return [query_plan(db, statement, parameters) for statement, parameters in statements]
+
+
+def plan_of_stmt(db, stmt):
+    compiled = stmt.compile(db.get_bind())
+    return query_plan(db, str(compiled), tuple(compiled.params[name] for name in compiled.positiontup))
+
+
+def assert_index(plan, index_name):
+    assert f"INDEX {index_name}" in plan, plan
+
+
+def test_node_and_host_lookups_use_composite_indexes(mem_session_factory):
+    db = mem_session_factory()
+    [plan] = plans_of(db, lambda: crud.query_node(db, NodeQuery(systemID="s1", hostNo=1, first=0, number=10)))
+    assert_index(plan, "ix_nodes_system_host")
+    assert_index(plan_of_stmt(db, select(Host).filter(Host.system_id == "s1").limit(10)), "ix_hosts_system_host")
+
+    # 游标分页的续读条件同样走索引，并且不需要额外排序
+    stmt = apply_keyset(select(Host).filter(Host.system_id == "s1"), [Host.host_no], 0, 10, encode_cursor(500))
+    plan = plan_of_stmt(db, stmt)
+    assert_index(plan, "ix_hosts_system_host")
+    assert "TEMP B-TREE" not in plan
+    stmt = apply_keyset(select(Node).filter(Node.system_id == "s1", Node.host_no == 1), [Node.id], 0, 10, encode_cursor(500))
+    assert_index(plan_of_stmt(db, stmt), "ix_nodes_system_host")
+    db.close()
+
+
+def test_history_and_report_ranges_use_indexes(mem_session_factory):
+    db = mem_session_factory()
+    [plan] = plans_of(db, lambda: crud.iter_node_history(db, "1", "2024-09-01", "2024-09-30"))
+    assert_index(plan, "ix_node_history_node_date")
+    [plan] = plans_of(db, lambda: crud.get_reports(db, "u1", "2024-01-01", "2024-12-31"))
+    assert_index(plan, "ix_reports_user_created")
+    db.close()
+
+
+def test_area_station_and_log_lookups_use_indexes(mem_session_factory):
+    db = mem_session_factory()
+    [plan] = plans_of(db, lambda: crud.get_areas(db, "s1", 0, 10))
+    assert_index(plan, "ix_areas_system_id")
+
+    stmt = select(Substation).filter(Substation.system_id == "s1", Substation.area_id == "a1",
+                                     Substation.drv_type == "RELAY")
+    assert_index(plan_of_stmt(db, stmt), "ix_substations_system_area_drv")
+
+    stmt = select(HostOperationsLog).filter(HostOperationsLog.host_no == 1).order_by(HostOperationsLog.created_at)
+    assert_index(plan_of_stmt(db, stmt), "ix_host_operations_logs_host_created")
+    stmt = select(NodeOperationsLog).filter(NodeOperationsLog.node_id == 1).order_by(NodeOperationsLog.created_at)
+    assert_index(plan_of_stmt(db, stmt), "ix_node_operations_logs_node_created")
+    db.close()
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.realtime import ConnectionManager, Subscriber
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(message)
+
+
+def test_subscriber_drops_oldest_and_coalesces():
+    async def scenario():
+        subscriber = Subscriber(FakeWebSocket(), maxsize=3)
+        for i in range(5):
+            subscriber.offer(f"m{i}")
+        subscriber.offer("a1", key="node:1")
+        subscriber.offer("a2", key="node:1")
+        subscriber.start()
+        await asyncio.sleep(0.01)
+        subscriber.stop()
+        return subscriber
+
+    subscriber = asyncio.run(scenario())
+    assert subscriber.websocket.messages == ["m3", "m4", "a2"]
+    assert subscriber.dropped == 3
+    assert subscriber.coalesced == 1
+
+
+def test_publish_does_not_wait_for_slow_connections():
+    async def scenario():
+        manager = ConnectionManager()
+        slow, fast = FakeWebSocket(delay=0.2), FakeWebSocket()
+        for ws in (slow, fast):
+            subscriber = await manager.connect(ws)
+            manager.subscribe(subscriber, ["system:1", "bad-topic"])
+        assert manager.publish("system:1", "hello") == 2
+        assert manager.publish("area:1", "nobody") == 0
+        await asyncio.sleep(0.01)
+        fast_done, slow_done = list(fast.messages), list(slow.messages)
+        for ws in (slow, fast):
+            manager.disconnect(ws)
+        return fast_done, slow_done, manager
+
+    fast_done, slow_done, manager = asyncio.run(scenario())
+    assert fast_done == ["hello"]
+    assert slow_done == []
+    assert manager.topics == {}
+
+
+def test_websocket_subscribe_protocol():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text(json.dumps({"action": "subscribe", "topics": ["node:0102030405060708", "x"]}))
+        reply = websocket.receive_json()
+        assert reply == {"what": "WS_SUB", "code": "0", "topics": ["node:0102030405060708"]}
+
+        websocket.send_text("not json")
+        assert websocket.receive_json()["what"] == "WS_ERROR"
+
+        websocket.send_text(json.dumps({"action": "ping"}))
+        assert websocket.receive_json()["what"] == "WS_PONG"
@@ -0,0 +1,191 @@
+import time
+from datetime import date, datetime
+
+from app.crud import create_task, delete_task, update_task
+from app.models import TaskHistory
+from app.schedule import _rule_active, compile_task, year_days, year_mask
+from app.services.scheduler_service import IndexedHeap, TaskScheduler
+
+
+def task_data(**overrides):
+    data = {"systemID": "S1", "taskName": "灌溉", "taskType": "TIMING", "action": "TURN-ON",
+            "actTime": 0, "actOnTime": 0, "number1": 2, "setupDay": "2026-01-05", "repeatMode": "WORKDAY",
+            "begin": [{"beginTime": "08:00"}, {"beginTime": "18:30"}], "areaID": "A1"}
+    data.update(overrides)
+    return data
+
+
+def ts(*args):
+    return datetime(*args).timestamp()
+
+
+def test_indexed_heap_update_and_remove():
+    heap = IndexedHeap()
+    heap.heapify([(5.0, 1), (3.0, 2), (9.0, 3)])
+    heap.push(1.0, 3)
+    heap.push(4.0, 4)
+    assert heap.remove(2) and not heap.remove(2)
+    assert [heap.pop() for _ in range(len(heap))] == [(1.0, 3), (4.0, 4), (5.0, 1)]
+
+
+def test_repeat_modes():
+    task = type("T", (), dict(task_id=1, task_type="CYCLING", action="TURN-ON", number1=1, cycle_num=3,
+                              act_on_time=600, repeat_mode="INT_DAY", interval_day=3,
+                              setup_day="2026-03-01", act_day=None))
+    schedule = compile_task(task, ["23:40"])
+    # 循环不跨过当天零点，间隔 3 天
+    assert schedule.offsets == (85200, 85800)
+    assert schedule.next_fire(datetime(2026, 2, 1)) == datetime(2026, 3, 1, 23, 40)
+    assert schedule.next_fire(datetime(2026, 3, 1, 23, 51)) == datetime(2026, 3, 4, 23, 40)
+    assert not schedule.is_active(date(2026, 3, 2))
+
+
+def test_scheduler_fires_and_reindexes(mem_session_factory):
+    fired = []
+    now = [ts(2026, 1, 9, 12, 0)]  # 周五中午
+    scheduler = TaskScheduler(mem_session_factory, handler=fired.extend, clock=lambda: now[0])
+    db = mem_session_factory()
+    task = create_task(db, task_data())
+    other = create_task(db, task_data(taskName="夜间", repeatMode="", begin=[{"beginTime": "23:00"}]))
+    assert scheduler.load(db) == 2
+    assert scheduler.next_fire_time(task.task_id) == datetime(2026, 1, 9, 18, 30)
+
+    # 周五 18:30 之后下一次是周一 08:00
+    now[0] = ts(2026, 1, 9, 18, 30)
+    assert [f.task_id for f in scheduler.tick()] == [task.task_id]
+    assert scheduler.next_fire_time(task.task_id) == datetime(2026, 1, 12, 8, 0)
+
+    # 修改开始时间只重建该任务
+    update_task(db, str(task.task_id), {"beginTime": "19:00", "repeatMode": "ODD_DAY"})
+    scheduler.reindex(db, task.task_id)
+    assert scheduler.next_fire_time(task.task_id) == datetime(2026, 1, 9, 19, 0)
+
+    delete_task(db, str(other.task_id))
+    scheduler.reindex(db, other.task_id)
+    assert len(scheduler) == 1
+    now[0] = ts(2026, 1, 10, 0, 0)
+    assert [f.when for f in scheduler.tick()] == [datetime(2026, 1, 9, 19, 0)]
+    assert len(fired) == 2
+    db.close()
+
+
+def test_scheduler_thread_writes_history(mem_session_factory):
+    db = mem_session_factory()
+    # 注入的时钟在建任务之后才拨到触发时刻前 0.5 秒，准备耗时不影响触发
+    offset = [0.0]
+    scheduler = TaskScheduler(mem_session_factory, clock=lambda: time.time() + offset[0])
+    scheduler.load(db)
+    fire_at = datetime.combine(date.today(), datetime.min.time()).replace(hour=12)
+    task = create_task(db, task_data(repeatMode="", number1=1, setupDay=None,
+                                     begin=[{"beginTime": fire_at.strftime("%H:%M:%S")}]))
+    offset[0] = fire_at.timestamp() - 0.5 - time.time()
+    scheduler.reindex(db, task.task_id)
+    scheduler.start()
+    deadline = time.monotonic() + 5
+    while scheduler.fired == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    scheduler.stop()
+    [history] = db.query(TaskHistory).all()
+    assert (history.task_id, history.executed_at, history.status) == (str(task.task_id), fire_at, "FIRED")
+    assert scheduler.stats()["maxLagMs"] < 1000
+    db.close()
+
+
+def test_only_one_process_runs_the_scheduler(mem_session_factory, tmp_path):
+    from app.services.scheduler_service import SchedulerElection, SchedulerLease
+
+    path = str(tmp_path / "scheduler.lock")
+    elections = [SchedulerElection(TaskScheduler(mem_session_factory), SchedulerLease(path),
+                                   mem_session_factory, mode="auto", interval=0.02) for _ in range(2)]
+    for election in elections:
+        election.start()
+    assert [e.scheduler.running for e in elections] == [True, False]
+
+    # 持锁进程退出后另一个 worker 接管
+    elections[0].stop()
+    deadline = time.monotonic() + 2
+    while not elections[1].scheduler.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert elections[1].scheduler.running
+    elections[1].stop()
+
+    off = SchedulerElection(TaskScheduler(mem_session_factory), SchedulerLease(path), mode="off")
+    off.start()
+    assert not off.scheduler.running
+
+
+def test_year_mask_and_occurrences():
+    workday = compile_task(type("T", (), dict(task_id=1, task_type="TIMING", action="TURN-ON", number1=1,
+                                              cycle_num=None, act_on_time=None, repeat_mode="WORKDAY",
+                                              interval_day=None, setup_day=None, act_day=None)), ["07:00"])
+    assert bin(workday.year_mask(2026)).count("1") == 261
+    # 跨年时从下一年的位图继续
+    assert list(workday.occurrences(datetime(2026, 12, 31, 8), limit=2)) == [
+        datetime(2027, 1, 1, 7), datetime(2027, 1, 4, 7)]
+    assert len(list(workday.occurrences(datetime(2026, 3, 1), datetime(2026, 3, 31, 23, 59)))) == 22
+
+
+
+def test_year_mask_shared_across_setup_days():
+    def schedule(repeat_mode, setup_day, interval_day=None, act_day=None):
+        task = type("T", (), dict(task_id=1, task_type="TIMING", action="TURN-ON", number1=1, cycle_num=None,
+                                  act_on_time=None, repeat_mode=repeat_mode, interval_day=interval_day,
+                                  setup_day=setup_day, act_day=act_day))
+        return compile_task(task, ["07:00"])
+
+    year_mask.cache_clear()
+    year_days.cache_clear()
+    setup_days = [date.fromordinal(date(2025, 6, 1).toordinal() + i) for i in range(0, 400, 7)]
+    schedules = [schedule(mode, day.isoformat(), interval) for day in setup_days
+                 for mode, interval in (("ODD_DAY", None), ("EVEN_DAY", None), ("WORKDAY", None), ("INT_DAY", 3),
+                                        (None, None))]
+    schedules.append(schedule(None, "2026-02-01", act_day="2026-01-20,2026-02-03,2027-01-01"))
+    for item in schedules:
+        for year in (2025, 2026, 2027):
+            days = [date.fromordinal(ordinal) for ordinal in item.year_days(year)]
+            expected = [day for day in map(date.fromordinal, range(date(year, 1, 1).toordinal(),
+                                                                   date(year + 1, 1, 1).toordinal()))
+                        if _rule_active(day, item.repeat_mode, item.setup_day, item.interval_day, item.act_days)]
+            assert days == expected
+            assert bin(item.year_mask(year)).count("1") == len(expected)
+            assert all(item.is_active(day) for day in expected)
+    # 每种规则每年只展开一次，INT_DAY 按间隔的相位共用
+    assert len({item.rule for item in schedules}) == 3 + 3 + 1 + 1
+    assert year_mask.cache_info().currsize <= 8 * 3 and year_days.cache_info().currsize <= 8 * 3
+
+
+def test_preview_uses_cached_schedules(mem_session_factory, monkeypatch):
+    from app.schemas import TaskPreviewRequest
+    from app.services import tasks_services
+
+    scheduler = TaskScheduler(mem_session_factory)
+    monkeypatch.setattr(tasks_services, "task_scheduler", scheduler)
+    db = mem_session_factory()
+    task = create_task(db, task_data())
+    create_task(db, task_data(taskType="SENSOR"))
+    request = TaskPreviewRequest(systemID="S1", beginTime="2026-01-09 12:00:00", number=3)
+    [item] = tasks_services.preview_tasks(db, request).tasks
+    assert item.fireTime == ["2026-01-09 18:30:00", "2026-01-12 08:00:00", "2026-01-12 18:30:00"]
+
+    # 未 reindex 前使用缓存的规则，reindex 后使用修改后的规则
+    update_task(db, str(task.task_id), {"repeatMode": "EVEN_DAY"})
+    assert tasks_services.preview_tasks(db, request).tasks[0].fireTime[1] == "2026-01-12 08:00:00"
+    scheduler.reindex(db, task.task_id)
+    assert tasks_services.preview_tasks(db, request).tasks[0].fireTime == [
+        "2026-01-10 08:00:00", "2026-01-10 18:30:00", "2026-01-12 08:00:00"]
+
+    bad = tasks_services.preview_tasks(db, TaskPreviewRequest(systemID="S1", beginTime="明天"))
+    assert (bad.code, bad.errNo) == ("3", "400")
+    db.close()
+
+
+def test_preview_bounds_number():
+    import pytest
+    from pydantic import ValidationError
+    from app.schemas import TaskPreviewRequest
+
+    # number 为 0 时不限次数会展开全部触发时间，必须在 1 到 TASK_PREVIEW_MAX_NUMBER 之间
+    for number in (0, -1, 1001):
+        with pytest.raises(ValidationError):
+            TaskPreviewRequest(systemID="S1", number=number)
+    assert TaskPreviewRequest(systemID="S1").number == 10
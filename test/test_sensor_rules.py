@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+from app.crud import create_task, delete_task, update_task
+from app.models import TaskHistory
+from app.services.rule_service import SensorRuleEngine
+
+BASE = datetime(2026, 5, 1, 12, 0)
+
+
+def sensor_task(db, node_id, **sense):
+    values = {"nodeNo": node_id, "highValue": 30.0, "highAct": "TURN-ON", "lowValue": 20.0, "lowAct": "TURN-OFF"}
+    values.update(sense)
+    return create_task(db, {"systemID": "S1", "taskName": "温控", "taskType": "SENSOR", "action": "TURN-ON",
+                            "areaID": "A1", "sense": [values]})
+
+
+def samples(node_id, values):
+    return [{"node_id": node_id, "param_value": value, "date": BASE + timedelta(seconds=i)}
+            for i, value in enumerate(values)]
+
+
+def test_hysteresis_and_debounce(mem_session_factory):
+    db = mem_session_factory()
+    task = sensor_task(db, 7)
+    sensor_task(db, 8)
+    engine = SensorRuleEngine(mem_session_factory, hysteresis=0.1, debounce=2, handler=lambda acts: None)
+    assert engine.load(db) == 2
+
+    # 单个尖峰被去抖过滤；越过高阈值后在回差带内（29.5 > 30 - 1）不解除，低于 29 才解除
+    acts = engine.process(samples(7, [31, 25, 31, 32, 29.5, 31, 28.5, 28.0, 31, 31]))
+    assert [(a.level, a.action, a.value) for a in acts] == [("HIGH", "TURN-ON", 32), ("HIGH", "TURN-ON", 31)]
+    assert acts[0].task_id == task.task_id and acts[0].date == BASE + timedelta(seconds=3)
+
+    acts = engine.process(samples(7, [19, 19.5, 19]))
+    assert [(a.level, a.action) for a in acts] == [("LOW", "TURN-OFF")]
+    # 只判断样本节点上的规则
+    assert engine.stats()["evaluations"] == 13
+    assert engine.process(samples(99, [100, 100])) == []
+    db.close()
+
+
+def test_batch_records_history_and_reindex(mem_session_factory):
+    db = mem_session_factory()
+    task = sensor_task(db, 7)
+    emitted = []
+    engine = SensorRuleEngine(mem_session_factory, hysteresis=0.0, debounce=1)
+    engine.add_listener(emitted.extend)
+    engine.load(db)
+
+    engine.on_batch(samples(7, [35, 35]))
+    [history] = db.query(TaskHistory).all()
+    assert (history.task_id, history.action, history.status) == (str(task.task_id), "TURN-ON", "TRIGGERED")
+    assert len(emitted) == 1
+
+    # 修改阈值后只重建该任务的规则
+    update_task(db, str(task.task_id), {"highValue": 40.0, "highAct": "TURN_ADJ"})
+    engine.reindex(db, task.task_id)
+    [rule] = engine.rules_for(7)
+    assert (rule.high_value, rule.high_act) == (40.0, "TURN_ADJ")
+    assert [(a.action, a.value) for a in engine.process(samples(7, [35, 41]))] == [("TURN_ADJ", 41)]
+
+    delete_task(db, str(task.task_id))
+    engine.reindex(db, task.task_id)
+    assert engine.rules_for(7) == [] and engine.stats()["rules"] == 0
+    db.close()
+
+
+def test_batch_path_matches_per_sample(mem_session_factory):
+    import random
+    from types import SimpleNamespace
+    from app.services.rule_service import make_rule
+
+    rng = random.Random(3)
+    params = [SimpleNamespace(sense_id=i, task_id=str(i), node_id=i % 40, high_value=30.0 + i % 3,
+                              high_act="ON", low_value=20.0 - i % 3, low_act="OFF") for i in range(1, 101)]
+    engines = [SensorRuleEngine(mem_session_factory, hysteresis=0.1, debounce=2) for _ in range(2)]
+    for engine in engines:
+        engine.set_rules([make_rule(param, engine.hysteresis) for param in params])
+    batches = [[{"node_id": rng.randrange(50), "param_value": rng.choice([rng.uniform(15, 35), 25.0]),
+                 "date": BASE + timedelta(seconds=i)} for i in range(500)] for _ in range(6)]
+
+    per_sample = [engines[0].process(batch) for batch in batches]
+    batched = [engines[1].process_batch(batch) for batch in batches]
+    assert batched == per_sample and sum(map(len, batched)) > 50
+    assert {k: v for k, v in engines[1]._state.items() if v[0] or v[2]} == \
+           {k: v for k, v in engines[0]._state.items() if v[0] or v[2]}
+    assert engines[1].stats()["evaluations"] == engines[0].stats()["evaluations"]
+
+
+def test_batch_tolerates_concurrent_remove(mem_session_factory):
+    import random
+    import sys
+    import threading
+    from types import SimpleNamespace
+    from app.services.rule_service import make_rule
+
+    rng = random.Random(5)
+    params = [SimpleNamespace(sense_id=i, task_id=str(i), node_id=i % 40, high_value=30.0, high_act="ON",
+                              low_value=20.0, low_act="OFF") for i in range(1, 401)]
+    engine = SensorRuleEngine(mem_session_factory, hysteresis=0.1, debounce=3, handler=lambda acts: None)
+    rules = [make_rule(param, engine.hysteresis) for param in params]
+    engine.set_rules(rules)
+    batches = [[{"node_id": rng.randrange(40), "param_value": rng.choice([35.0, 25.0, 25.0, 25.0]),
+                 "date": BASE + timedelta(seconds=i)} for i in range(400)] for _ in range(40)]
+
+    # 请求线程不断删除任务（删除规则状态）时，写入线程的批量判断不应因字典在遍历中变化而失败
+    stop, errors = threading.Event(), []
+
+    def churn():
+        try:
+            while not stop.is_set():
+                for task_id in range(1, 401, 3):
+                    engine.remove(task_id)
+                engine.set_rules(rules)
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        for batch in batches:
+            engine.process_batch(batch)
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
@@ -0,0 +1,71 @@
+from sqlalchemy import event
+
+from app import crud
+from app.models import Substation
+from app.schemas import SubstationCreate, SubstationDelete, SubstationQuery, SubstationUpdate
+
+
+def _station(port, **extra):
+    return {"stationName": f"s{port}", "portNo": port, "areaID": "a1", "drvType": "RELAY", "drvTime": 100,
+            "mbAddr": "1", "mbParam": "9600", **extra}
+
+
+def _add(db, count, system_id="s1"):
+    result = crud.add_substation(db, SubstationCreate(systemID=system_id, hostNo=1, nodeNo=1, number=count,
+                                                      controller=[_station(i) for i in range(count)]))
+    assert result["code"] == "0"
+    return [n["stationID"] for n in result["node"]]
+
+
+def test_modify_substation_in_one_update(mem_session_factory):
+    db = mem_session_factory()
+    ids = _add(db, 600)
+    other = _add(db, 1, system_id="s2")
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    controller = [{"stationID": station_id, "stationName": f"renamed{station_id}", "portNo": 7}
+                  for station_id in ids]
+    try:
+        result = crud.modify_substation(db, SubstationUpdate(systemID="s1", number=len(ids), controller=controller))
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert result["code"] == "0" and result["number"] == 600
+    assert result["node"][0] == {"stationID": ids[0], "portNo": 7}
+    # 600 个分站分两批预取，一条批量 UPDATE
+    assert len([s for s in statements if s.startswith("SELECT")]) == 2
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 1
+    assert db.query(Substation.station_name).filter(Substation.id == ids[-1]).scalar() == f"renamed{ids[-1]}"
+
+    # 其他系统的分站视为不存在，整批不修改
+    controller = [{"stationID": ids[0], "memo": "x"}, {"stationID": other[0], "memo": "x"}]
+    result = crud.modify_substation(db, SubstationUpdate(systemID="s1", number=2, controller=controller))
+    assert result["errNo"] == "404" and str(other[0]) in result["errMsg"]
+    assert db.query(Substation.memo).filter(Substation.id == ids[0]).scalar() == ""
+    db.close()
+
+
+def test_delete_substation_with_and_without_returning(mem_session_factory):
+    db = mem_session_factory()
+    ids = _add(db, 4)
+    other = _add(db, 1, system_id="s2")
+
+    request = SubstationDelete(systemID="s1", number=3, controller=[{"stationID": str(i)} for i in ids[:2] + other])
+    result = crud.delete_substation(db, request)
+    assert result["number"] == 2
+    assert result["node"] == [{"stationID": ids[0], "portNo": 0}, {"stationID": ids[1], "portNo": 1}]
+
+    dialect = db.get_bind().dialect
+    dialect.delete_returning = False
+    try:
+        result = crud.delete_substation(db, SubstationDelete(systemID="s1", number=1,
+                                                             controller=[{"stationID": str(ids[2])}]))
+    finally:
+        del dialect.delete_returning
+    assert result["node"] == [{"stationID": ids[2], "portNo": 2}]
+    assert crud.delete_substation(db, request)["errNo"] == "404"
+
+    page = crud.query_substation(db, SubstationQuery(systemID="s1", first=0, number=10))
+    assert page["node"] == [{"stationID": ids[3], "portNo": 3}]
+    db.close()
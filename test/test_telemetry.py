@@ -0,0 +1,103 @@
+import asyncio
+import json
+from datetime import datetime
+
+from app.models import Node, Substation
+from app.realtime import ConnectionManager
+from app.services.telemetry_service import TelemetryPublisher
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.messages.append(json.loads(message))
+
+
+def add_devices(session_factory):
+    db = session_factory()
+    node = Node(system_id="sys1", host_no=1, dev_eui="0102030405060708", dev_name="n1", dev_type="TEMP")
+    db.add(node)
+    db.flush()
+    station = Substation(system_id="sys1", host_no=1, node_no=node.id, station_name="s1", port_no=2,
+                         area_id="area9", drv_type="RELAY", drv_time=100, mb_addr="1", mb_param="9600")
+    db.add(station)
+    db.commit()
+    ids = node.id, station.id
+    db.close()
+    return ids
+
+
+def sample(node_id, station_id, second, value):
+    return {"dev_eui": "0102030405060708", "port": 2, "date": datetime(2024, 9, 1, 8, 0, second),
+            "param_value": value, "node_id": node_id, "station_id": station_id}
+
+
+def test_telemetry_coalesces_per_device(mem_session_factory):
+    node_id, station_id = add_devices(mem_session_factory)
+
+    async def scenario():
+        hub = ConnectionManager()
+        node_ws, area_ws, other_ws = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws, topic in ((node_ws, "node:0102030405060708"), (area_ws, "area:area9"), (other_ws, "system:other")):
+            hub.subscribe(await hub.connect(ws), [topic])
+
+        publisher = TelemetryPublisher(hub, mem_session_factory, window=0.01)
+        publisher.on_batch([sample(node_id, station_id, s, float(s)) for s in (3, 1, 2)])
+        publisher.publish_status("0102030405060708", "N1", "sys1", "SLEEP")
+        assert publisher.flush() == 2
+        await asyncio.sleep(0.01)
+        return publisher, node_ws, area_ws, other_ws
+
+    publisher, node_ws, area_ws, other_ws = asyncio.run(scenario())
+    data = node_ws.messages[0]
+    assert data["what"] == "NODE_DATA"
+    assert (data["v"], data["c"], data["s"]) == (3.0, 3, station_id)
+    assert node_ws.messages[1] == {"what": "NODE_STATUS", "e": "0102030405060708", "n": "N1", "st": "SLEEP"}
+    assert area_ws.messages == [data]
+    assert other_ws.messages == []
+    assert publisher.samples_coalesced == 2
+
+
+def test_telemetry_skips_encoding_without_subscribers(mem_session_factory):
+    node_id, station_id = add_devices(mem_session_factory)
+    publisher = TelemetryPublisher(ConnectionManager(), mem_session_factory)
+    publisher.on_batch([sample(node_id, station_id, 1, 1.0)])
+    assert publisher.flush() == 1
+    assert publisher.frames_sent == 0
+
+
+def test_routes_follow_device_changes(mem_session_factory, monkeypatch):
+    from types import SimpleNamespace
+    from sqlalchemy import event
+    from app.schemas import SubstationUpdate
+    from app.services import devices_service
+
+    node_id, station_id = add_devices(mem_session_factory)
+    publisher = TelemetryPublisher(ConnectionManager(), mem_session_factory)
+    monkeypatch.setattr(devices_service, "telemetry", publisher)
+    publisher.on_batch([sample(node_id, station_id, 1, 1.0)])
+    assert publisher._topics({"e": "0102030405060708", "s": station_id}, "sys1")[-1] == "area:area9"
+
+    # 分站改区域后推送到新区域
+    db = mem_session_factory()
+    devices_service.modify_substation_service(db, SubstationUpdate(
+        systemID="sys1", number=1, controller=[{"stationID": station_id, "areaID": "area2"}]))
+    assert publisher._topics({"e": "0102030405060708", "s": station_id}, "sys1")[-1] == "area:area2"
+
+    # 节点删除后不再按旧系统推送，不存在的节点在缓存期内不再重复查库
+    devices_service.delete_node_service(db, SimpleNamespace(controller=[{"nodeNo": node_id}]))
+    db.close()
+    statements = []
+    engine = mem_session_factory().get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    publisher.on_batch([sample(node_id, station_id, 2, 2.0)])
+    publisher.on_batch([sample(node_id, station_id, 3, 3.0)])
+    event.remove(engine, "before_cursor_execute", listener)
+    assert node_id not in publisher._systems
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import crud
+from app.models import Substation
+from app.tsdb import (TimeSeriesStore, backfill_node_history, backfill_station_history, decode_chunk, encode_chunk,
+                      to_ms)
+from app.models import HistoryChunk, HistoryData, NodeHistory
+
+
+def test_chunk_roundtrip():
+    timestamps = np.arange(0, 60000 * 500, 60000, dtype=np.int64) + 1_700_000_000_000
+    values = np.random.default_rng(1).normal(20, 2, len(timestamps)).astype(np.float32)
+    ts_blob, value_blob = encode_chunk(timestamps, values)
+    decoded_ts, decoded_values = decode_chunk(ts_blob, value_blob)
+    assert np.array_equal(decoded_ts, timestamps)
+    assert np.array_equal(decoded_values, values)
+    assert len(ts_blob) < timestamps.nbytes // 10
+
+
+def test_store_seals_chunks_and_scans_ranges(mem_session_factory):
+    store = TimeSeriesStore(chunk_size=100, partition_hours=24)
+    start = datetime(2024, 9, 1)
+    batch = [{"node_id": 7, "date": start + timedelta(minutes=i), "param_value": float(i)} for i in range(3000)]
+
+    db = mem_session_factory()
+    for i in range(0, len(batch), 250):
+        store.append_batch(batch[i:i + 250])
+        store.flush(db)
+
+    timestamps, values = store.range_scan(db, ["node:7"], to_ms(start + timedelta(minutes=10)),
+                                          to_ms(start + timedelta(minutes=1500)))["node:7"]
+    assert len(timestamps) == 1491
+    assert values[0] == 10.0 and values[-1] == 1500.0
+    assert np.all(np.diff(timestamps) > 0)
+    db.close()
+
+
+def test_crud_history_reads_from_store(mem_session_factory, monkeypatch):
+    store = TimeSeriesStore(chunk_size=64)
+    monkeypatch.setattr(crud, "ts_store", store)
+    # 只验证原始数据路径，不经过预聚合
+    monkeypatch.setattr(crud.rollups, "plan_resolution", lambda *args, **kwargs: None)
+    db = mem_session_factory()
+    db.add(Substation(id=3, system_id="s", host_no=1, node_no=7, station_name="st", port_no=2,
+                      area_id="a", drv_type="LIGHT", drv_time=0, mb_addr="1", mb_param="9600"))
+    db.commit()
+    day = datetime(2024, 9, 2)
+    store.append_batch([{"node_id": 7, "station_id": 3, "date": day + timedelta(hours=h), "param_value": h}
+                        for h in range(24)])
+    store.flush(db)
+
+    timestamps, values = crud.get_node_history_data(db, "7", "2024-09-02", "2024-09-02")
+    assert len(values) == 24
+
+    devices = db.query(Substation).all()
+    data = crud.get_station_history_data(db, devices, "WEEK", "2024-09-02", "2024-09-02")
+    assert len(data[3][1]) == 24
+    db.close()
+
+
+def test_backfill_from_node_history(mem_session_factory):
+    store = TimeSeriesStore(chunk_size=64)
+    db = mem_session_factory()
+    start = datetime(2024, 9, 1)
+    db.add_all([NodeHistory(node_id=1, date=start + timedelta(minutes=i), param_value=i) for i in range(200)])
+    db.commit()
+    # 接入层已写入最后 20 个样本，导入只补齐更早的部分；重复执行不再导入
+    store.append_batch([{"node_id": 1, "date": start + timedelta(minutes=i), "param_value": i} for i in range(180, 200)])
+    store.flush(db)
+    assert backfill_node_history(db, store, batch_size=50) == 180
+    assert backfill_node_history(db, batch_size=50) == 0
+    timestamps, _ = store.range_scan(db, ["node:1"], to_ms(start), to_ms(start + timedelta(days=1)))["node:1"]
+    assert timestamps.tolist() == [to_ms(start + timedelta(minutes=i)) for i in range(200)]
+    db.close()
+
+
+def test_backfill_station_history(mem_session_factory):
+    store = TimeSeriesStore()
+    db = mem_session_factory()
+    day = datetime(2024, 9, 1)
+    db.add_all([HistoryData(device_id=str(i), date=day + timedelta(hours=i), param_value=i) for i in range(1, 4)])
+    db.commit()
+    assert backfill_station_history(db) == 3
+    assert backfill_station_history(db) == 0
+    series = store.range_scan(db, ["station:1", "station:3"], to_ms(day), to_ms(day + timedelta(days=1)))
+    assert [values.tolist() for _, values in series.values()] == [[1.0], [3.0]]
+    db.close()
+
+
+def test_failed_commit_keeps_heads_for_retry(mem_session_factory, monkeypatch):
+    store = TimeSeriesStore(chunk_size=100, partition_hours=24)
+    start = datetime(2024, 9, 1)
+    batch = [{"node_id": 7, "date": start + timedelta(minutes=i), "param_value": float(i)} for i in range(250)]
+    db = mem_session_factory()
+    store.append_batch(batch[:50])
+    store.flush(db)
+
+    # 提交失败（如 database is locked）后块 id、已写满的块都不能丢失，也不能被 evict_before 释放
+    store.append_batch(batch[50:])
+    commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: (_ for _ in ()).throw(RuntimeError("database is locked")))
+    try:
+        store.flush(db)
+    except RuntimeError:
+        db.rollback()
+    monkeypatch.setattr(db, "commit", commit)
+    store.evict_before(to_ms(start + timedelta(days=2)))
+
+    store.flush(db)
+    timestamps, values = store.range_scan(db, ["node:7"], to_ms(start), to_ms(start + timedelta(days=1)))["node:7"]
+    assert len(timestamps) == 250 and values[-1] == 249.0
+    assert db.query(HistoryChunk).count() == 3
+    db.close()
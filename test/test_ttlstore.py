@@ -0,0 +1,60 @@
+from app.ttlstore import MemoryTTLStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_expires_without_revisiting_identity():
+    clock = FakeClock()
+    store = MemoryTTLStore(max_per_id=2, clock=clock)
+    for i in range(1000):
+        store.put(f"user{i}", "code", ttl=300)
+    assert len(store) == 1000
+
+    # 过期后任意一次读写都会清理所有到期条目，不必再访问同一账号
+    clock.now = 301
+    store.put("new", "code", ttl=300)
+    assert len(store._entries) == 1 and store.get("user1") == []
+
+
+def test_memory_store_caps_codes_per_identity():
+    clock = FakeClock()
+    store = MemoryTTLStore(max_per_id=2, clock=clock)
+    store.put("13800000000", "a", ttl=10)
+    clock.now = 5
+    store.put("13800000000", "b", ttl=10)
+    store.put("13800000000", "c", ttl=10)
+    assert store.get("13800000000") == ["b", "c"]
+
+    clock.now = 14
+    assert store.get("13800000000") == ["b", "c"]
+    clock.now = 15
+    assert store.get("13800000000") == []
+    store.put("13800000000", "d", ttl=10)
+    store.discard("13800000000")
+    assert store.get("13800000000") == [] and len(store) == 0
+
+
+def test_default_store_replaces_previous_code():
+    # 默认每个账号只保留一个验证码，重新获取后旧验证码失效
+    store = MemoryTTLStore(clock=FakeClock())
+    store.put("u1", "111111", 300)
+    store.put("u1", "222222", 300)
+    assert store.get("u1") == ["222222"]
+
+
+def test_base_classes_are_abstract():
+    from app.pubsub import PubSubBackend
+    from app.ttlstore import TTLStore
+
+    for base in (TTLStore, PubSubBackend):
+        try:
+            base()
+        except TypeError:
+            continue
+        assert False, f"{base.__name__} should not be instantiable"
@@ -1,11 +1,12 @@
 import asyncio
+import json
 import websockets
 
 async def websocket_client():
     uri = "ws://localhost:8000/ws"  # 服务器地址
     async with websockets.connect(uri) as websocket:
-        # 发送消息到服务器
-        await websocket.send("Hello from the client!")
+        # 订阅系统主题
+        await websocket.send(json.dumps({"action": "subscribe", "topics": ["system:1"]}))
 
         while True:
             try: